@@ -0,0 +1,82 @@
+# bench_ann_index.py
+# Recall-vs-latency report for the IVF gallery index against exact search,
+# using the attendance similarity threshold to decide matches.
+# Run from the repository root: python -m benchmarks.bench_ann_index
+import argparse
+import time
+
+import numpy as np
+
+from utils.ann_index import ExactIndex, IVFIndex, l2_normalize
+from utils.matcher import SIMILARITY_THRESHOLD
+
+
+def synthetic_gallery(rng, identities, images_per_identity, dim, noise):
+    centers = l2_normalize(rng.standard_normal((identities, dim)))
+    vectors = np.repeat(centers, images_per_identity, axis=0)
+    vectors += noise * rng.standard_normal(vectors.shape).astype(np.float32) / np.sqrt(dim)
+    names = np.repeat(np.arange(identities), images_per_identity)
+    return centers, l2_normalize(vectors), names
+
+
+def decisions(scores, ids, names):
+    """
+    Map top-1 results to the identity the attendance loop would record, or -1.
+    """
+    accepted = (ids[:, 0] >= 0) & (scores[:, 0] > SIMILARITY_THRESHOLD)
+    return np.where(accepted, names[np.maximum(ids[:, 0], 0)], -1)
+
+
+def time_search(index, queries, faces_per_frame, **kwargs):
+    start = time.perf_counter()
+    scores, ids = [], []
+    for i in range(0, len(queries), faces_per_frame):
+        s, d = index.search(queries[i:i + faces_per_frame], 1, **kwargs)
+        scores.append(s)
+        ids.append(d)
+    frames = -(-len(queries) // faces_per_frame)
+    return np.concatenate(scores), np.concatenate(ids), (time.perf_counter() - start) / frames * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF index recall vs latency")
+    parser.add_argument('--identities', type=int, default=20000)
+    parser.add_argument('--images-per-identity', type=int, default=3)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--noise', type=float, default=1.0, help="per-image noise relative to the identity center")
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--faces-per-frame', type=int, default=10)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers, vectors, names = synthetic_gallery(rng, args.identities, args.images_per_identity, args.dim, args.noise)
+    # Half the queries are enrolled students, half are strangers
+    enrolled = rng.integers(0, args.identities, args.queries // 2)
+    queries = np.concatenate([
+        centers[enrolled] + args.noise * rng.standard_normal((len(enrolled), args.dim)).astype(np.float32) / np.sqrt(args.dim),
+        rng.standard_normal((args.queries - len(enrolled), args.dim)).astype(np.float32),
+    ])
+    queries = l2_normalize(queries)
+
+    exact = ExactIndex(vectors)
+    start = time.perf_counter()
+    ivf = IVFIndex(vectors)
+    build_s = time.perf_counter() - start
+
+    exact_scores, exact_ids, exact_ms = time_search(exact, queries, args.faces_per_frame)
+    truth = decisions(exact_scores, exact_ids, names)
+    print(f"Gallery: {len(vectors)} embeddings, {len(ivf.centroids)} IVF lists, built in {build_s:.1f}s")
+    print(f"Threshold: {SIMILARITY_THRESHOLD}, matched by exact search: {np.mean(truth >= 0):.1%} of queries")
+    print(f"{'backend':>12} {'ms/frame':>9} {'recall':>8} {'agreement':>10}")
+    print(f"{'exact':>12} {exact_ms:>9.2f} {1.0:>8.1%} {1.0:>10.1%}")
+    for n_probe in args.probes:
+        scores, ids, ms = time_search(ivf, queries, args.faces_per_frame, n_probe=n_probe)
+        found = decisions(scores, ids, names)
+        # recall: matches exact search recorded that IVF also recorded; agreement: identical decisions overall
+        recall = np.mean(found[truth >= 0] == truth[truth >= 0]) if np.any(truth >= 0) else 1.0
+        print(f"{f'ivf/{n_probe}':>12} {ms:>9.2f} {recall:>8.1%} {np.mean(found == truth):>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
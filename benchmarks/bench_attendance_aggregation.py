@@ -0,0 +1,103 @@
+# bench_attendance_aggregation.py
+# Time and peak memory of per-student attendance aggregation over a
+# synthetic multi-million-row Date,Name,Status log: the original two-pass
+# dict scan against the streaming, chunked NumPy group-by in
+# benchmarks/csv_aggregation.py, for the whole log and for a weekly window.
+# Run from the repository root: python -m benchmarks.bench_attendance_aggregation --rows 5000000
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.csv_aggregation import aggregate_attendance
+
+
+def write_log(path, rows, students, days, seed=0):
+    rng = np.random.default_rng(seed)
+    start = date(2026, 1, 5)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    names = [f"student_{i:05d}" for i in range(students)]
+    with open(path, 'w', newline='') as f:
+        f.write('Date,Name,Status\n')
+        chunk = 1_000_000
+        for offset in range(0, rows, chunk):
+            n = min(chunk, rows - offset)
+            # Rows are roughly in date order, as the attendance loop appends them
+            day = np.sort(rng.integers(offset * days // rows, (offset + n) * days // rows + 1, n).clip(0, days - 1))
+            student = rng.integers(0, students, n)
+            present = rng.random(n) < 0.8
+            f.write(''.join(f"{dates[d]},{names[s]},{'Present' if p else 'Absent'}\n"
+                            for d, s, p in zip(day.tolist(), student.tolist(), present.tolist())))
+    return dates[0], dates[-1]
+
+
+def two_pass_dict(path, start=None, end=None):
+    """
+    The original weekly_report approach (plus a date filter): one pass to
+    collect names, a second to count into nested dicts.
+    """
+    known_names = set()
+    with open(path, 'r') as f:
+        for row in csv.DictReader(f):
+            known_names.add(row['Name'])
+    records = {name: {'present': 0, 'total_sessions': 0} for name in known_names}
+    with open(path, 'r') as f:
+        for row in csv.DictReader(f):
+            if (start is not None and row['Date'] < start) or (end is not None and row['Date'] > end):
+                continue
+            records[row['Name']]['total_sessions'] += 1
+            if row['Status'] == 'Present':
+                records[row['Name']]['present'] += 1
+    return {name: counts for name, counts in records.items() if counts['total_sessions']}
+
+
+def measure(fn, *args):
+    """
+    Time one run, then trace a second run for peak Python memory (tracing
+    slows allocation, so the two are kept apart).
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance log aggregation benchmark")
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--chunk-mib', type=int, default=4)
+    parser.add_argument('--skip-baseline', action='store_true', help="only time the streaming aggregator")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'attendance_log.csv')
+        start = time.perf_counter()
+        first_day, last_day = write_log(path, args.rows, args.students, args.days)
+        print(f"Wrote {args.rows} rows ({os.path.getsize(path) / 2**20:.0f} MiB) in {time.perf_counter() - start:.1f} s")
+
+        week_start = (date.fromisoformat(last_day) - timedelta(days=6)).isoformat()
+        windows = [('all', None, None), ('last week', week_start, last_day)]
+        print(f"{'method':>12} {'window':>10} {'seconds':>8} {'rows/s':>12} {'peak MiB':>9}")
+        for label, lo, hi in windows:
+            streamed, elapsed, peak = measure(aggregate_attendance, path, lo, hi, args.chunk_mib * 2**20)
+            print(f"{'streaming':>12} {label:>10} {elapsed:>8.2f} {args.rows / elapsed:>12,.0f} {peak / 2**20:>9.1f}")
+            if args.skip_baseline:
+                continue
+            baseline, elapsed, peak = measure(two_pass_dict, path, lo, hi)
+            print(f"{'two-pass':>12} {label:>10} {elapsed:>8.2f} {args.rows / elapsed:>12,.0f} {peak / 2**20:>9.1f}")
+            assert baseline == streamed, "aggregators disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# bench_attendance_store.py
+# Attendance persistence: marking students present by reopening a CSV per
+# mark (the old main.py path) against the SQLite store in utils/attendance_store.py
+# committing per mark or in batches, then weekly report queries against the
+# streaming CSV aggregation, with a reader process querying the store while
+# the writer is busy.
+# Run from the repository root: python -m benchmarks.bench_attendance_store --students 2000 --classes 8 --days 120
+import argparse
+import csv
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.csv_aggregation import aggregate_attendance
+from utils.attendance_store import ABSENT, PRESENT, AttendanceStore
+
+
+def history(students, classes, days, seed=0):
+    """
+    One (date, class, student, status) row per student per class per day,
+    in the order the attendance loop produces them.
+    """
+    start = date(2026, 1, 5)
+    for d in range(days):
+        day = (start + timedelta(days=d)).isoformat()
+        for c in range(classes):
+            for s in range(students):
+                present = (s * 7 + d * 3 + c + seed) % 10 < 8
+                yield day, f"class_{c:02d}", f"student_{s:05d}", PRESENT if present else ABSENT
+
+
+def time_marks(marks, tmp):
+    """
+    Seconds per mark for the three write paths.
+    """
+    results = {}
+    path = os.path.join(tmp, 'marks.csv')
+    start = time.perf_counter()
+    for day, _, student, status in marks:
+        with open(path, 'a', newline='') as f:
+            csv.writer(f).writerow([day, student, status])
+    results['csv reopen'] = (time.perf_counter() - start) / len(marks)
+
+    store = AttendanceStore(os.path.join(tmp, 'per_mark.db'), batch_size=1)
+    start = time.perf_counter()
+    for mark in marks:
+        store.add(*mark)
+    results['sqlite per mark'] = (time.perf_counter() - start) / len(marks)
+    store.close()
+
+    store = AttendanceStore(os.path.join(tmp, 'batched.db'))
+    start = time.perf_counter()
+    for mark in marks:
+        store.add(*mark)
+        store.flush_due()
+    store.flush()
+    results['sqlite batched'] = (time.perf_counter() - start) / len(marks)
+    store.close()
+    return results
+
+
+def reader(db_path, start, end, stop, out):
+    store = AttendanceStore(db_path)
+    latencies, errors = [], 0
+    while not stop.is_set():
+        t = time.perf_counter()
+        try:
+            store.totals(start, end)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - t)
+    store.close()
+    out.put((len(latencies), sorted(latencies)[len(latencies) // 2] if latencies else 0.0, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance store benchmark")
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=8)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--marks', type=int, default=2000, help="marks timed per write path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = list(history(args.students, args.classes, args.days))
+        print(f"{len(rows):,} attendance rows ({args.students} students, {args.classes} classes, {args.days} days)")
+
+        print(f"{'write path':>16} {'us/mark':>9}")
+        for label, seconds in time_marks(rows[:args.marks], tmp).items():
+            print(f"{label:>16} {seconds * 1e6:>9.1f}")
+
+        log_path = os.path.join(tmp, 'weekly_attendance.csv')
+        with open(log_path, 'w', newline='') as f:
+            f.write('Date,Name,Status\n')
+            f.write(''.join(f"{day},{student},{status}\n" for day, _, student, status in rows))
+        db_path = os.path.join(tmp, 'attendance.db')
+        store = AttendanceStore(db_path, batch_size=50000)
+        start = time.perf_counter()
+        for row in rows:
+            store.add(*row)
+        store.flush()
+        store.batch_size = 64
+        print(f"Loaded the store in {time.perf_counter() - start:.1f} s")
+
+        last_day = rows[-1][0]
+        week_start = (date.fromisoformat(last_day) - timedelta(days=6)).isoformat()
+        print(f"{'report query':>16} {'window':>10} {'ms':>9}")
+        for label, lo, hi in (('all', None, None), ('last week', week_start, last_day)):
+            t = time.perf_counter()
+            streamed = aggregate_attendance(log_path, lo, hi)
+            print(f"{'csv streaming':>16} {label:>10} {(time.perf_counter() - t) * 1000:>9.1f}")
+            t = time.perf_counter()
+            indexed = store.totals(lo, hi)
+            print(f"{'sqlite indexed':>16} {label:>10} {(time.perf_counter() - t) * 1000:>9.1f}")
+            assert streamed == indexed, "store and CSV log disagree"
+
+        # A report process reads while this one keeps writing new days
+        stop, out = multiprocessing.Event(), multiprocessing.Queue()
+        proc = multiprocessing.Process(target=reader, args=(db_path, week_start, last_day, stop, out))
+        proc.start()
+        extra = list(history(args.students, args.classes, 7, seed=1))
+        extra = [((date.fromisoformat(day) + timedelta(days=args.days)).isoformat(), c, s, st) for day, c, s, st in extra]
+        t = time.perf_counter()
+        for mark in extra:
+            store.add(*mark)
+            store.flush_due()
+        store.flush()
+        write_seconds = time.perf_counter() - t
+        stop.set()
+        queries, p50, errors = out.get()
+        proc.join()
+        print(f"Concurrent: wrote {len(extra):,} marks in {write_seconds:.1f} s while a reader ran {queries} weekly "
+              f"queries (p50 {p50 * 1000:.1f} ms, {errors} errors)")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
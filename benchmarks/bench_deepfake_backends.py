@@ -0,0 +1,65 @@
+# bench_deepfake_backends.py
+# Cold start (import + model load + first inference), peak RSS and images/s
+# for each deepfake inference backend. Each backend runs in a fresh
+# subprocess so import costs and memory are measured in isolation.
+# Run from the repository root: python -m benchmarks.bench_deepfake_backends --backends keras onnx tflite
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+def measure(kind, model_path, batch_size, batches):
+    """
+    Runs inside the child process and prints one JSON line of results.
+    """
+    import resource
+    import time
+
+    start = time.perf_counter()
+    import numpy as np
+    from utils.deepfake_backends import load_backend
+    backend = load_backend(kind, model_path)
+    batch = np.random.default_rng(0).random((batch_size, 200, 200, 3), dtype=np.float32)
+    backend.predict(batch[:1])
+    cold_start = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(batches):
+        backend.predict(batch)
+    throughput = batch_size * batches / (time.perf_counter() - start)
+    # ru_maxrss is reported in KiB on Linux
+    rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'cold_start_s': cold_start, 'images_per_s': throughput, 'peak_rss_mib': rss_mib}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deepfake backend benchmark")
+    parser.add_argument('--backends', nargs='+', default=['keras', 'onnx', 'tflite'])
+    parser.add_argument('--model-path', action='append', default=[], help="kind=path override, may repeat")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--child', nargs=2, metavar=('KIND', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, path = args.child
+        measure(kind, path or None, args.batch_size, args.batches)
+        return
+
+    paths = dict(item.split('=', 1) for item in args.model_path)
+    print(f"{'backend':>8} {'cold start s':>13} {'peak RSS MiB':>13} {'images/s':>9}")
+    for kind in args.backends:
+        command = [sys.executable, '-m', 'benchmarks.bench_deepfake_backends', '--child', kind, paths.get(kind, ''),
+                   '--batch-size', str(args.batch_size), '--batches', str(args.batches)]
+        result = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+        if result.returncode != 0:
+            print(f"{kind:>8} failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{kind:>8} {stats['cold_start_s']:>13.2f} {stats['peak_rss_mib']:>13.0f} {stats['images_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_face_recognition.py
+# Per-frame recognition time of the per-crop path (InsightFace on every
+# person box) against the full-frame path (one face detection per frame and
+# one batched ArcFace call) as the number of people in view grows. Frames
+# are synthetic classrooms: copies of one face photo pasted into a grid,
+# each in the upper part of its own person box.
+# Run from the repository root: python -m benchmarks.bench_face_recognition --face dataset/<name>/<image>.jpg
+import argparse
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from utils.recognizer import CropRecognizer, FullFrameRecognizer
+
+
+def synthetic_classroom(face, people, cell=(160, 320)):
+    """
+    Return a frame with people copies of face and their (n, 4) person boxes.
+    """
+    cell_w, cell_h = cell
+    cols = int(np.ceil(np.sqrt(people * cell_h / cell_w)))
+    rows = int(np.ceil(people / cols))
+    frame = np.full((rows * cell_h, cols * cell_w, 3), 90, dtype=np.uint8)
+    face_w = int(cell_w * 0.7)
+    face = cv2.resize(face, (face_w, int(face.shape[0] * face_w / face.shape[1])))[:cell_h // 2]
+    boxes = []
+    for i in range(people):
+        x, y = (i % cols) * cell_w, (i // cols) * cell_h
+        fx, fy = x + (cell_w - face.shape[1]) // 2, y + cell_h // 20
+        frame[fy:fy + face.shape[0], fx:fx + face.shape[1]] = face
+        boxes.append((x, y, x + cell_w, y + cell_h))
+    return frame, np.asarray(boxes, dtype=np.int32)
+
+
+def time_per_frame(recognizer, frame, boxes, repeats):
+    indices = list(range(len(boxes)))
+    recognizer.embed(frame, boxes, indices)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embeddings = recognizer.embed(frame, boxes, indices)
+    return (time.perf_counter() - start) / repeats, embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-crop vs full-frame face recognition benchmark")
+    parser.add_argument('--face', help="face photo to paste (default: first image under dataset/)")
+    parser.add_argument('--people', nargs='+', type=int, default=[1, 5, 10, 20, 30])
+    parser.add_argument('--tiles', default='1x1', help="full-frame detector tiles, ROWSxCOLS")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    from insightface.app import FaceAnalysis
+
+    face_path = args.face or next(iter(sorted(glob.glob('dataset/*/*.jpg') + glob.glob('dataset/*/*.png'))), None)
+    if face_path is None:
+        parser.error("no --face given and no images under dataset/")
+    face = cv2.imread(face_path)
+    app = FaceAnalysis(name='buffalo_l')
+    app.prepare(ctx_id=-1)
+    tiles = tuple(int(v) for v in args.tiles.split('x'))
+    crop, full = CropRecognizer(app), FullFrameRecognizer(app, tiles=tiles)
+
+    print(f"{'people':>6} {'crop ms':>9} {'full ms':>9} {'speedup':>8} {'found crop/full':>16} {'min cos':>8}")
+    for people in args.people:
+        frame, boxes = synthetic_classroom(face, people)
+        crop_s, crop_emb = time_per_frame(crop, frame, boxes, args.repeats)
+        full_s, full_emb = time_per_frame(full, frame, boxes, args.repeats)
+        # Both paths should produce the same identity embedding for each box
+        sims = [float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+                for a, b in zip(crop_emb, full_emb) if a is not None and b is not None]
+        found = f"{sum(e is not None for e in crop_emb)}/{sum(e is not None for e in full_emb)}"
+        print(f"{people:>6} {crop_s * 1000:>9.1f} {full_s * 1000:>9.1f} {crop_s / full_s:>7.1f}x {found:>16} "
+              f"{min(sims) if sims else float('nan'):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# bench_mailer.py
+# Bulk mail throughput against a local SMTP stand-in: the original serial
+# loop (one session, one freshly built MIME message per recipient) against
+# utils/mailer.py's pooled background sender at several pool sizes. The
+# stand-in adds a fixed per-message latency, like a remote server, and can
+# answer a fraction of messages with a transient 451 to exercise retries.
+# Run from the repository root: python -m benchmarks.bench_mailer --recipients 2000 --latency-ms 20
+import argparse
+import os
+import random
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from utils.mailer import Mailer, Outbox
+
+BODY = """
+Dear Students,
+
+The following students were absent from today's session on $date:
+$absent
+
+Please verify if this is correct by replying to this email or via SMS.
+If you believe this is an error, let us know.
+
+Regards,
+AutoAttendance System
+"""
+
+
+class StubSmtpServer:
+    """
+    Minimal threaded SMTP server that accepts and discards mail. Each DATA
+    takes latency_ms, and fail_rate of them get a 451 reply. Addresses
+    containing 'reject' are refused at RCPT.
+    """
+
+    def __init__(self, latency_ms=20.0, fail_rate=0.0, seed=0):
+        latency = latency_ms / 1000.0
+        rng = random.Random(seed)
+        lock = threading.Lock()
+        self.messages = 0
+        self.connections = 0
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                with lock:
+                    server.connections += 1
+                self.reply('220 stub ESMTP')
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').strip()
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.reply('250 stub')
+                    elif verb == 'RCPT' and 'reject' in command.lower():
+                        self.reply('550 no such user')
+                    elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 go ahead')
+                        for line in self.rfile:
+                            if line in (b'.\r\n', b'.\n'):
+                                break
+                        time.sleep(latency)
+                        with lock:
+                            failed = rng.random() < fail_rate
+                            server.messages += not failed
+                        self.reply('451 try again later' if failed else '250 queued')
+                    elif verb == 'QUIT':
+                        self.reply('221 bye')
+                        return
+                    else:
+                        self.reply('502 not implemented')
+
+        class Server(socketserver.ThreadingTCPServer):
+            # Room for every pooled connection to arrive at once
+            request_queue_size = 128
+
+        self.tcp = Server(('127.0.0.1', 0), Handler)
+        self.tcp.daemon_threads = True
+        self.port = self.tcp.server_address[1]
+        self._thread = threading.Thread(target=self.tcp.serve_forever, name='stub-smtp', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.tcp.shutdown()
+        self.tcp.server_close()
+
+
+def serial_baseline(port, recipients, body):
+    """
+    The original send_absence_alerts loop.
+    """
+    server = smtplib.SMTP('127.0.0.1', port)
+    for email in recipients:
+        msg = MIMEMultipart()
+        msg['From'] = 'attendance@example.com'
+        msg['To'] = email
+        msg['Subject'] = "Absence Alert - Verify Absent Students"
+        msg.attach(MIMEText(body, 'plain'))
+        try:
+            server.sendmail('attendance@example.com', email, msg.as_string())
+        except smtplib.SMTPException:
+            pass
+    server.quit()
+
+
+def pooled(port, recipients, body, pool_size, outbox_path, backoff):
+    mailer = Mailer('attendance@example.com', '', outbox_path, host='127.0.0.1', port=port, starttls=False,
+                    pool_size=pool_size, rate=0, backoff=backoff, poll_interval=0.05).start()
+    enqueue_start = time.perf_counter()
+    mailer.enqueue("Absence Alert - Verify Absent Students", body, recipients)
+    enqueue_seconds = time.perf_counter() - enqueue_start
+    mailer.drain()
+    # Retries are scheduled later; wait for them too
+    outbox = Outbox(outbox_path)
+    while outbox.counts().get('pending') or outbox.counts().get('sending'):
+        time.sleep(0.02)
+    outbox.close()
+    mailer.stop()
+    return enqueue_seconds, mailer.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk mailer throughput against a local SMTP stand-in")
+    parser.add_argument('--recipients', type=int, default=2000)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="stand-in delay per message")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of transient 451 replies")
+    parser.add_argument('--pool-sizes', default='1,4,8,16')
+    parser.add_argument('--skip-baseline', action='store_true')
+    args = parser.parse_args()
+
+    recipients = [f"student{i:05d}@example.com" for i in range(args.recipients)]
+    body = BODY.replace('$date', time.strftime('%Y-%m-%d %H:%M:%S')).replace('$absent', ', '.join(f"student_{i}" for i in range(40)))
+    print(f"{args.recipients} recipients, {args.latency_ms:.0f} ms per message, {args.fail_rate:.0%} transient failures")
+    print(f"{'sender':>12} {'enqueue ms':>11} {'seconds':>8} {'msgs/s':>8} {'sessions':>9} {'retries':>8} {'failed':>7}")
+
+    if not args.skip_baseline:
+        stub = StubSmtpServer(args.latency_ms, args.fail_rate).start()
+        start = time.perf_counter()
+        serial_baseline(stub.port, recipients, body)
+        elapsed = time.perf_counter() - start
+        print(f"{'serial':>12} {elapsed * 1000:>11.0f} {elapsed:>8.2f} {stub.messages / elapsed:>8.1f} "
+              f"{stub.connections:>9} {0:>8} {args.recipients - stub.messages:>7}")
+        stub.stop()
+
+    for pool_size in [int(p) for p in args.pool_sizes.split(',')]:
+        stub = StubSmtpServer(args.latency_ms, args.fail_rate).start()
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            enqueue_seconds, stats = pooled(stub.port, recipients, body, pool_size, os.path.join(tmp, 'outbox.db'), backoff=0.05)
+            elapsed = time.perf_counter() - start
+        print(f"{f'pool {pool_size}':>12} {enqueue_seconds * 1000:>11.1f} {elapsed:>8.2f} {stub.messages / elapsed:>8.1f} "
+              f"{stats['connections']:>9} {stats['retried']:>8} {stats['failed']:>7}")
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
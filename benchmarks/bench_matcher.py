@@ -0,0 +1,48 @@
+# bench_matcher.py
+# Compares the old per-face list comprehension against GalleryMatcher as the
+# gallery grows. Run from the repository root: python -m benchmarks.bench_matcher
+import argparse
+import time
+
+import numpy as np
+
+from utils.matcher import GalleryMatcher
+
+
+def legacy_match(embedding, known_encodings):
+    similarities = [np.dot(embedding, known) / (np.linalg.norm(embedding) * np.linalg.norm(known)) for known in known_encodings]
+    best_match_index = int(np.argmax(similarities))
+    return best_match_index, similarities[best_match_index]
+
+
+def time_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gallery matcher microbenchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--faces', type=int, default=10, help="faces per frame")
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'gallery':>8} {'legacy ms/frame':>16} {'matcher ms/frame':>17} {'speedup':>8}")
+    for size in args.sizes:
+        known_encodings = [rng.standard_normal(args.dim).astype(np.float32) for _ in range(size)]
+        known_names = [f"student_{i}" for i in range(size)]
+        faces = [rng.standard_normal(args.dim).astype(np.float32) for _ in range(args.faces)]
+        matcher = GalleryMatcher(known_encodings, known_names)
+
+        # The legacy path is slow on large galleries, so it gets a single pass
+        legacy_ms = time_call(lambda: [legacy_match(f, known_encodings) for f in faces], 1)
+        matcher_ms = time_call(lambda: matcher.match(faces), args.repeats)
+        print(f"{size:>8} {legacy_ms:>16.2f} {matcher_ms:>17.3f} {legacy_ms / matcher_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
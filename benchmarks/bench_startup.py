@@ -0,0 +1,86 @@
+# bench_startup.py
+# Cold start of the attendance models: importing and loading YOLO and
+# InsightFace one after the other with no warm-up (the old main.py order)
+# against utils/startup.py's ModelLoader, which does both on background
+# threads and runs dummy inferences first. Each variant runs in a fresh
+# interpreter so import times are real, and reports time to ready and the
+# latency of the first few "real" frames.
+# Run from the repository root: python -m benchmarks.bench_startup --frames 5 --ctx-id -1
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def first_frames(app, frames):
+    """
+    Milliseconds for YOLO plus InsightFace on each of the first frames.
+    """
+    from utils.yolo_utils import detect_people
+
+    rng = np.random.default_rng(0)
+    latencies = []
+    for _ in range(frames):
+        frame = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        detect_people(frame)
+        app.get(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def serial(ctx_id, frames):
+    start = time.perf_counter()
+    from insightface.app import FaceAnalysis
+
+    from utils.yolo_utils import get_model
+
+    imported = time.perf_counter()
+    app = FaceAnalysis(name='buffalo_l')
+    app.prepare(ctx_id=ctx_id)
+    get_model()
+    ready = time.perf_counter()
+    return {'import_s': imported - start, 'ready_s': ready - start, 'first_frames_ms': first_frames(app, frames)}
+
+
+def background(ctx_id, frames):
+    from utils.startup import ModelLoader
+
+    start = time.perf_counter()
+    loader = ModelLoader(ctx_id=ctx_id).start()
+    app = loader.wait()
+    ready = time.perf_counter()
+    report = loader.report()
+    return {'import_s': max(m['import'] for m in report['models'].values()), 'ready_s': ready - start,
+            'phases': report['models'], 'first_frames_ms': first_frames(app, frames)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model cold start benchmark")
+    parser.add_argument('--frames', type=int, default=5, help="frames timed after startup")
+    parser.add_argument('--ctx-id', type=int, default=-1, help="InsightFace device, -1 for CPU")
+    parser.add_argument('--variant', choices=('serial', 'background'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        result = (serial if args.variant == 'serial' else background)(args.ctx_id, args.frames)
+        print(json.dumps(result))
+        return
+
+    print(f"{'variant':>11} {'import s':>9} {'ready s':>8}  first frames (ms)")
+    for variant in ('serial', 'background'):
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--variant', variant,
+                              '--frames', str(args.frames), '--ctx-id', str(args.ctx_id)],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        frames = ' '.join(f"{ms:.0f}" for ms in result['first_frames_ms'])
+        print(f"{variant:>11} {result['import_s']:>9.2f} {result['ready_s']:>8.2f}  {frames}")
+        for model, phases in result.get('phases', {}).items():
+            print(f"{'':>11} {model}: import {phases['import']:.2f} s, load {phases['load']:.2f} s, warm-up {phases['warmup']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
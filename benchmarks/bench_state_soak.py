@@ -0,0 +1,68 @@
+# bench_state_soak.py
+# Soak test for long-running liveliness state: replays a simulated 24-hour
+# stream of back-to-back classes (a fresh set of students every class) on a
+# fake monotonic clock and samples traced memory and store size every
+# simulated hour. Memory should stay flat once the store reaches capacity.
+# Run from the repository root: python -m benchmarks.bench_state_soak --hours 24
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from utils.liveliness import LivelinessEngine
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def main():
+    parser = argparse.ArgumentParser(description="24-hour liveliness state soak test")
+    parser.add_argument('--hours', type=float, default=24.0)
+    parser.add_argument('--fps', type=float, default=2.0, help="liveliness updates per simulated second")
+    parser.add_argument('--class-minutes', type=float, default=50.0)
+    parser.add_argument('--class-size', type=int, default=40)
+    parser.add_argument('--in-view', type=int, default=12, help="students checked per frame")
+    parser.add_argument('--capacity', type=int, default=256)
+    parser.add_argument('--ttl', type=float, default=60.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    clock = FakeClock()
+    engine = LivelinessEngine(capacity=args.capacity, ttl=args.ttl, clock=clock)
+    frames = int(args.hours * 3600 * args.fps)
+    frames_per_hour = int(3600 * args.fps)
+    class_frames = int(args.class_minutes * 60 * args.fps)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    print(f"{'hour':>4} {'identities':>10} {'traced KiB':>10} {'expired':>8} {'evicted':>8} {'live %':>7}")
+    start = time.perf_counter()
+    for frame in range(frames):
+        clock.now = frame / args.fps
+        class_index = frame // class_frames
+        students = rng.choice(args.class_size, size=min(args.in_view, args.class_size), replace=False)
+        keys = [f"class{class_index}:student{s}" for s in students]
+        centers = rng.normal(320, 15, size=(len(keys), 2))
+        boxes = np.hstack([centers - 40, centers + 40])
+        engine.update(keys, boxes)
+        if (frame + 1) % frames_per_hour == 0:
+            summary = engine.summary()
+            identities = summary['identities']
+            traced = (tracemalloc.get_traced_memory()[0] - baseline) / 1024
+            print(f"{(frame + 1) // frames_per_hour:>4} {identities['size']:>10} {traced:>10.1f} "
+                  f"{identities['expired']:>8} {identities['evicted']:>8} {summary['live'] / summary['checks']:>7.1%}")
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    print(f"{frames} updates in {elapsed:.1f} s ({elapsed / frames * 1e6:.0f} us/update), "
+          f"peak traced memory {peak / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
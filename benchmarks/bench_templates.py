@@ -0,0 +1,61 @@
+# bench_templates.py
+# Compares first-image deduplication with the per-identity template store on
+# synthetic enrollments: identification rate at the attendance threshold,
+# matching latency and memory per identity.
+# Run from the repository root: python -m benchmarks.bench_templates
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_ann_index import synthetic_gallery
+from utils.ann_index import l2_normalize
+from utils.matcher import GalleryMatcher
+from utils.templates import TemplateStore
+
+
+def evaluate(matcher, queries, truth, faces_per_frame):
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(queries), faces_per_frame):
+        results.extend(matcher.match(list(queries[i:i + faces_per_frame])))
+    frames = -(-len(queries) // faces_per_frame)
+    ms = (time.perf_counter() - start) / frames * 1000.0
+    accuracy = np.mean([name == expected for (name, _), expected in zip(results, truth)])
+    return accuracy, ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Template store accuracy and memory")
+    parser.add_argument('--identities', type=int, default=2000)
+    parser.add_argument('--images-per-identity', type=int, default=6)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--noise', type=float, default=1.2)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--faces-per-frame', type=int, default=10)
+    parser.add_argument('--max-exemplars', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers, vectors, ids = synthetic_gallery(rng, args.identities, args.images_per_identity, args.dim, args.noise)
+    names = [f"student_{i}" for i in ids]
+    expected = rng.integers(0, args.identities, args.queries)
+    queries = l2_normalize(centers[expected] + args.noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim))
+    truth = [f"student_{i}" for i in expected]
+
+    first = {}
+    for name, vector in zip(names, vectors):
+        first.setdefault(name, vector)
+    configs = [('first-image', list(first.values()), list(first), len(first) * args.dim * 4)]
+    for mode in ('centroid', 'max'):
+        store = TemplateStore(vectors, names, mode=mode, max_exemplars=args.max_exemplars)
+        configs.append((mode, store.vectors, store.names, store.memory_report()['total_bytes']))
+
+    print(f"{'gallery':>12} {'templates':>10} {'accuracy':>9} {'ms/frame':>9} {'KiB/identity':>13}")
+    for label, gallery, gallery_names, nbytes in configs:
+        accuracy, ms = evaluate(GalleryMatcher(gallery, gallery_names), queries, truth, args.faces_per_frame)
+        print(f"{label:>12} {len(gallery_names):>10} {accuracy:>9.1%} {ms:>9.2f} {nbytes / args.identities / 1024:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# bench_transport.py
+# Bytes on the wire and per-request CPU (client encode + server decode) for the
+# deepfake wire formats, measured in-process without a server.
+# Run from the repository root: python -m benchmarks.bench_transport
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+from utils.face_transport import FORMATS, FORMAT_JSON, decode_payload, encode_request
+
+
+def server_decode(kwargs, fmt):
+    """
+    Mirror what deepfake_server.py does with a request body before preprocessing.
+    """
+    if fmt == FORMAT_JSON:
+        data = json.loads(json.dumps(kwargs['json']))
+        return cv2.imdecode(np.frombuffer(base64.b64decode(data['image']), np.uint8), cv2.IMREAD_COLOR)
+    return decode_payload(kwargs['data'], fmt)
+
+
+def wire_bytes(kwargs):
+    return len(json.dumps(kwargs['json']).encode('utf-8')) if 'json' in kwargs else len(kwargs['data'])
+
+
+def per_call_us(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deepfake wire format benchmark")
+    parser.add_argument('--sizes', nargs='+', default=['160x160', '320x480', '640x960'], help="crop WxH")
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'crop':>9} {'format':>6} {'bytes':>9} {'encode us':>10} {'decode us':>10}")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split('x'))
+        # Smooth synthetic crop so JPEG sizes resemble real faces rather than noise
+        crop = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+        for fmt in FORMATS:
+            kwargs = encode_request(crop, fmt)
+            encode_us = per_call_us(lambda: encode_request(crop, fmt), args.repeats)
+            decode_us = per_call_us(lambda: server_decode(kwargs, fmt), args.repeats)
+            print(f"{size:>9} {fmt:>6} {wire_bytes(kwargs):>9} {encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
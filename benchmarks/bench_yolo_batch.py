@@ -0,0 +1,62 @@
+# bench_yolo_batch.py
+# Per-frame YOLO person detection latency at several batch sizes and
+# inference resolutions. Frames come from a video file when given, otherwise
+# from random noise (which times the model but finds no people).
+# Run from the repository root: python -m benchmarks.bench_yolo_batch --video classroom.mp4
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from utils.yolo_utils import CONF_THRESHOLD, detect_people_batch
+
+
+def load_frames(video, count, size):
+    if video:
+        cap = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        if frames:
+            return [frames[i % len(frames)] for i in range(count)]
+    width, height = size
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched YOLO detection benchmark")
+    parser.add_argument('--video', help="video file to take frames from")
+    parser.add_argument('--size', default='640x480', help="synthetic frame WxH")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8, 16])
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[640, 320])
+    parser.add_argument('--conf', type=float, default=CONF_THRESHOLD)
+    parser.add_argument('--frames', type=int, default=64, help="frames processed per configuration")
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.split('x'))
+    frames = load_frames(args.video, args.frames, size)
+
+    print(f"{'imgsz':>5} {'batch':>5} {'ms/frame':>9} {'ms/batch':>9} {'FPS':>7} {'people':>7}")
+    for imgsz in args.imgsz:
+        # Warm up so model fusion and allocator growth are not timed
+        detect_people_batch(frames[:max(args.batch_sizes)], imgsz=imgsz, conf=args.conf)
+        for batch_size in args.batch_sizes:
+            batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+            people = 0
+            start = time.perf_counter()
+            for batch in batches:
+                people += sum(len(boxes) for boxes in detect_people_batch(batch, imgsz=imgsz, conf=args.conf))
+            elapsed = time.perf_counter() - start
+            per_frame = elapsed / len(frames) * 1000
+            print(f"{imgsz:>5} {batch_size:>5} {per_frame:>9.1f} {elapsed / len(batches) * 1000:>9.1f} "
+                  f"{len(frames) / elapsed:>7.1f} {people:>7}")
+
+
+if __name__ == "__main__":
+    main()
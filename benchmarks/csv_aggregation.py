@@ -0,0 +1,114 @@
+# csv_aggregation.py
+# The streaming, chunked NumPy group-by over a Date,Name,Status CSV log that
+# weekly reports used before attendance moved to the SQLite store in
+# utils/attendance_store.py. Reports no longer read CSV logs; this is kept
+# as the baseline bench_attendance_aggregation and bench_attendance_store
+# compare against.
+import csv
+
+import numpy as np
+
+
+class AttendanceTotals:
+    """
+    Per-student present and total session counts. Names are dictionary
+    encoded to dense integer ids so each chunk is grouped with bincount.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.present = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.int64)
+
+    def encode(self, names):
+        """
+        Map a sequence of names to an int64 id array, assigning ids to new names.
+        """
+        for name in set(names).difference(self.ids):
+            self.ids[name] = len(self.ids)
+        return np.fromiter(map(self.ids.__getitem__, names), dtype=np.int64, count=len(names))
+
+    def add(self, ids, present):
+        """
+        Add one chunk of encoded names and a matching bool array.
+        """
+        size = len(self.ids)
+        if size > len(self.total):
+            self.total = np.pad(self.total, (0, size - len(self.total)))
+            self.present = np.pad(self.present, (0, size - len(self.present)))
+        self.total += np.bincount(ids, minlength=size)
+        self.present += np.bincount(ids[present], minlength=size)
+
+    def as_dict(self):
+        return {name.decode('utf-8') if isinstance(name, bytes) else name:
+                {'present': int(self.present[i]), 'total_sessions': int(self.total[i])}
+                for name, i in self.ids.items() if self.total[i]}
+
+
+def _column(fieldnames, wanted):
+    for i, field in enumerate(fieldnames):
+        if field.strip().lower() == wanted:
+            return i
+    raise ValueError(f"'{wanted.title()}' column not found in attendance log")
+
+
+def _split_columns(data, width):
+    """
+    Split a chunk of whole CSV lines (bytes) into per-column lists of byte
+    strings. Plain unquoted lines, which is all the attendance loop writes,
+    are split with a handful of C-level bytes operations; anything quoted
+    falls back to the csv module.
+    """
+    lines = data.replace(b'\r', b'').split(b'\n')
+    if b'' in lines:
+        lines = [line for line in lines if line]
+    if b'"' not in data and data.count(b',') == (width - 1) * len(lines):
+        fields = b','.join(lines).split(b',')
+        return [fields[i::width] for i in range(width)]
+    rows = [row for row in csv.reader(line.decode('utf-8') for line in lines) if len(row) == width]
+    return [[value.encode('utf-8') for value in column] for column in zip(*rows)] or [[] for _ in range(width)]
+
+
+def aggregate_attendance(path, start=None, end=None, chunk_bytes=4 * 2**20):
+    """
+    Count present and total sessions per student in a Date,Name,Status
+    attendance log in one streaming pass. The file is read chunk_bytes at a
+    time into column arrays, filtered to the inclusive [start, end] ISO date
+    window and grouped with NumPy bincount over dictionary-encoded names,
+    so memory stays bounded by the chunk size however long the log grows.
+    The log itself is left untouched.
+    Returns {name: {'present': int, 'total_sessions': int}}.
+    """
+    totals = AttendanceTotals()
+    start = start.encode('ascii') if start is not None else None
+    end = end.encode('ascii') if end is not None else None
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]), None)
+        if not header:
+            return {}
+        width = len(header)
+        date_col, name_col, status_col = (_column(header, c) for c in ('date', 'name', 'status'))
+        remainder = b''
+        while True:
+            block = f.read(chunk_bytes)
+            data = remainder + block
+            if not block:
+                remainder = b''
+            else:
+                # Keep the trailing partial line for the next chunk
+                cut = data.rfind(b'\n') + 1
+                data, remainder = data[:cut], data[cut:]
+            if data:
+                columns = _split_columns(data, width)
+                ids = totals.encode(columns[name_col])
+                present = np.fromiter(map(b'Present'.__eq__, columns[status_col]), dtype=bool, count=len(ids))
+                if start is not None or end is not None:
+                    # Few distinct dates per chunk: test each once, then broadcast
+                    dates = columns[date_col]
+                    in_window = {d: (start is None or d >= start) and (end is None or d <= end) for d in set(dates)}
+                    keep = np.fromiter(map(in_window.__getitem__, dates), dtype=bool, count=len(ids))
+                    ids, present = ids[keep], present[keep]
+                totals.add(ids, present)
+            if not block:
+                break
+    return totals.as_dict()
@@ -0,0 +1,71 @@
+# load_test_deepfake.py
+# Load test for a running deepfake server: throughput and latency percentiles
+# for the single-image endpoint (micro-batched or not, depending on how the
+# server was started) and for the batch endpoint.
+# Run from the repository root: python -m benchmarks.load_test_deepfake --url http://localhost:5001
+import argparse
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+
+
+def synthetic_face(rng, size=160):
+    crop = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    _, buffer = cv2.imencode('.jpg', crop)
+    return base64.b64encode(buffer).decode('utf-8')
+
+
+def run(send, payloads, concurrency):
+    """
+    Send every payload with the given concurrency. Returns (latencies, elapsed).
+    """
+    session_pool = [requests.Session() for _ in range(concurrency)]
+
+    def timed(i):
+        start = time.perf_counter()
+        response = send(session_pool[i % concurrency], payloads[i])
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(len(payloads))))
+    return np.array(latencies), time.perf_counter() - start
+
+
+def report(label, latencies, elapsed, images):
+    print(f"{label:>28} {images / elapsed:>10.1f} {np.percentile(latencies, 50) * 1000:>9.1f} {np.percentile(latencies, 99) * 1000:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deepfake server load test")
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    images = [synthetic_face(rng) for _ in range(args.requests)]
+    batches = [images[i:i + args.batch_size] for i in range(0, len(images), args.batch_size)]
+
+    def send_single(session, image):
+        return session.post(f"{args.url}/detect_deepfake", json={'image': image}, timeout=30)
+
+    def send_batch(session, batch):
+        return session.post(f"{args.url}/detect_deepfake/batch", json={'images': batch}, timeout=30)
+
+    print(f"{'path':>28} {'images/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        latencies, elapsed = run(send_single, images, concurrency)
+        report(f"single x{concurrency}", latencies, elapsed, len(images))
+        latencies, elapsed = run(send_batch, batches, concurrency)
+        report(f"batch[{args.batch_size}] x{concurrency}", latencies, elapsed, len(images))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# replay_attendance.py
+# Headless replay of a recorded video or image directory through the
+# attendance path used in production (YOLO -> InsightFace -> gallery match
+# -> deepfake RPC -> liveliness -> CSV record, via utils.engine; main.py's
+# pipeline stages run the same FrameProcessor steps), with no
+# camera, GUI, class schedule or Docker service. Deepfake calls go over HTTP
+# to a local stub server, and the gallery is an embedding store of
+# synthetic identities (optionally on top of a real store). People seen in
+# the first frames of the recording are enrolled too, so recognized faces
+# go on through verification, liveliness and recording. Writes a JSON
+# report with per-stage latency percentiles, FPS, CPU and peak memory so
+# runs can be compared between releases.
+# Run from the repository root:
+#   python -m benchmarks.replay_attendance --video classroom.mp4 --gallery-size 5000 --report replay.json
+import argparse
+import glob
+import json
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_ann_index import synthetic_gallery
+from utils.attendance_store import AttendanceStore
+from utils.deepfake_client import DeepfakeClient
+from utils.embedding_store import StoreWatcher, open_store, write_store
+from utils.ann_index import l2_normalize
+from utils.engine import AttendanceEngine, CameraStream, ClassroomSession, FairScheduler
+from utils.matcher import build_gallery
+from utils.motion import AdaptiveSampler
+from utils.recognizer import MODE_CROP, MODE_FULL_FRAME, CropRecognizer, make_recognizer
+from utils.yolo_utils import detect_people_batch
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+class StubDeepfakeServer:
+    """
+    Local HTTP server speaking the deepfake server's single-image protocol.
+    Every face is "Real" after latency_ms, so RPC cost is measured without
+    the model.
+    """
+
+    def __init__(self, latency_ms=5.0):
+        latency = latency_ms / 1000.0
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply({'formats': ['raw', 'jpeg', 'json']})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(latency)
+                self._reply({'label': 'Real', 'confidence': 0.99})
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/detect_deepfake"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='stub-deepfake', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ReplayStream(CameraStream):
+    """
+    Frames from a video file or an image directory, read on demand so every
+    frame is processed (no latest-frame dropping as with a live camera).
+    """
+
+    def __init__(self, stream_id, source, max_frames=None):
+        super().__init__(stream_id, source)
+        self.max_frames = max_frames
+        self._images = None
+
+    def start(self):
+        if os.path.isdir(str(self.source)):
+            self._images = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(self.source, pattern)))
+        else:
+            self._cap = cv2.VideoCapture(self.source)
+            if not self._cap.isOpened():
+                # A recording that does not open will not open later: end the
+                # session instead of letting the engine retry it
+                self.finished = True
+                raise RuntimeError(f"Could not open video source {self.source!r} for stream {self.stream_id}")
+        self.started = True
+
+    def _read(self):
+        if self._images is not None:
+            while self.captured < len(self._images):
+                frame = cv2.imread(self._images[self.captured])
+                self.captured += 1
+                if frame is not None:
+                    return frame
+            return None
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        self.captured += 1
+        return frame
+
+    def latest(self):
+        if self.finished:
+            return None
+        frame = None if self.max_frames is not None and self.captured >= self.max_frames else self._read()
+        if frame is None:
+            self.finished = True
+            return None
+        return time.monotonic(), frame
+
+
+def enroll_from_source(source, app, frames, same_person=0.5):
+    """
+    Embed the faces in the first frames of the recording and group them
+    into identities, returning one embedding per person found.
+    """
+    stream = ReplayStream('enroll', source, max_frames=frames)
+    stream.start()
+    recognizer = CropRecognizer(app)
+    people = []
+    try:
+        while True:
+            item = stream.latest()
+            if item is None:
+                break
+            frame = item[1]
+            boxes = detect_people_batch([frame])[0]
+            for embedding in recognizer.embed(frame, boxes, range(len(boxes))):
+                if embedding is None:
+                    continue
+                embedding = l2_normalize(np.asarray(embedding, dtype=np.float32)[None])[0]
+                if not people or max(float(p @ embedding) for p in people) < same_person:
+                    people.append(embedding)
+    finally:
+        stream.stop()
+    return people
+
+
+def build_replay_store(store_dir, gallery_size, images_per_identity, base_store=None, enrolled=(), seed=0):
+    """
+    Write an embedding store holding gallery_size synthetic identities, the
+    enrolled embeddings, and every embedding of base_store when given.
+    """
+    embeddings, names = [], []
+    if enrolled:
+        embeddings.append(np.stack(enrolled))
+        names.extend(f"replay_person_{i}" for i in range(len(enrolled)))
+    if base_store:
+        store = open_store(base_store)
+        embeddings.append(np.asarray(store.embeddings, dtype=np.float32))
+        names.extend(store.names)
+    if gallery_size:
+        dim = embeddings[0].shape[1] if embeddings else 512
+        _, vectors, ids = synthetic_gallery(np.random.default_rng(seed), gallery_size, images_per_identity, dim, 1.2)
+        embeddings.append(vectors)
+        names.extend(f"synthetic_{i}" for i in ids)
+    write_store(store_dir, np.concatenate(embeddings), names, model='replay')
+    return len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless attendance pipeline replay benchmark")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help="recorded video file")
+    source.add_argument('--images', help="directory of frames")
+    parser.add_argument('--max-frames', type=int)
+    parser.add_argument('--gallery-size', type=int, default=1000, help="synthetic identities")
+    parser.add_argument('--images-per-identity', type=int, default=3)
+    parser.add_argument('--store', help="real embedding store to include, e.g. data/encodings/store")
+    parser.add_argument('--enroll-frames', type=int, default=30, help="frames scanned to enroll the people in the recording")
+    parser.add_argument('--deepfake-url', help="use a running deepfake server instead of the stub")
+    parser.add_argument('--deepfake-latency-ms', type=float, default=5.0, help="stub server latency")
+    parser.add_argument('--recognition-mode', choices=(MODE_CROP, MODE_FULL_FRAME), default=MODE_CROP)
+    parser.add_argument('--motion-gating', action='store_true', help="skip frames as a live session would")
+    parser.add_argument('--ctx-id', type=int, default=-1, help="InsightFace device, -1 for CPU")
+    parser.add_argument('--report', default='replay_report.json')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    from insightface.app import FaceAnalysis
+
+    work_dir = tempfile.mkdtemp(prefix='replay-')
+    store_dir = os.path.join(work_dir, 'store')
+    setup_start = time.perf_counter()
+    app = FaceAnalysis(name='buffalo_l')
+    app.prepare(ctx_id=args.ctx_id)
+    enrolled = enroll_from_source(args.video or args.images, app, args.enroll_frames) if args.enroll_frames else []
+    embeddings = build_replay_store(store_dir, args.gallery_size, args.images_per_identity, args.store, enrolled)
+    gallery = StoreWatcher(store_dir, build_gallery)
+    stub = None if args.deepfake_url else StubDeepfakeServer(args.deepfake_latency_ms).start()
+    deepfake_client = DeepfakeClient(args.deepfake_url or stub.url)
+    setup_seconds = time.perf_counter() - setup_start
+
+    now = datetime.now()
+    stream = ReplayStream('replay', args.video or args.images, max_frames=args.max_frames)
+    session = ClassroomSession('replay', stream, now - timedelta(seconds=1), now + timedelta(days=1),
+                               os.path.join(work_dir, 'attendance.csv'))
+    if not args.motion_gating:
+        # idle_interval=0 admits every frame
+        session.sampler = AdaptiveSampler(idle_interval=0.0)
+    attendance_store = AttendanceStore(os.path.join(work_dir, 'attendance.db'))
+    engine = AttendanceEngine([session], app, gallery, deepfake_client, FairScheduler(max_batch=1),
+                              recognizer=make_recognizer(app, args.recognition_mode), store=attendance_store)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        engine.run(idle_sleep=0)
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+    finally:
+        attendance_store.close()
+        deepfake_client.close()
+        if stub is not None:
+            stub.stop()
+
+    engine_report = engine.report()
+    report = {
+        'source': args.video or args.images,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'frames': engine.frames,
+        'wall_seconds': wall_seconds,
+        'fps': engine.frames / wall_seconds if wall_seconds > 0 else 0.0,
+        'cpu_seconds': cpu_seconds,
+        'cpu_utilization': cpu_seconds / wall_seconds if wall_seconds > 0 else 0.0,
+        'fps_per_core': engine.frames / cpu_seconds if cpu_seconds > 0 else 0.0,
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'setup_seconds': setup_seconds,
+        'gallery': {'embeddings': embeddings, 'enrolled_from_source': len(enrolled), 'identities': len(gallery.get().identities), 'index': gallery.get().index.kind},
+        'stages': engine_report['stages'],
+        'frame_latency': engine_report['streams']['replay']['latency'],
+        'present': len(session.attendance),
+        'tracker': session.tracker.summary(),
+        'sampling': session.sampler.summary(),
+        'liveliness': session.liveliness.summary(),
+        'deepfake_client': deepfake_client.summary(),
+        'attendance_store': attendance_store.summary(),
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['frames']} frames in {wall_seconds:.1f} s: {report['fps']:.1f} FPS, "
+          f"{report['fps_per_core']:.2f} frames per CPU-second, peak RSS {report['peak_rss_mib']:.0f} MiB")
+    print(f"{'stage':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:>10} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['max_ms']:>8.1f}")
+    print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# convert_deepfake_model.py
+# Offline conversion of the Keras deepfake model to ONNX or TFLite, with
+# optional fp16/int8 quantization and an accuracy-parity check against the
+# original model. Needs the full TensorFlow stack plus tf2onnx (ONNX) or
+# nothing extra (TFLite); the converted models are then served with
+# DEEPFAKE_BACKEND=onnx or DEEPFAKE_BACKEND=tflite.
+#
+#   python convert_deepfake_model.py --format onnx --quantize int8 --samples data/deepfake_samples
+import argparse
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from utils.deepfake_backends import DEFAULT_MODEL_PATHS, load_backend
+from utils.face_transport import RAW_SHAPE, preprocess_face
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_samples(samples_dir=None, count=64, seed=0):
+    """
+    Load and preprocess the sample images used for calibration and parity.
+    Falls back to synthetic images when no sample directory is given.
+    """
+    images = []
+    if samples_dir:
+        for root, _, files in os.walk(samples_dir):
+            for file_name in sorted(files):
+                img = cv2.imread(os.path.join(root, file_name))
+                if img is not None:
+                    images.append(preprocess_face(img))
+        if not images:
+            raise ValueError(f"No readable images found in {samples_dir}")
+        return np.stack(images)
+    logger.warning("No --samples directory given; using synthetic images (parity only, not accuracy)")
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (count,) + RAW_SHAPE, dtype=np.uint8)
+    return np.stack([preprocess_face(cv2.GaussianBlur(img, (9, 9), 0)) for img in noise])
+
+
+def convert_to_onnx(keras_path, output_path, quantize=None, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(keras_path)
+    spec = (tf.TensorSpec((None,) + RAW_SHAPE, tf.float32, name='input'),)
+    float_path = output_path if quantize is None else output_path + '.float.onnx'
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=float_path)
+
+    if quantize == 'int8':
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+    elif quantize == 'fp16':
+        import onnx
+        from onnxconverter_common import float16
+        model_fp16 = float16.convert_float_to_float16(onnx.load(float_path), keep_io_types=True)
+        onnx.save(model_fp16, output_path)
+    if quantize is not None:
+        os.remove(float_path)
+
+
+def convert_to_tflite(keras_path, output_path, quantize=None, calibration=None):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == 'fp16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        # Full-integer kernels calibrated on the sample set; inputs and outputs stay float
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image[None, ...]] for image in calibration)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def check_parity(reference, candidate, samples, batch_size=16):
+    """
+    Compare the candidate backend's predictions with the reference backend's
+    on the sample set.
+    """
+    expected = np.concatenate([reference.predict(samples[i:i + batch_size]) for i in range(0, len(samples), batch_size)])
+    actual = np.concatenate([candidate.predict(samples[i:i + batch_size]) for i in range(0, len(samples), batch_size)])
+    diff = np.abs(expected - actual)
+    return {
+        'samples': len(samples),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'label_agreement': float(np.mean((expected > 0.5) == (actual > 0.5))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the Keras deepfake model for ONNX Runtime or TFLite")
+    parser.add_argument('--format', choices=['onnx', 'tflite'], required=True)
+    parser.add_argument('--quantize', choices=['fp16', 'int8'], default=None)
+    parser.add_argument('--keras-model', default=DEFAULT_MODEL_PATHS['keras'])
+    parser.add_argument('--output', default=None, help="defaults to the backend's path under models/")
+    parser.add_argument('--samples', default=None, help="directory of face crops for calibration and parity")
+    parser.add_argument('--min-agreement', type=float, default=0.99, help="fail if label agreement falls below this")
+    args = parser.parse_args()
+
+    output_path = args.output or DEFAULT_MODEL_PATHS[args.format]
+    samples = load_samples(args.samples)
+
+    logger.info(f"Converting {args.keras_model} to {args.format} ({args.quantize or 'float32'}) at {output_path}")
+    if args.format == 'onnx':
+        convert_to_onnx(args.keras_model, output_path, args.quantize)
+    else:
+        convert_to_tflite(args.keras_model, output_path, args.quantize, samples)
+
+    parity = check_parity(load_backend('keras', args.keras_model), load_backend(args.format, output_path), samples)
+    logger.info(f"Parity on {parity['samples']} samples: label agreement {parity['label_agreement']:.2%}, "
+                f"max |diff| {parity['max_abs_diff']:.4f}, mean |diff| {parity['mean_abs_diff']:.4f}")
+    if parity['label_agreement'] < args.min_agreement:
+        logger.error(f"Label agreement {parity['label_agreement']:.2%} is below {args.min_agreement:.2%}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
 import os
 import base64
 import logging
+import threading
+import time
+from utils.batcher import MicroBatcher
+from utils.metrics import MetricsRegistry
+from utils.deepfake_backends import load_backend
+from utils.face_transport import (
+    FORMATS, RAW_SHAPE, STREAM_CONTENT_TYPE, decode_payload, decode_stream, format_for_content_type, preprocess_face,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,43 +19,169 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Micro-batching: single-image requests arriving within MAX_WAIT_MS of each
+# other are coalesced into one model.predict call of up to MAX_BATCH_SIZE images
+MICRO_BATCHING = os.environ.get('DEEPFAKE_MICRO_BATCHING', '1') == '1'
+MAX_BATCH_SIZE = int(os.environ.get('DEEPFAKE_MAX_BATCH_SIZE', '16'))
+MAX_WAIT_MS = float(os.environ.get('DEEPFAKE_MAX_WAIT_MS', '5'))
+
+# Inference backend: 'keras' (the original .h5 model), or 'onnx' / 'tflite'
+# models produced by convert_deepfake_model.py, which avoid loading TensorFlow
+BACKEND = os.environ.get('DEEPFAKE_BACKEND', 'keras')
+MODEL_PATH = os.environ.get('DEEPFAKE_MODEL_PATH') or None
+
 # Load the deepfake detection model
-model_path = 'models/deepfake-detection-model.h5'
-if not os.path.exists(model_path):
-    logger.error(f"Model file not found at {model_path}")
-    raise FileNotFoundError(f"Model file not found at {model_path}")
-model = load_model(model_path)
+try:
+    model = load_backend(BACKEND, MODEL_PATH)
+except FileNotFoundError as e:
+    logger.error(str(e))
+    raise
 logger.info("Deepfake model loaded successfully")
 
+# Set once the first warm-up inference has completed; /healthz reports
+# ready only after that so no client pays for lazy graph initialization
+model_ready = threading.Event()
+
+# Metrics and readiness are per gunicorn worker: each worker process keeps its
+# own registry, and a scrape or health check reaches whichever worker accepts
+# it. Every sample carries the worker's pid so series from different workers
+# never mix; sum over the worker label for service totals.
+WORKER = os.getpid()
+metrics = MetricsRegistry(const_labels={'worker': WORKER}, header=(
+    f"Metrics of deepfake server worker pid {WORKER} only, not of the whole service.",
+    "Each gunicorn worker keeps its own values; sum over the worker label across scrapes for totals.",
+))
+REQUESTS = metrics.counter('deepfake_requests_total', 'HTTP requests by endpoint and status')
+REQUEST_LATENCY = metrics.histogram('deepfake_request_latency_seconds', 'HTTP request latency by endpoint')
+INFERENCE_LATENCY = metrics.histogram('deepfake_inference_latency_seconds', 'model.predict latency per batch')
+BATCH_SIZE = metrics.histogram('deepfake_batch_size', 'Images per model.predict call', buckets=(1, 2, 4, 8, 16, 32, 64))
+IMAGES = metrics.counter('deepfake_images_total', 'Images classified by label')
+
+
+def decode_image(img_base64):
+    """
+    Decode a base64-encoded image into a BGR array, or None if it is invalid.
+    """
+    try:
+        img_data = base64.b64decode(img_base64, validate=True)
+    except (ValueError, TypeError):
+        return None
+    if not img_data:
+        return None
+    try:
+        return cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+
+
+def predict_batch(images):
+    """
+    Run the model once on a list of preprocessed images and return a
+    (label, confidence) pair per image.
+    """
+    start = time.perf_counter()
+    predictions = model.predict(np.stack(images))
+    INFERENCE_LATENCY.observe(time.perf_counter() - start)
+    BATCH_SIZE.observe(len(images))
+    results = []
+    for prediction in predictions:
+        label = 'Fake' if prediction <= 0.5 else 'Real'
+        confidence = float(prediction) if label == 'Real' else float(1 - prediction)
+        IMAGES.inc(label=label)
+        results.append((label, confidence))
+    return results
+
+
+def warm_up():
+    """
+    Run dummy inferences at batch size 1 and the maximum batch size so the
+    model graph is built before the first real request.
+    """
+    start = time.perf_counter()
+    try:
+        blank = np.zeros((200, 200, 3), dtype=np.float32)
+        for batch_size in sorted({1, MAX_BATCH_SIZE}):
+            model.predict(np.stack([blank] * batch_size))
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {e}")
+        return
+    model_ready.set()
+    logger.info(f"Model warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+batcher = MicroBatcher(predict_batch, MAX_BATCH_SIZE, MAX_WAIT_MS) if MICRO_BATCHING else None
+
+# Every worker process imports this module, so each loads and warms its own model
+threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if 'request_start' in g:
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Readiness of the worker that answered, not of every worker
+    if not model_ready.is_set():
+        return jsonify({'status': 'warming_up', 'worker': WORKER}), 503
+    return jsonify({'status': 'ok', 'worker': WORKER})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+@app.route('/detect_deepfake/formats', methods=['GET'])
+def supported_formats():
+    # Lets clients negotiate the cheapest wire format this server understands
+    return jsonify({'formats': list(FORMATS), 'raw_shape': list(RAW_SHAPE)})
+
+
 @app.route('/detect_deepfake', methods=['POST'])
 def detect_deepfake():
     try:
-        # Expect a JSON payload with a base64-encoded image
-        data = request.get_json()
-        if not data or 'image' not in data:
-            logger.warning("No image provided in request")
-            return jsonify({'error': 'No image provided'}), 400
-
-        # Decode the base64 image
-        img_base64 = data['image']
-        img_data = base64.b64decode(img_base64)
-        npimg = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        binary_format = format_for_content_type(request.mimetype)
+        if binary_format is not None:
+            # Raw JPEG or pre-resized uint8 tensor body, decoded in place
+            body = request.get_data(cache=False)
+            if not body:
+                logger.warning("No image provided in request")
+                return jsonify({'error': 'No image provided'}), 400
+        else:
+            # Expect a JSON payload with a base64-encoded image
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict) or 'image' not in data:
+                logger.warning("No image provided in request")
+                return jsonify({'error': 'No image provided'}), 400
+        # An undecodable body is the client's error (400); clients only
+        # count 5xx replies as server outages
+        try:
+            img = decode_payload(body, binary_format) if binary_format is not None else decode_image(data['image'])
+        except (ValueError, TypeError) as e:
+            img = None
+            logger.warning(f"Malformed image payload: {e}")
 
         if img is None:
             logger.warning("Failed to decode image")
             return jsonify({'error': 'Failed to decode image'}), 400
 
-        # Preprocess the image
-        img = cv2.resize(img, (200, 200))
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = img / 255.0
-        img = np.expand_dims(img, axis=0)
-
-        # Make prediction
-        prediction = model.predict(img)[0][0]
-        label = 'Fake' if prediction <= 0.5 else 'Real'
-        confidence = float(prediction) if label == 'Real' else float(1 - prediction)
+        # Make prediction, sharing a model call with concurrent requests when batching
+        img = preprocess_face(img)
+        if batcher is not None:
+            label, confidence = batcher.predict(img)
+        else:
+            label, confidence = predict_batch([img])[0]
 
         logger.info(f"Prediction: {label}, Confidence: {confidence}")
         return jsonify({
@@ -59,5 +192,52 @@ def detect_deepfake():
         logger.error(f"Error processing image: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/detect_deepfake/batch', methods=['POST'])
+def detect_deepfake_batch():
+    try:
+        if request.mimetype == STREAM_CONTENT_TYPE:
+            # Length-prefixed stream of raw JPEG or uint8 tensor records
+            try:
+                images = decode_stream(request.get_data(cache=False))
+            except ValueError as e:
+                logger.warning(f"Malformed face stream: {e}")
+                return jsonify({'error': str(e)}), 400
+        else:
+            # Expect a JSON payload with a list of base64-encoded images
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict) or not isinstance(data.get('images'), list):
+                logger.warning("No image list provided in batch request")
+                return jsonify({'error': 'Expected a JSON object with an images list'}), 400
+            # decode_image returns None instead of raising, so one bad entry
+            # only fails its own slot
+            images = [decode_image(img_base64) for img_base64 in data['images']]
+        if not images:
+            logger.warning("No images provided in batch request")
+            return jsonify({'error': 'No images provided'}), 400
+
+        results = [None] * len(images)
+        valid_indices = []
+        valid_images = []
+        for i, img in enumerate(images):
+            if img is None:
+                results[i] = {'error': 'invalid image'}
+                continue
+            valid_indices.append(i)
+            valid_images.append(preprocess_face(img))
+
+        for start in range(0, len(valid_images), MAX_BATCH_SIZE):
+            chunk = predict_batch(valid_images[start:start + MAX_BATCH_SIZE])
+            for i, (label, confidence) in zip(valid_indices[start:start + MAX_BATCH_SIZE], chunk):
+                results[i] = {'label': label, 'confidence': confidence}
+
+        logger.info(f"Batch prediction for {len(results)} images ({len(valid_images)} decoded)")
+        return jsonify({'results': results})
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,21 @@
+# Production serving for the deepfake server:
+#   gunicorn -c gunicorn.conf.py deepfake_server:app
+import os
+
+bind = f"0.0.0.0:{os.environ.get('DEEPFAKE_PORT', '5001')}"
+
+# Each worker process loads and warms up its own copy of the Keras model.
+# Threads within a worker share that model and feed its micro-batcher.
+workers = int(os.environ.get('DEEPFAKE_WORKERS', '2'))
+threads = int(os.environ.get('DEEPFAKE_THREADS', '8'))
+worker_class = 'gthread'
+
+# TensorFlow is not fork-safe once initialized, and the micro-batcher and
+# warm-up threads would not survive the fork, so the app is loaded per worker
+preload_app = False
+
+# Model loading can take a while on a cold container
+timeout = int(os.environ.get('DEEPFAKE_WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 75
+accesslog = '-'
@@ -1,18 +1,19 @@
-from insightface.app import FaceAnalysis
-import numpy as np
-import pickle
 import cv2
 import csv
 from datetime import datetime, timedelta
-import requests
-import base64
 from utils.yolo_utils import detect_people
-from utils.liveliness import check_liveliness, reset_liveliness
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from utils.matcher import build_gallery
+from utils.embedding_store import StoreWatcher, current_version, migrate_pickle
+from utils.attendance_store import DB_PATH as ATTENDANCE_DB, LEGACY_DAILY, open_attendance_store
+from utils.engine import ClassroomSession, FrameProcessor
+from utils.motion import AdaptiveSampler
+from utils.recognizer import MODE_CROP, make_recognizer
+from utils.instrumentation import Instrumentation, MetricsServer, RateLimitedLog, SamplingProfiler, SnapshotWriter
+from utils.pipeline import Pipeline
+from utils.deepfake_client import DeepfakeClient, DEGRADED_LABEL
+from utils.mailer import Mailer
+from utils.scheduler import Scheduler, class_schedule
+from utils.startup import ModelLoader
 import time
 import os
 import logging
@@ -21,32 +22,72 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Queue depth and drop policy for the queue each pipeline stage writes to.
+# The camera queue keeps only the newest frame so a slow stage never lets
+# frames back up; rendered frames must not be dropped once verified.
+PIPELINE_QUEUES = {
+    'capture': (1, 'drop_oldest'),
+    'inference': (2, 'drop_oldest'),
+    'verification': (4, 'block'),
+}
+
+# When the deepfake server is unreachable, verdicts come back as "Unverified".
+# Fail open (still mark such students present, recorded as Unverified) so an
+# outage does not mark a whole class absent.
+DEEPFAKE_FAIL_OPEN = True
+
+# Motion-gated sampling: full rate while people move or are unrecognized,
+# otherwise one frame every SAMPLER_IDLE_INTERVAL seconds (kept below the
+# tracker's max_age so cached identities survive between samples)
+MOTION_GATING = True
+SAMPLER_IDLE_INTERVAL = 0.5
+
+# Face recognition: 'crop' runs InsightFace on every person crop, 'full_frame'
+# detects faces once per frame (over RECOGNITION_TILES rows x cols tiles for
+# high-resolution cameras) and embeds them in one batched ArcFace call
+RECOGNITION_MODE = MODE_CROP
+RECOGNITION_TILES = (1, 1)
+
+# Instrumentation: ATTENDANCE_METRICS_PORT serves Prometheus text on
+# localhost, ATTENDANCE_METRICS_SNAPSHOT writes periodic JSON snapshots and
+# ATTENDANCE_PROFILE=1 runs the sampling profiler for the session
+METRICS_PORT = int(os.environ.get('ATTENDANCE_METRICS_PORT', '0'))
+METRICS_SNAPSHOT_PATH = os.environ.get('ATTENDANCE_METRICS_SNAPSHOT')
+METRICS_SNAPSHOT_INTERVAL = 30.0
+PROFILE = os.environ.get('ATTENDANCE_PROFILE') == '1'
+PROFILE_OUTPUT = 'data/profile_collapsed.txt'
+# Seconds to keep delivering queued mail after the session; anything left
+# stays in data/outbox.db and is sent by the weekly-report service
+MAIL_DRAIN_TIMEOUT = float(os.environ.get('MAIL_DRAIN_TIMEOUT', '120'))
+CLASS_DURATION = timedelta(minutes=10)
+
 # Initialize resources
 cap = None
-daily_attendance_file = None
+session = None
+attendance_store = None
+mailer = None
+scheduler = None
 app = None
 
 try:
-    # Load known faces
-    encodings_path = 'data/encodings/face_encodings.pkl'
-    if not os.path.exists(encodings_path):
-        logger.error(f"Face encodings file not found at {encodings_path}")
-        exit(1)
-    with open(encodings_path, 'rb') as f:
-        known_encodings, known_names = pickle.load(f)
-
-    # Remove duplicates from known_names while preserving corresponding encodings
-    unique_names = []
-    unique_encodings = []
-    seen_names = set()
-    for name, encoding in zip(known_names, known_encodings):
-        if name not in seen_names:
-            unique_names.append(name)
-            unique_encodings.append(encoding)
-            seen_names.add(name)
-
-    known_names = unique_names
-    known_encodings = unique_encodings
+    # YOLO and InsightFace are imported, loaded and warmed up in the
+    # background while the configuration below is validated
+    model_loader = ModelLoader(ctx_id=0).start()
+
+    # Load known faces from the memory-mapped embedding store, migrating the
+    # legacy pickle once if that is all there is
+    store_dir = 'data/encodings/store'
+    legacy_encodings_path = 'data/encodings/face_encodings.pkl'
+    if current_version(store_dir) is None:
+        if not os.path.exists(legacy_encodings_path):
+            logger.error(f"Face embedding store not found at {store_dir}")
+            exit(1)
+        logger.warning(f"Migrating {legacy_encodings_path} to the embedding store at {store_dir}")
+        migrate_pickle(legacy_encodings_path, store_dir)
+
+    # New store versions published by encode_faces are swapped in mid-session
+    gallery = StoreWatcher(store_dir, build_gallery)
+    known_names = gallery.get().identities
     logger.info(f"Unique known names: {known_names}")
 
     # Load student emails from students.csv
@@ -102,6 +143,10 @@ try:
         logger.error(f"Error reading sender_credentials.csv: {e}")
         exit(1)
 
+    # Mail is queued in a persistent outbox and delivered in the background
+    # over pooled SMTP connections, starting with anything a previous run left
+    mailer = Mailer(SENDER_EMAIL, SENDER_APP_PASSWORD).start()
+
     # Load teacher details from teachers.csv
     TEACHER_DETAILS = {}
     teachers_file = 'data/teachers.csv'
@@ -131,6 +176,11 @@ try:
                 if field.lower() == 'class timing':
                     timing_column = field
                     break
+            schedule_column = None
+            for field in csv_reader.fieldnames:
+                if field.lower() == 'schedule':
+                    schedule_column = field
+                    break
 
             if not name_column:
                 logger.error("'Name' column not found in data/teachers.csv")
@@ -146,35 +196,47 @@ try:
             TEACHER_DETAILS = {
                 'name': teacher_data[name_column],
                 'email': teacher_data[email_column],
-                'class_timing': teacher_data[timing_column]
+                'class_timing': teacher_data[timing_column],
+                'schedule': teacher_data[schedule_column] if schedule_column else ''
             }
     except Exception as e:
         logger.error(f"Error reading teachers.csv: {e}")
         exit(1)
 
-    # Parse class start time
+    # The class follows its 'Schedule' (cron) from teachers.csv, or runs
+    # daily at its 'Class Timing'. Finished sessions are recorded by the
+    # scheduler, so a restart waits for the next session instead of
+    # repeating one, while a session still under way is joined late.
+    scheduler = Scheduler()
+    session_job = f"session:{TEACHER_DETAILS['name']}"
     try:
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        class_start_time = datetime.strptime(f"{current_date} {TEACHER_DETAILS['class_timing']}", "%Y-%m-%d %H:%M:%S")
-        class_end_time = class_start_time + timedelta(minutes=10)
-        logger.info(f"Class starts at: {class_start_time}")
-        logger.info(f"Class ends at: {class_end_time}")
-
-        current_time = datetime.now()
-        if current_time > class_end_time:
-            logger.error(f"The class timing ({TEACHER_DETAILS['class_timing']}) has already passed for today ({current_date})")
-            exit(1)
+        scheduler.add(session_job, class_schedule(TEACHER_DETAILS['class_timing'], TEACHER_DETAILS['schedule']), grace=CLASS_DURATION)
+        class_start_time = scheduler.next_due(session_job)
     except ValueError as e:
-        logger.error(f"Invalid 'Class Timing' format in data/teachers.csv. Expected format: HH:MM:SS (e.g., 21:00:00). Error: {e}")
+        logger.error(f"Invalid class schedule in data/teachers.csv. Expected 'Class Timing' as HH:MM:SS (e.g., 21:00:00) "
+                     f"or a cron 'Schedule' (e.g., '0 9 * * mon-fri'). Error: {e}")
+        exit(1)
+    class_end_time = class_start_time + CLASS_DURATION
+    current_date = class_start_time.strftime("%Y-%m-%d")
+    logger.info(f"Class starts at: {class_start_time}")
+    logger.info(f"Class ends at: {class_end_time}")
+
+    # Models are ready and warm before the wait, so the first frame of the
+    # session runs at steady-state latency
+    try:
+        app = model_loader.wait()
+    except RuntimeError as e:
+        logger.error(f"Could not load the models: {e}")
         exit(1)
+    model_loader.log_report()
+    recognizer = make_recognizer(app, RECOGNITION_MODE, RECOGNITION_TILES)
 
-    # Wait until class start time if we're early
-    if current_time < class_start_time:
-        wait_seconds = (class_start_time - current_time).total_seconds()
+    # Sleep until the class starts if we're early
+    wait_seconds = (class_start_time - datetime.now()).total_seconds()
+    if wait_seconds > 0:
         logger.info(f"Waiting for class to start in {wait_seconds:.0f} seconds...")
-        time.sleep(wait_seconds)
+        scheduler.wait_until(class_start_time)
 
-    attendance = {}
     # Try multiple camera indices
     # for index in range(3):  # Try indices 0, 1, 2
     cap = cv2.VideoCapture(1)
@@ -186,43 +248,30 @@ try:
         logger.error("Could not open camera with indices 0, 1, or 2. Please check your camera setup")
         exit(1)
 
-    app = FaceAnalysis(name='buffalo_l')
-    app.prepare(ctx_id=0)
-
-    reset_liveliness()
+    instrumentation = Instrumentation()
 
-    # Initialize weekly attendance CSV
-    weekly_attendance_file = 'data/weekly_attendance.csv'
-    if not os.path.exists('data'):
-        os.makedirs('data')
-    if not os.path.exists(weekly_attendance_file):
-        with open(weekly_attendance_file, 'w', newline='') as f:
-            csv_writer = csv.writer(f)
-            csv_writer.writerow(['Date', 'Name', 'Status'])
+    # Attendance records go to the SQLite store, keyed by date, class and
+    # student. The legacy weekly CSV log and the last session's
+    # attendance.csv are imported into it once, before the latter is rewritten.
+    class_name = TEACHER_DETAILS['name']
+    attendance_store = open_attendance_store(ATTENDANCE_DB, legacy_daily=LEGACY_DAILY)
 
-    # Open daily attendance CSV
-    daily_attendance_file = open('data/attendance.csv', 'w', newline='')
-    daily_writer = csv.writer(daily_attendance_file)
-    daily_writer.writerow(['Name', 'Entry Time', 'Deepfake Status', 'Liveliness Status'])
+    # Per-session state (tracker, motion gate, sampler, liveliness, marks)
+    # and the daily attendance CSV, as multi_classroom.py keeps per camera
+    session = ClassroomSession(class_name, None, class_start_time, class_end_time, 'data/attendance.csv')
+    session.sampler = AdaptiveSampler(idle_interval=SAMPLER_IDLE_INTERVAL)
+    session.open_output()
 
     # Corrected deepfake server URL (LOCAL)
     # DEEPFAKE_SERVER_URL = 'http://localhost:5001/detect_deepfake'
     # Update the URL to use the Docker service name
     DEEPFAKE_SERVER_URL = 'http://deepfake-server:5001/detect_deepfake'
-    def send_to_deepfake_server(face_crop):
-        try:
-            _, buffer = cv2.imencode('.jpg', face_crop)
-            img_base64 = base64.b64encode(buffer).decode('utf-8')
-            response = requests.post(DEEPFAKE_SERVER_URL, json={'image': img_base64})
-            response.raise_for_status()
-            result = response.json()
-            if 'error' in result:
-                logger.warning(f"Deepfake server error: {result['error']}")
-                return "Real", 0.0
-            return result['label'], result['confidence']
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error in deepfake detection: {e}")
-            return "Real", 0.0
+    deepfake_client = DeepfakeClient(DEEPFAKE_SERVER_URL)
+    logger.info(f"Sending face crops to the deepfake server as '{deepfake_client.wire_format}'")
+
+    # The per-frame steps shared with utils/engine.py and the replay harness
+    processor = FrameProcessor(recognizer, gallery, deepfake_client, fail_open=DEEPFAKE_FAIL_OPEN, store=attendance_store,
+                               instrumentation=instrumentation, per_frame_log=RateLimitedLog(logger))
 
     def send_absence_alerts(absent_students, all_students_emails):
         subject = "Absence Alert - Verify Absent Students"
@@ -240,24 +289,9 @@ try:
         AutoAttendance System
         """
 
-        try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
-            for student, email in all_students_emails.items():
-                try:
-                    msg = MIMEMultipart()
-                    msg['From'] = SENDER_EMAIL
-                    msg['To'] = email
-                    msg['Subject'] = subject
-                    msg.attach(MIMEText(body, 'plain'))
-                    server.sendmail(SENDER_EMAIL, email, msg.as_string())
-                    logger.info(f"Sent absence alert to {student} at {email}")
-                except Exception as e:
-                    logger.error(f"Error sending absence alert to {student} at {email}: {e}")
-            server.quit()
-        except Exception as e:
-            logger.error(f"Error connecting to SMTP server for absence alerts: {e}")
+        # One shared body for everyone; delivery happens in the background
+        queued = mailer.enqueue(subject, body, list(all_students_emails.values()))
+        logger.info(f"Queued absence alerts for {queued} students")
 
     def generate_attendance_summary(present_students, absent_students):
         present_list = []
@@ -266,7 +300,14 @@ try:
         present_summary = "; ".join(present_list) if present_list else "None"
         absent_summary = ", ".join(absent_students) if absent_students else "None"
         
-        summary = f"On {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} IST, the attendance session recorded the following: {present_summary}. All present students were verified as real (Deepfake: Real) and live (Liveliness: Live). The following students were absent: {absent_summary}."
+        # With DEEPFAKE_FAIL_OPEN, students seen while the deepfake server was
+        # unavailable are present but unverified; say so instead of claiming all were checked
+        unverified = [student['Name'] for student in present_students if student['Deepfake Status'] != "Real"]
+        verification = f"{len(present_students) - len(unverified)} of {len(present_students)} present students were verified as real (Deepfake: Real), and all were live (Liveliness: Live)."
+        if unverified:
+            verification += f" {len(unverified)} could not be checked for deepfakes and were marked present as {DEGRADED_LABEL}: {', '.join(unverified)}."
+
+        summary = f"On {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} IST, the attendance session recorded the following: {present_summary}. {verification} The following students were absent: {absent_summary}."
 
         with open('data/attendance_summary.txt', 'w') as summary_file:
             summary_file.write(summary)
@@ -305,112 +346,164 @@ try:
         AutoAttendance System
         """
 
-        try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
-            msg = MIMEMultipart()
-            msg['From'] = SENDER_EMAIL
-            msg['To'] = teacher_email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-            with open(report_file_path, 'rb') as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename=attendance_report.csv')
-            msg.attach(part)
-            server.sendmail(SENDER_EMAIL, teacher_email, msg.as_string())
-            logger.info(f"Sent attendance report to {teacher_email}")
-            server.quit()
-        except Exception as e:
-            logger.error(f"Error sending attendance report to {teacher_email}: {e}")
-
-    # Main attendance loop
-    while True:
-        current_time = datetime.now()
-        if current_time >= class_end_time:
-            logger.info("Class session ended. Stopping attendance capture")
-            break
-
-        ret, frame = cap.read()
-        if not ret:
-            logger.warning("Failed to capture frame")
-            continue
-
-        boxes = detect_people(frame)
-        logger.info(f"YOLO detected {len(boxes)} people: {boxes}")
-
-        for (x1, y1, x2, y2) in boxes:
-            face_crop = frame[y1:y2, x1:x2]
-            faces = app.get(face_crop)
-            logger.info(f"InsightFace detected {len(faces)} faces")
-            name = "Unknown"
-            deepfake_status = "Unknown"
-            confidence = 0.0
-            liveliness_status = "Unknown"
-
-            if faces:
-                embedding = faces[0].embedding
-                similarities = [np.dot(embedding, known) / (np.linalg.norm(embedding) * np.linalg.norm(known)) for known in known_encodings]
-                best_match_index = int(np.argmax(similarities))
-                similarity_score = similarities[best_match_index]
-                logger.info(f"Similarity score for detected face: {similarity_score:.2f}")
-                if similarity_score > 0.4:
-                    name = known_names[best_match_index]
-                    logger.info(f"Recognized: {name}")
-
-                    deepfake_status, confidence = send_to_deepfake_server(face_crop)
-                    logger.info(f"Deepfake result for {name}: {deepfake_status}, Confidence: {confidence:.2f}")
-
-                    is_live = check_liveliness(name, (x1, y1, x2, y2))
-                    logger.info(f"Raw liveliness result for {name}: {is_live}")
-                    liveliness_status = "Live" if is_live else "Static"
-                    logger.info(f"Liveliness result for {name}: {liveliness_status}")
-
-                    if name not in attendance and deepfake_status == "Real" and liveliness_status == "Live":
-                        entry_time = datetime.now().strftime("%H:%M:%S")
-                        attendance[name] = entry_time
-                        logger.info(f"Marked present: {name} at {entry_time} (Deepfake: {deepfake_status}, Confidence: {confidence:.2f}, Liveliness: {liveliness_status})")
-                        daily_writer.writerow([name, entry_time, deepfake_status, liveliness_status])
-                        daily_attendance_file.flush()
-
-                        with open(weekly_attendance_file, 'a', newline='') as f:
-                            csv_writer = csv.writer(f)
-                            csv_writer.writerow([datetime.now().strftime('%Y-%m-%d'), name, 'Present'])
-                    else:
-                        logger.warning(f"Failed to mark {name} as present. Deepfake: {deepfake_status}, Liveliness: {liveliness_status}")
-                else:
-                    logger.info("Similarity score too low. Face not recognized")
-            else:
-                logger.info("No face detected in this frame")
-
-            label = f"{name} ({deepfake_status}, {confidence:.2f}, {liveliness_status})"
-            cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0) if deepfake_status == "Real" and liveliness_status == "Live" else (0, 0, 255), 2)
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0) if deepfake_status == "Real" and liveliness_status == "Live" else (0, 0, 255), 2)
-
-        cv2.imshow("Auto Attendance - InsightFace", frame)
-        if cv2.waitKey(1) & 0xFF == ord('x'):
-            logger.info("Session ended early by user")
-            break
-
-    # Append absent students to weekly attendance
-    with open(weekly_attendance_file, 'a', newline='') as f:
-        csv_writer = csv.writer(f)
-        absent_students = [name for name in known_names if name not in attendance]
-        for student in absent_students:
-            csv_writer.writerow([datetime.now().strftime('%Y-%m-%d'), student, 'Absent'])
+        with open(report_file_path, 'rb') as attachment:
+            mailer.enqueue(subject, body, [teacher_email], attachment=('attendance_report.csv', attachment.read()))
+        logger.info(f"Queued attendance report for {teacher_email}")
+
+    def run_inference(packet):
+        """
+        Detect people, track them and recognize faces on tracks without a
+        cached identity. Attaches one detection dict per person box.
+        """
+        frame = packet.frame
+        if MOTION_GATING and not session.sampler.admit(session.gate, frame, session.tracker):
+            # Still scene with everyone resolved: skip the models for this frame
+            instrumentation.frames.inc(outcome='skipped')
+            return packet
+        instrumentation.frames.inc(outcome='inferred')
+        inference_start = time.perf_counter()
+        with instrumentation.stage('detect'):
+            boxes = detect_people(frame)
+        with instrumentation.stage('recognize'):
+            packet.detections, pending = processor.recognize(session, frame, boxes)
+        with instrumentation.stage('match'):
+            processor.match(pending)
+        session.sampler.record_cost(time.perf_counter() - inference_start)
+        return packet
+
+    def run_verification(packet):
+        """
+        Run the deepfake and liveliness checks for recognized people, reusing
+        results cached on their track.
+        """
+        stage_start = time.perf_counter()
+        if processor.verify([(session, packet.detections)]):
+            instrumentation.observe_stage('verify', time.perf_counter() - stage_start)
+        stage_start = time.perf_counter()
+        if processor.check_liveliness(session, packet.detections):
+            instrumentation.observe_stage('liveliness', time.perf_counter() - stage_start)
+        return packet
+
+    def record_and_render(packet):
+        """
+        Mark verified students present, persist them and draw the overlays.
+        """
+        frame = packet.frame
+        record_start = time.perf_counter()
+        # Store writes are buffered; they are flushed in batches from the main loop
+        processor.record(session, packet.detections)
+        for detection in packet.detections:
+            deepfake_status, liveliness_status = detection['deepfake_status'], detection['liveliness_status']
+            x1, y1, x2, y2 = detection['box']
+            color = (0, 255, 0) if deepfake_status == "Real" and liveliness_status == "Live" else (0, 0, 255)
+            label = f"{detection['name']} ({deepfake_status}, {detection['confidence']:.2f}, {liveliness_status})"
+            cv2.putText(frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        instrumentation.observe_stage('record', time.perf_counter() - record_start)
+
+    # Main attendance loop: capture, inference and verification run on their
+    # own threads; persisting and the GUI stay on the main thread
+    pipeline = Pipeline(
+        cap.read,
+        [('inference', run_inference), ('verification', run_verification)],
+        queues=PIPELINE_QUEUES,
+    )
+    metrics_server = MetricsServer(instrumentation.registry, METRICS_PORT).start() if METRICS_PORT else None
+    snapshot_writer = SnapshotWriter(instrumentation.registry, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL).start() if METRICS_SNAPSHOT_PATH else None
+    profiler = SamplingProfiler().start() if PROFILE else None
+    pipeline.start()
+    try:
+        while True:
+            current_time = datetime.now()
+            if current_time >= class_end_time:
+                logger.info("Class session ended. Stopping attendance capture")
+                break
+
+            flush_start = time.perf_counter()
+            if attendance_store.flush_due():
+                instrumentation.observe_stage('store_write', time.perf_counter() - flush_start)
+
+            packet = pipeline.get(timeout=0.1)
+            if packet is None:
+                continue
+
+            render_start = time.monotonic()
+            record_and_render(packet)
+            pipeline.record('render', time.monotonic() - render_start)
+
+            cv2.imshow("Auto Attendance - InsightFace", packet.frame)
+            if cv2.waitKey(1) & 0xFF == ord('x'):
+                logger.info("Session ended early by user")
+                break
+    finally:
+        pipeline.stop()
+        if profiler is not None:
+            profiler.stop()
+        if snapshot_writer is not None:
+            snapshot_writer.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+    if profiler is not None:
+        profiler.write_collapsed(PROFILE_OUTPUT)
+        logger.info(f"Sampling profile: {profiler.samples} samples, folded stacks written to {PROFILE_OUTPUT}")
+        for function, own_samples, total_samples in profiler.report(top=10):
+            logger.info(f"  {own_samples:>6} self {total_samples:>6} total  {function}")
+
+    stage_stats = instrumentation.stage_seconds.snapshot()
+    for labels, series in stage_stats.items():
+        if series['count']:
+            logger.info(f"Stage timer {labels}: {series['count']} calls, mean {series['sum'] / series['count'] * 1000:.1f} ms")
+
+    pipeline_stats = pipeline.report()
+    for stage, stats in pipeline_stats['stages'].items():
+        logger.info(f"Stage {stage}: {stats['count']} frames, mean {stats['mean_ms']:.1f} ms, "
+                    f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, dropped {pipeline_stats['dropped'].get(stage, 0)}")
+    logger.info(f"Pipeline: {pipeline_stats['frames_out']} frames at {pipeline_stats['fps']:.1f} FPS, "
+                f"end-to-end p50 {pipeline_stats['end_to_end']['p50_ms']:.1f} ms, p95 {pipeline_stats['end_to_end']['p95_ms']:.1f} ms")
+
+    cache_stats = session.tracker.summary()
+    logger.info(f"Recognition cache: hit rate {cache_stats['hit_rate']:.1%}, "
+                f"InsightFace calls {cache_stats['insightface_calls']} (saved {cache_stats['insightface_saved']}, "
+                f"detector-only keypoint passes {cache_stats['detector_calls']}), "
+                f"deepfake calls {cache_stats['deepfake_calls']} (saved {cache_stats['deepfake_saved']}), "
+                f"liveliness checks {cache_stats['liveliness_calls']} (saved {cache_stats['liveliness_saved']})")
+
+    sampler_stats = session.sampler.summary()
+    logger.info(f"Motion gating: {sampler_stats['processed']} of {sampler_stats['frames']} frames inferred "
+                f"({sampler_stats['skip_rate']:.1%} skipped, ~{sampler_stats['est_seconds_saved']:.1f} s of inference saved), "
+                f"newcomer detection latency p50 {sampler_stats['newcomer_p50_s']:.2f} s, max {sampler_stats['newcomer_max_s']:.2f} s "
+                f"over {sampler_stats['newcomers']} students")
+
+    client_stats = deepfake_client.summary()
+    logger.info(f"Deepfake client: {client_stats['verified']} verified, {client_stats['degraded']} degraded "
+                f"({client_stats['errors']} errors, {client_stats['rejected']} rejected crops, {client_stats['short_circuited']} short-circuited), "
+                f"circuit {client_stats['breaker_state']} after {client_stats['breaker_trips']} trips")
+    deepfake_client.close()
+
+    # Students enrolled by a store version swapped in mid-session count too
+    known_names = list(dict.fromkeys(known_names + gallery.get().identities))
+
+    # Record absent students and write out everything still buffered
+    absent_students = [name for name in known_names if name not in session.attendance]
+    attendance_store.mark_absent(current_date, class_name, absent_students)
+    attendance_store.flush()
+    # Recorded before any mail is queued so a restart never repeats the alerts
+    scheduler.finish(session_job, class_start_time)
+    store_stats = attendance_store.summary()
+    logger.info(f"Attendance store: {store_stats['records']} records in {store_stats['flushes']} transactions, "
+                f"mean {store_stats['mean_flush_ms']:.2f} ms per transaction")
 
     logger.info(f"Absent students: {absent_students}")
 
     if absent_students:
         send_absence_alerts(absent_students, STUDENT_EMAILS)
 
-    present_students = []
-    with open('data/attendance.csv', 'r') as attendance_file:
-        csv_reader = csv.DictReader(attendance_file)
-        for row in csv_reader:
-            present_students.append(row)
+    present_students = [
+        {'Name': row['student'], 'Entry Time': row['entry_time'],
+         'Deepfake Status': row['deepfake_status'], 'Liveliness Status': row['liveliness_status']}
+        for row in attendance_store.session(current_date, class_name) if row['status'] == 'Present'
+    ]
 
     generate_attendance_summary(present_students, absent_students)
     send_attendance_report_to_teacher(known_names, present_students, TEACHER_DETAILS['email'], class_start_time)
@@ -419,6 +512,15 @@ finally:
     if cap is not None:
         cap.release()
     cv2.destroyAllWindows()
-    if daily_attendance_file is not None:
-        daily_attendance_file.close()
+    if session is not None:
+        session.close()
+    if attendance_store is not None:
+        attendance_store.close()
+    if scheduler is not None:
+        scheduler.close()
+    if mailer is not None:
+        mailer.stop(drain_timeout=MAIL_DRAIN_TIMEOUT)
+        mail_stats = mailer.summary()
+        logger.info(f"Mail: {mail_stats['sent']} sent, {mail_stats['retried']} retries scheduled, "
+                    f"{mail_stats['failed']} failed over {mail_stats['connections']} SMTP sessions")
     logger.info("Resources cleaned up successfully")
\ No newline at end of file
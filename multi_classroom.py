@@ -0,0 +1,271 @@
+import csv
+import os
+import re
+import logging
+from datetime import datetime, timedelta
+from utils.attendance_store import DB_PATH as ATTENDANCE_DB, PRESENT, open_attendance_store
+from utils.deepfake_client import DeepfakeClient
+from utils.embedding_store import StoreWatcher, current_version
+from utils.engine import AttendanceEngine, CameraStream, ClassroomSession, FairScheduler
+from utils.matcher import build_gallery
+from utils.recognizer import MODE_CROP, make_recognizer
+from utils.instrumentation import Instrumentation, MetricsServer, SnapshotWriter
+from utils.mailer import Mailer
+from utils.scheduler import Scheduler, class_schedule
+from utils.startup import ModelLoader
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Runs every classroom listed in data/teachers.csv in one process, sharing
+# one YOLO model, one FaceAnalysis instance, one gallery and one deepfake
+# client. Each row may set a 'Camera' column (device index, RTSP URL or video
+# file; defaults to the row number), a 'Class Duration' in minutes (defaults
+# to 10, as in main.py) and a cron 'Schedule' (defaults to daily at its
+# 'Class Timing'). Every session starting in the next 24 hours is run.
+# As in main.py, each finished class sends an absence alert to the students
+# in data/students.csv and its report to the teacher, through the outbox.
+TEACHERS_FILE = 'data/teachers.csv'
+STUDENTS_FILE = 'data/students.csv'
+SENDER_FILE = 'data/sender_credentials.csv'
+STORE_DIR = 'data/encodings/store'
+DEEPFAKE_SERVER_URL = 'http://deepfake-server:5001/detect_deepfake'
+MAX_BATCH = 8
+# 'crop' or 'full_frame' (see utils/recognizer.py)
+RECOGNITION_MODE = MODE_CROP
+RECOGNITION_TILES = (1, 1)
+# Same instrumentation switches as main.py
+METRICS_PORT = int(os.environ.get('ATTENDANCE_METRICS_PORT', '0'))
+METRICS_SNAPSHOT_PATH = os.environ.get('ATTENDANCE_METRICS_SNAPSHOT')
+SCHEDULE_HORIZON = timedelta(days=1)
+# Seconds between attempts to open a camera that failed during its class
+CAMERA_RETRY = float(os.environ.get('CAMERA_RETRY', '10'))
+# Same as main.py: mail still queued after this stays in data/outbox.db
+MAIL_DRAIN_TIMEOUT = float(os.environ.get('MAIL_DRAIN_TIMEOUT', '120'))
+
+
+def find_column(fieldnames, wanted):
+    for field in fieldnames:
+        if field.lower() == wanted:
+            return field
+    return None
+
+
+def slugify(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_').lower()
+
+
+def load_classrooms(path):
+    """
+    Read one classroom per teachers.csv row.
+    """
+    classrooms = []
+    with open(path, 'r') as teacher_file:
+        csv_reader = csv.DictReader(teacher_file)
+        if not csv_reader.fieldnames:
+            raise ValueError(f"{path} is empty or has no header row")
+        columns = {key: find_column(csv_reader.fieldnames, key) for key in ('name', 'email', 'class timing', 'camera', 'class duration', 'schedule')}
+        for key in ('name', 'email', 'class timing'):
+            if not columns[key]:
+                raise ValueError(f"'{key.title()}' column not found in {path}")
+
+        for row_number, row in enumerate(csv_reader):
+            duration = float(row[columns['class duration']]) if columns['class duration'] and row[columns['class duration']] else 10
+            camera = row[columns['camera']] if columns['camera'] and row[columns['camera']] else str(row_number)
+            classrooms.append({
+                'name': row[columns['name']],
+                'email': row[columns['email']],
+                'schedule': class_schedule(row[columns['class timing']], row[columns['schedule']] if columns['schedule'] else None),
+                'duration': timedelta(minutes=duration),
+                'camera': camera,
+            })
+    return classrooms
+
+
+def load_student_emails(path):
+    """
+    Map student name to email from students.csv.
+    """
+    with open(path, 'r') as student_file:
+        csv_reader = csv.DictReader(student_file)
+        if not csv_reader.fieldnames:
+            raise ValueError(f"{path} is empty or has no header row")
+        name_column = find_column(csv_reader.fieldnames, 'name')
+        email_column = find_column(csv_reader.fieldnames, 'email')
+        if not name_column or not email_column:
+            raise ValueError(f"'Name' and 'Email' columns are required in {path}")
+        return {row[name_column]: row[email_column] for row in csv_reader}
+
+
+def load_sender(path):
+    with open(path, 'r') as sender_file:
+        sender = next(csv.DictReader(sender_file), None)
+    if not sender or 'Email' not in sender or 'AppPassword' not in sender:
+        raise ValueError(f"{path} needs an Email and an AppPassword column and one row")
+    return sender['Email'], sender['AppPassword']
+
+
+def send_session_mail(mailer, session, teacher_email, student_emails, absent_students, report_path):
+    """
+    Queue the class's absence alert to every student and its report to the
+    teacher, as main.py does for its single class.
+    """
+    if absent_students:
+        body = f"""
+        Dear Students,
+
+        The following students were absent from the {session.name} session on {session.class_start:%Y-%m-%d %H:%M:%S}:
+        {", ".join(absent_students)}
+
+        Please verify if this is correct by replying to this email or via SMS.
+        If you believe this is an error, let us know.
+
+        Regards,
+        AutoAttendance System
+        """
+        queued = mailer.enqueue("Absence Alert - Verify Absent Students", body, list(student_emails.values()))
+        logger.info(f"[{session.name}] Queued absence alerts for {queued} students")
+
+    body = f"""
+    Dear Teacher,
+
+    Please find attached the attendance report for the {session.name} session.
+    The session started at {session.class_start:%Y-%m-%d %H:%M:%S} IST.
+
+    Regards,
+    AutoAttendance System
+    """
+    with open(report_path, 'rb') as attachment:
+        mailer.enqueue("Attendance Report - AutoAttendanceYOLO", body, [teacher_email],
+                       attachment=('attendance_report.csv', attachment.read()))
+    logger.info(f"[{session.name}] Queued attendance report for {teacher_email}")
+
+
+def finish_session(session, known_names, store, scheduler, mailer, teacher_email, student_emails):
+    """
+    Record absentees in the attendance store, write the per-class report
+    from the class's records there, mark the session done and queue its
+    mail. A session whose camera never opened is left pending instead, so
+    nobody is marked absent and a restart within the class can still run it.
+    """
+    job = f"session:{session.name}"
+    if not session.stream.started:
+        logger.error(f"[{session.name}] Camera never opened ({session.stream.error}); no attendance recorded, "
+                     f"session left pending")
+        return
+    day = f"{session.class_start:%Y-%m-%d}"
+    store.mark_absent(day, session.name, [name for name in known_names if name not in session.attendance])
+    store.flush()
+    # Recorded before any mail is queued so a restart never repeats the alerts
+    scheduler.finish(job, session.class_start)
+    entry_times = {row['student']: row['entry_time'] for row in store.session(day, session.name) if row['status'] == PRESENT}
+    absent_students = [name for name in known_names if name not in entry_times]
+
+    report_path = f"data/attendance_report_{slugify(session.name)}.csv"
+    with open(report_path, 'w', newline='') as report_file:
+        csv_writer = csv.writer(report_file)
+        csv_writer.writerow(['Student Name', 'Status', 'Lateness (Minutes)'])
+        for name in known_names:
+            if name in entry_times:
+                entry_time = datetime.strptime(f"{day} {entry_times[name]}", "%Y-%m-%d %H:%M:%S")
+                lateness = max((entry_time - session.class_start).total_seconds() / 60.0, 0.0)
+                csv_writer.writerow([name, 'Present', f"{lateness:.2f}"])
+            else:
+                csv_writer.writerow([name, 'Absent', 'N/A'])
+    logger.info(f"[{session.name}] {len(entry_times)} present, {len(absent_students)} absent. Report at {report_path}")
+    send_session_mail(mailer, session, teacher_email, student_emails, absent_students, report_path)
+
+
+def main():
+    # Models load and warm up in the background, YOLO on single frames and
+    # full batches, while the configuration is read
+    model_loader = ModelLoader(ctx_id=0, yolo_batch_sizes=sorted({1, MAX_BATCH})).start()
+    if current_version(STORE_DIR) is None:
+        logger.error(f"Face embedding store not found at {STORE_DIR}")
+        exit(1)
+    try:
+        classrooms = load_classrooms(TEACHERS_FILE)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading {TEACHERS_FILE}: {e}")
+        exit(1)
+    try:
+        student_emails = load_student_emails(STUDENTS_FILE)
+        sender_email, sender_password = load_sender(SENDER_FILE)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading mail settings: {e}")
+        exit(1)
+
+    # Finished sessions are recorded, so a restart neither repeats a session
+    # nor skips one still under way
+    scheduler = Scheduler()
+    now = datetime.now()
+    for classroom in classrooms:
+        job = f"session:{classroom['name']}"
+        scheduler.add(job, classroom['schedule'], grace=classroom['duration'])
+        classroom['start'] = scheduler.next_due(job, now)
+        classroom['end'] = classroom['start'] + classroom['duration']
+    classrooms = [c for c in classrooms if c['start'] < now + SCHEDULE_HORIZON]
+    if not classrooms:
+        logger.error(f"No class in data/teachers.csv is scheduled in the next {SCHEDULE_HORIZON.total_seconds() / 3600:.0f} hours")
+        exit(1)
+
+    # Imports the legacy weekly_attendance.csv log on first use
+    attendance_store = open_attendance_store(ATTENDANCE_DB)
+    gallery = StoreWatcher(STORE_DIR, build_gallery)
+    app = model_loader.wait()
+    model_loader.log_report()
+    deepfake_client = DeepfakeClient(DEEPFAKE_SERVER_URL)
+    # Delivered in the background from the persistent outbox, like main.py
+    mailer = Mailer(sender_email, sender_password).start()
+    teacher_emails = {classroom['name']: classroom['email'] for classroom in classrooms}
+
+    sessions = []
+    for classroom in classrooms:
+        stream = CameraStream(slugify(classroom['name']), classroom['camera'])
+        output_path = f"data/attendance_{slugify(classroom['name'])}.csv"
+        sessions.append(ClassroomSession(classroom['name'], stream, classroom['start'], classroom['end'], output_path))
+        logger.info(f"[{classroom['name']}] {classroom['start']:%Y-%m-%d %H:%M:%S}-{classroom['end']:%H:%M:%S} on {classroom['camera']!r}")
+
+    instrumentation = Instrumentation()
+    engine = AttendanceEngine(sessions, app, gallery, deepfake_client, FairScheduler(max_batch=MAX_BATCH),
+                              recognizer=make_recognizer(app, RECOGNITION_MODE, RECOGNITION_TILES),
+                              instrumentation=instrumentation, store=attendance_store, camera_retry=CAMERA_RETRY)
+    metrics_server = MetricsServer(instrumentation.registry, METRICS_PORT).start() if METRICS_PORT else None
+    snapshot_writer = SnapshotWriter(instrumentation.registry, METRICS_SNAPSHOT_PATH).start() if METRICS_SNAPSHOT_PATH else None
+    try:
+        first_start = min(session.class_start for session in sessions)
+        if first_start > datetime.now():
+            logger.info(f"Waiting for the first class at {first_start}")
+            scheduler.wait_until(first_start)
+        engine.run(on_session_end=lambda session: finish_session(session, gallery.get().identities, attendance_store, scheduler,
+                                                                 mailer, teacher_emails[session.name], student_emails))
+    finally:
+        if snapshot_writer is not None:
+            snapshot_writer.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        for session in sessions:
+            session.stream.stop()
+            session.close()
+        deepfake_client.close()
+        attendance_store.close()
+        scheduler.close()
+        mailer.stop(drain_timeout=MAIL_DRAIN_TIMEOUT)
+        mail_stats = mailer.summary()
+        logger.info(f"Mail: {mail_stats['sent']} sent, {mail_stats['retried']} retries scheduled, "
+                    f"{mail_stats['failed']} failed over {mail_stats['connections']} SMTP sessions")
+
+    report = engine.report()
+    for name, stats in report['streams'].items():
+        logger.info(f"[{name}] {stats['frames']}/{stats['captured']} frames processed at {stats['fps']:.1f} FPS, "
+                    f"latency p50 {stats['latency']['p50_ms']:.0f} ms, p95 {stats['latency']['p95_ms']:.0f} ms, "
+                    f"cache hit rate {stats['cache_hit_rate']:.1%}, {stats['sampling']['skip_rate']:.1%} of frames skipped by "
+                    f"motion gating, newcomer latency p50 {stats['sampling']['newcomer_p50_s']:.2f} s")
+    logger.info(f"Aggregate: {report['frames']} frames at {report['fps']:.1f} FPS, "
+                f"{report['fps_per_core']:.2f} frames per CPU-second over {report['cpu_seconds']:.0f} CPU-seconds "
+                f"({report['cores']} cores)")
+
+
+if __name__ == "__main__":
+    main()
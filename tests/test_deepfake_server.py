@@ -0,0 +1,57 @@
+import base64
+import importlib
+import sys
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('flask')
+
+
+class ConstantModel:
+    def predict(self, batch):
+        return np.full(len(batch), 0.9)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import utils.deepfake_backends
+
+    monkeypatch.setattr(utils.deepfake_backends, 'load_backend', lambda *args, **kwargs: ConstantModel())
+    sys.modules.pop('deepfake_server', None)
+    server = importlib.import_module('deepfake_server')
+    yield server.app.test_client()
+    sys.modules.pop('deepfake_server', None)
+
+
+def jpeg_base64():
+    ok, buffer = cv2.imencode('.jpg', np.full((64, 64, 3), 128, dtype=np.uint8))
+    assert ok
+    return base64.b64encode(buffer.tobytes()).decode('ascii')
+
+
+@pytest.mark.parametrize('image', ['', '!!!'])
+def test_invalid_base64_image_is_a_client_error(client, image):
+    response = client.post('/detect_deepfake', json={'image': image})
+    assert response.status_code == 400
+
+
+def test_valid_image_is_classified(client):
+    response = client.post('/detect_deepfake', json={'image': jpeg_base64()})
+    assert response.status_code == 200
+    assert response.get_json()['label'] == 'Real'
+
+
+def test_batch_reports_bad_entries_per_image(client):
+    response = client.post('/detect_deepfake/batch', json={'images': ['', '!!!', jpeg_base64()]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[:2] == [{'error': 'invalid image'}, {'error': 'invalid image'}]
+    assert results[2]['label'] == 'Real'
+
+
+@pytest.mark.parametrize('body', [[jpeg_base64()], {'images': 'abc'}])
+def test_batch_rejects_malformed_body(client, body):
+    response = client.post('/detect_deepfake/batch', json=body)
+    assert response.status_code == 400
@@ -0,0 +1,21 @@
+import pickle
+
+import numpy as np
+
+from utils.embedding_store import migrate_pickle, open_store, write_store
+
+
+def test_empty_legacy_pickle_migrates(tmp_path):
+    pickle_path = tmp_path / 'face_encodings.pkl'
+    pickle_path.write_bytes(pickle.dumps(([], [])))
+    migrate_pickle(str(pickle_path), str(tmp_path / 'store'))
+    store = open_store(str(tmp_path / 'store'))
+    assert len(store) == 0
+    assert store.embeddings.shape[0] == 0
+
+
+def test_empty_gallery_keeps_its_dimension(tmp_path):
+    write_store(str(tmp_path), np.zeros((0, 512), dtype=np.float32), [], 'buffalo_l')
+    store = open_store(str(tmp_path))
+    assert store.embeddings.shape == (0, 512)
+    assert store.header['dim'] == 512
@@ -0,0 +1,45 @@
+import numpy as np
+
+from utils.liveliness import LivelinessEngine
+
+# Five landmarks of a face 30 px between the eyes, as at the back of a classroom
+FACE = np.array([[-15, -10], [15, -10], [0, 3], [-10, 14], [10, 14]], dtype=np.float32) + 200
+BOX = [180, 170, 220, 230]
+
+
+def observe(frames, seed, noise=1.0, turn=0.0):
+    """
+    Feed one still face box with noisy landmarks for frames samples, turning
+    the head by up to turn radians. Returns True if it was ever judged live.
+    """
+    rng = np.random.default_rng(seed)
+    now = [0.0]
+    engine = LivelinessEngine(clock=lambda: now[0])
+    live = False
+    for frame in range(frames):
+        now[0] += 0.2
+        angle = turn * np.sin(frame)
+        points = FACE.copy()
+        points[:, 0] = 200 + (points[:, 0] - 200) * np.cos(angle)
+        points[2, 0] += 12 * angle
+        points += rng.normal(0, noise, points.shape)
+        live |= bool(engine.update(['student'], [BOX], points[None])[0])
+    return live
+
+
+def test_noisy_static_face_stays_not_live():
+    assert not any(observe(16, seed) for seed in range(100))
+
+
+def test_turning_head_is_live():
+    assert all(observe(16, seed, turn=0.5) for seed in range(20))
+
+
+def test_missing_landmarks_fall_back_to_movement():
+    now = [0.0]
+    engine = LivelinessEngine(clock=lambda: now[0])
+    results = []
+    for x in (0, 10, 40):
+        now[0] += 0.2
+        results.append(bool(engine.update(['student'], [[x, 0, x + 40, 80]])[0]))
+    assert results == [False, False, True]
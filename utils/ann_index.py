@@ -0,0 +1,215 @@
+import json
+import os
+
+import numpy as np
+
+# Galleries smaller than this are searched exactly; brute force is already fast there
+IVF_MIN_SIZE = 10000
+
+
+def l2_normalize(vectors):
+    """
+    L2-normalize the rows of a 2D array, returning a contiguous float32 copy.
+    Zero rows are left as zeros instead of producing NaNs.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def _top_k(scores, ids, k):
+    """
+    Select the k best (score, id) pairs from 1D candidate arrays, padded with
+    (-inf, -1) when fewer than k candidates exist.
+    """
+    out_scores = np.full(k, -np.inf, dtype=np.float32)
+    out_ids = np.full(k, -1, dtype=np.int64)
+    n = min(k, len(scores))
+    if n == 0:
+        return out_scores, out_ids
+    if n < len(scores):
+        best = np.argpartition(-scores, n - 1)[:n]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best])]
+    out_scores[:n] = scores[best]
+    out_ids[:n] = ids[best]
+    return out_scores, out_ids
+
+
+class ExactIndex:
+    """
+    Brute-force inner-product search over normalized embeddings.
+    """
+
+    kind = 'exact'
+
+    def __init__(self, vectors):
+        self.vectors = l2_normalize(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k=1):
+        """
+        Return (scores, ids) arrays of shape (num_queries, k) for normalized
+        float32 queries. Missing results are padded with -inf and -1.
+        """
+        n = len(queries)
+        if n == 0 or len(self.vectors) == 0:
+            return np.full((n, k), -np.inf, dtype=np.float32), np.full((n, k), -1, dtype=np.int64)
+        sims = queries @ self.vectors.T
+        if k == 1:
+            best = np.argmax(sims, axis=1)
+            return sims[np.arange(n), best][:, None], best.astype(np.int64)[:, None]
+        ids = np.arange(len(self.vectors))
+        results = [_top_k(row, ids, k) for row in sims]
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+    def state(self):
+        return {'vectors': self.vectors}
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls.__new__(cls)
+        index.vectors = state['vectors']
+        return index
+
+
+class IVFIndex:
+    """
+    Inverted-file index: embeddings are bucketed by a spherical k-means coarse
+    quantizer and a query only scans the n_probe closest buckets.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        vectors = l2_normalize(vectors)
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        self.n_probe = n_probe
+        self.centroids = self._train(vectors, n_lists, n_iter, np.random.default_rng(seed))
+
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        self.ids = order.astype(np.int64)
+        self.vectors = np.ascontiguousarray(vectors[order])
+        counts = np.bincount(assignments, minlength=n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    @staticmethod
+    def _train(vectors, n_lists, n_iter, rng):
+        sample_size = min(len(vectors), n_lists * 256)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            # Re-seed empty lists from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = l2_normalize(sums)
+        return centroids
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k=1, n_probe=None):
+        """
+        Return (scores, ids) arrays of shape (num_queries, k) for normalized
+        float32 queries. Missing results are padded with -inf and -1.
+        """
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        n = len(queries)
+        if n == 0:
+            return np.zeros((0, k), dtype=np.float32), np.zeros((0, k), dtype=np.int64)
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, n_probe - 1, axis=1)[:, :n_probe]
+        out_scores = np.empty((n, k), dtype=np.float32)
+        out_ids = np.empty((n, k), dtype=np.int64)
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+            out_scores[i], out_ids[i] = _top_k(self.vectors[rows] @ query, self.ids[rows], k)
+        return out_scores, out_ids
+
+    def state(self):
+        return {
+            'vectors': self.vectors,
+            'ids': self.ids,
+            'offsets': self.offsets,
+            'centroids': self.centroids,
+            'n_probe': np.int64(self.n_probe),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls.__new__(cls)
+        index.vectors = state['vectors']
+        index.ids = state['ids']
+        index.offsets = state['offsets']
+        index.centroids = state['centroids']
+        index.n_probe = int(state['n_probe'])
+        return index
+
+
+INDEX_BACKENDS = {cls.kind: cls for cls in (ExactIndex, IVFIndex)}
+
+
+def build_index(vectors, kind='auto', **kwargs):
+    """
+    Build a search index over the gallery. 'auto' picks exact search for small
+    galleries and IVF for campus-scale ones.
+    """
+    if kind == 'auto':
+        kind = 'ivf' if len(vectors) >= IVF_MIN_SIZE else 'exact'
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{kind}'. Expected one of {sorted(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[kind](vectors, **kwargs)
+
+
+def save_index(index, path, names, params=None):
+    """
+    Persist an index as a directory of plain .npy arrays, the row names and a
+    meta.json written last. Unlike an .npz archive the arrays can be
+    memory-mapped, so every process searching the index shares its pages.
+    params records how the indexed vectors were derived; load_index rejects
+    the index when they differ.
+    """
+    os.makedirs(path, exist_ok=True)
+    arrays, scalars = [], {}
+    for key, value in index.state().items():
+        if np.ndim(value):
+            np.save(os.path.join(path, f"{key}.npy"), np.ascontiguousarray(value))
+            arrays.append(key)
+        else:
+            scalars[key] = value.item() if isinstance(value, np.generic) else value
+    with open(os.path.join(path, 'names.json'), 'w') as f:
+        json.dump(list(names), f)
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'kind': index.kind, 'arrays': arrays, 'scalars': scalars, 'params': params or {}}, f)
+
+
+def load_index(path, params=None):
+    """
+    Memory-map a persisted index read-only. Returns (index, names), or None
+    if the index is missing, incomplete or was built with other params.
+    """
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        with open(os.path.join(path, 'names.json')) as f:
+            names = json.load(f)
+    except FileNotFoundError:
+        return None
+    if params is not None and meta.get('params') != params:
+        return None
+    state = dict(meta['scalars'])
+    for key in meta['arrays']:
+        state[key] = np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r', allow_pickle=False)
+    return INDEX_BACKENDS[meta['kind']].from_state(state), names
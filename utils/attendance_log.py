@@ -0,0 +1,24 @@
+from datetime import date, datetime, timedelta
+
+# Report windows understood by report_window()
+PERIODS = ('weekly', 'monthly', 'term')
+
+
+def report_window(period, today=None, term_start=None):
+    """
+    Return the inclusive (start, end) ISO dates of a reporting window ending
+    today: the last 7 days, the current calendar month, or the term that
+    began on term_start.
+    """
+    today = today or date.today()
+    if period == 'weekly':
+        return (today - timedelta(days=6)).isoformat(), today.isoformat()
+    if period == 'monthly':
+        return today.replace(day=1).isoformat(), today.isoformat()
+    if period == 'term':
+        if term_start is None:
+            raise ValueError("A term report needs a term start date")
+        if isinstance(term_start, str):
+            term_start = datetime.strptime(term_start, '%Y-%m-%d').date()
+        return term_start.isoformat(), today.isoformat()
+    raise ValueError(f"Unknown report period '{period}', expected one of {PERIODS}")
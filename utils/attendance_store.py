@@ -0,0 +1,274 @@
+import csv
+import logging
+import os
+import sqlite3
+import time
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'data/attendance.db'
+# CSV files written before the store existed, imported once by migrate_csv()
+LEGACY_LOG = 'data/weekly_attendance.csv'
+LEGACY_DAILY = 'data/attendance.csv'
+
+PRESENT = 'Present'
+ABSENT = 'Absent'
+
+# One row per student per class per day, clustered by date so report windows
+# are contiguous range scans. The secondary indexes carry the primary key,
+# so per-student and per-class lookups never touch the table.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    date TEXT NOT NULL,
+    class TEXT NOT NULL DEFAULT '',
+    student TEXT NOT NULL,
+    status TEXT NOT NULL,
+    entry_time TEXT,
+    deepfake_status TEXT,
+    liveliness_status TEXT,
+    PRIMARY KEY (date, class, student)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS attendance_student ON attendance (student, date);
+CREATE INDEX IF NOT EXISTS attendance_class ON attendance (class, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Present always wins over absent and the first entry time is kept, so
+# replays, migrations and late flushes can never downgrade a record
+UPSERT = """
+INSERT INTO attendance (date, class, student, status, entry_time, deepfake_status, liveliness_status)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (date, class, student) DO UPDATE SET
+    status = excluded.status,
+    entry_time = coalesce(attendance.entry_time, excluded.entry_time),
+    deepfake_status = coalesce(attendance.deepfake_status, excluded.deepfake_status),
+    liveliness_status = coalesce(attendance.liveliness_status, excluded.liveliness_status)
+WHERE excluded.status = 'Present'
+"""
+
+
+class AttendanceStore:
+    """
+    Attendance records in a SQLite database in WAL mode: the attendance loop
+    writes while report processes read consistent snapshots without
+    blocking it. Marks are buffered and written in one transaction per
+    batch (batch_size records or flush_interval seconds, whichever comes
+    first) instead of reopening a CSV file for every student.
+
+    A connection belongs to the thread that opened it; use one store per
+    thread or process.
+    """
+
+    def __init__(self, path=DB_PATH, batch_size=64, flush_interval=1.0, busy_timeout=5.0, clock=time.monotonic):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.clock = clock
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Autocommit mode: write transactions are opened explicitly below
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # WAL with synchronous=NORMAL is durable across application crashes
+        # and only fsyncs at checkpoints
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._pending = []
+        self._oldest = None
+        self.stats = {'records': 0, 'flushes': 0, 'flush_seconds': 0.0}
+
+    def _write(self, rows):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany(UPSERT, rows)
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def add(self, day, class_name, student, status, entry_time=None, deepfake_status=None, liveliness_status=None):
+        """
+        Buffer one record; it is written by the next flush.
+        """
+        if not self._pending:
+            self._oldest = self.clock()
+        self._pending.append((day, class_name, student, status, entry_time, deepfake_status, liveliness_status))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def mark_present(self, day, class_name, student, entry_time, deepfake_status=None, liveliness_status=None):
+        self.add(day, class_name, student, PRESENT, entry_time, deepfake_status, liveliness_status)
+
+    def mark_absent(self, day, class_name, students):
+        """
+        Record absences for students without a record for this class and
+        day. Students already marked present stay present.
+        """
+        for student in students:
+            self.add(day, class_name, student, ABSENT)
+
+    def flush_due(self):
+        """
+        Flush if the oldest buffered record has waited flush_interval seconds.
+        Cheap enough to call on every loop iteration. Returns the number written.
+        """
+        if self._pending and self.clock() - self._oldest >= self.flush_interval:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """
+        Write every buffered record in one transaction. Returns the number written.
+        """
+        if not self._pending:
+            return 0
+        rows, self._pending = self._pending, []
+        start = time.perf_counter()
+        try:
+            self._write(rows)
+        except sqlite3.Error:
+            # Keep the batch so the next flush retries it
+            self._pending = rows + self._pending
+            raise
+        self.stats['records'] += len(rows)
+        self.stats['flushes'] += 1
+        self.stats['flush_seconds'] += time.perf_counter() - start
+        return len(rows)
+
+    def session(self, day, class_name):
+        """
+        Records for one class on one day, earliest arrival first, as dicts
+        keyed by column name.
+        """
+        cursor = self.conn.execute(
+            'SELECT student, status, entry_time, deepfake_status, liveliness_status FROM attendance '
+            'WHERE class = ? AND date = ? ORDER BY entry_time IS NULL, entry_time, student',
+            (class_name, day))
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def totals(self, start=None, end=None, class_name=None):
+        """
+        Present and total session counts per student over the inclusive
+        [start, end] ISO date window, optionally for one class.
+        Returns {student: {'present': int, 'total_sessions': int}}.
+        """
+        clauses, params = [], []
+        if class_name is not None:
+            clauses.append('class = ?')
+            params.append(class_name)
+        if start is not None:
+            clauses.append('date >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('date <= ?')
+            params.append(end)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        # The unary + keeps the planner from walking the whole student index
+        # to avoid a sort; a range search on the window is far cheaper
+        cursor = self.conn.execute(
+            f"SELECT student, sum(status = 'Present'), count(*) FROM attendance {where}GROUP BY +student", params)
+        return {student: {'present': present, 'total_sessions': total} for student, present, total in cursor}
+
+    def student_history(self, student, start=None, end=None):
+        """
+        (date, class, status, entry_time) rows for one student, oldest first.
+        """
+        cursor = self.conn.execute(
+            'SELECT date, class, status, entry_time FROM attendance '
+            'WHERE student = ? AND date >= ? AND date <= ? ORDER BY date, class',
+            (student, start or '', end or '9999-12-31'))
+        return cursor.fetchall()
+
+    def get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def summary(self):
+        flushes = self.stats['flushes']
+        return dict(self.stats, pending=len(self._pending),
+                    mean_flush_ms=self.stats['flush_seconds'] / flushes * 1000 if flushes else 0.0)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+
+def _read_csv(path):
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        columns = {field.strip().lower(): field for field in reader.fieldnames or []}
+        for row in reader:
+            yield {key: row.get(field) for key, field in columns.items()}
+
+
+def migrate_csv(store, log_path=LEGACY_LOG, daily_path=None, class_name='', batch_size=50000):
+    """
+    Import a legacy Date,Name,Status log and, optionally, the last session's
+    Name,Entry Time,Deepfake Status,Liveliness Status file (dated by its
+    modification time) into the store. Each file is imported once: the
+    import and its completion marker commit together, so concurrent
+    processes and restarts never import it twice. Rows repeated for the
+    same student and day collapse into one, present winning.
+    Returns the number of rows read.
+    """
+    imported = 0
+    for path, kind in ((log_path, 'log'), (daily_path, 'daily')):
+        if not path or not os.path.exists(path):
+            continue
+        key = f"migrated:{os.path.abspath(path)}"
+        if store.get_meta(key) is not None:
+            continue
+        rows = []
+        if kind == 'log':
+            for row in _read_csv(path):
+                if row.get('date') and row.get('name'):
+                    rows.append((row['date'], class_name, row['name'], PRESENT if row.get('status') == PRESENT else ABSENT, None, None, None))
+        else:
+            day = date.fromtimestamp(os.path.getmtime(path)).isoformat()
+            for row in _read_csv(path):
+                if row.get('name'):
+                    rows.append((day, class_name, row['name'], PRESENT, row.get('entry time'),
+                                 row.get('deepfake status'), row.get('liveliness status')))
+        store.conn.execute('BEGIN IMMEDIATE')
+        try:
+            if store.get_meta(key) is None:
+                for offset in range(0, len(rows), batch_size):
+                    store.conn.executemany(UPSERT, rows[offset:offset + batch_size])
+                store.conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (key, str(len(rows))))
+        except BaseException:
+            store.conn.execute('ROLLBACK')
+            raise
+        store.conn.execute('COMMIT')
+        imported += len(rows)
+        logger.info(f"Migrated {len(rows)} rows from {path} to {store.path}")
+    return imported
+
+
+def open_attendance_store(path=DB_PATH, legacy_log=LEGACY_LOG, legacy_daily=None, **kwargs):
+    """
+    Open the store, importing any legacy CSV files not yet migrated.
+    """
+    store = AttendanceStore(path, **kwargs)
+    migrate_csv(store, legacy_log, legacy_daily)
+    return store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Migrate the attendance CSV files into the attendance store")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--log', default=LEGACY_LOG)
+    parser.add_argument('--daily', default=LEGACY_DAILY)
+    parser.add_argument('--class-name', default='', help="class recorded for the imported rows")
+    args = parser.parse_args()
+    store = AttendanceStore(args.db)
+    migrate_csv(store, args.log, args.daily, args.class_name)
+    store.close()
@@ -0,0 +1,77 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces single-item requests from many threads into batched calls.
+
+    submit() returns a Future. A worker thread waits for the first pending
+    item, then keeps collecting until max_batch_size items are queued or
+    max_wait_ms has passed, and calls predict_fn once on the whole list.
+    predict_fn must return one result per input, in order.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_sizes = deque(maxlen=10000)
+        self._queue = Queue()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        """
+        Submit one item and block until its result is ready.
+        """
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                results = self.predict_fn(items)
+            except Exception as e:
+                logger.error(f"Batched prediction failed for {len(items)} items: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batch_sizes.append(len(items))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stop(self):
+        self._stop.set()
+        self._worker.join()
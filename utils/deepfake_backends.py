@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATHS = {
+    'keras': 'models/deepfake-detection-model.h5',
+    'onnx': 'models/deepfake-detection-model.onnx',
+    'tflite': 'models/deepfake-detection-model.tflite',
+}
+
+
+class KerasBackend:
+    """
+    The original TensorFlow Keras model.
+    """
+
+    kind = 'keras'
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(model_path)
+
+    def predict(self, batch):
+        """
+        Return the 'Real' probability for each image of an (N, 200, 200, 3)
+        float32 batch.
+        """
+        return np.asarray(self.model.predict(batch, verbose=0))[:, 0]
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime on CPU, for models produced by convert_deepfake_model.py.
+    """
+
+    kind = 'onnx'
+
+    def __init__(self, model_path, intra_op_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The 'onnx' backend needs onnxruntime: pip install onnxruntime") from e
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        outputs = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})
+        return np.asarray(outputs[0]).reshape(len(batch), -1)[:, 0]
+
+
+class TFLiteBackend:
+    """
+    TensorFlow Lite interpreter, for float, fp16 or int8 models produced by
+    convert_deepfake_model.py. Uses tflite_runtime when installed so the full
+    TensorFlow stack is not needed.
+    """
+
+    kind = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError as e:
+                raise ImportError("The 'tflite' backend needs tflite-runtime or tensorflow") from e
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        # The interpreter keeps per-call tensors, so calls must not overlap
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        with self._lock:
+            if self._batch_size != len(batch):
+                self.interpreter.resize_tensor_input(self.input['index'], [len(batch)] + list(batch.shape[1:]))
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(batch)
+            data = batch
+            scale, zero_point = self.input['quantization']
+            if self.input['dtype'] != np.float32 and scale:
+                data = np.round(batch / scale + zero_point)
+            self.interpreter.set_tensor(self.input['index'], data.astype(self.input['dtype']))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output['index']).astype(np.float32)
+            scale, zero_point = self.output['quantization']
+            if self.output['dtype'] != np.float32 and scale:
+                output = (output - zero_point) * scale
+        return output.reshape(len(batch), -1)[:, 0]
+
+
+BACKENDS = {cls.kind: cls for cls in (KerasBackend, OnnxBackend, TFLiteBackend)}
+
+
+def load_backend(kind='keras', model_path=None):
+    """
+    Load the deepfake model with the given inference backend. model_path
+    defaults to the backend's file under models/.
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown deepfake backend '{kind}'. Expected one of {sorted(BACKENDS)}")
+    model_path = model_path or DEFAULT_MODEL_PATHS[kind]
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}")
+    backend = BACKENDS[kind](model_path)
+    logger.info(f"Loaded deepfake model {model_path} with the {kind} backend")
+    return backend
@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.face_transport import FORMATS, FORMAT_JSON, encode_request
+
+logger = logging.getLogger(__name__)
+
+# Label reported when no verdict could be obtained from the server
+DEGRADED_LABEL = "Unverified"
+
+
+def negotiate_format(server_url, preferred=FORMATS, timeout=2.0, session=None):
+    """
+    Ask the deepfake server which wire formats it accepts and return the first
+    match from preferred. Servers without the formats endpoint only speak JSON.
+    """
+    try:
+        response = (session or requests).get(f"{server_url}/formats", timeout=timeout)
+        response.raise_for_status()
+        supported = set(response.json().get('formats', []))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Could not negotiate deepfake wire format, falling back to JSON: {e}")
+        return FORMAT_JSON
+    for fmt in preferred:
+        if fmt in supported:
+            return fmt
+    return FORMAT_JSON
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing server. After failure_threshold consecutive
+    failures the breaker opens for reset_timeout seconds, then lets a single
+    trial call through (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"Deepfake server circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class DeepfakeClient:
+    """
+    Verification client for the deepfake server.
+
+    Keeps a pooled keep-alive session, applies connect/read timeouts and
+    retries transient failures. verify_many() checks several faces in
+    parallel. When the server cannot be reached, or the circuit breaker is
+    open, results are (DEGRADED_LABEL, 0.0) and counted in stats['degraded']
+    instead of silently passing as "Real".
+
+    Only outages count against the breaker: connection errors, timeouts and
+    5xx replies. A crop that cannot be encoded, or that the server rejects
+    with a 4xx, degrades that one verdict (counted in stats['rejected']).
+    """
+
+    def __init__(self, server_url, wire_format=None, connect_timeout=2.0, read_timeout=5.0, retries=2,
+                 backoff=0.2, pool_size=8, max_workers=4, breaker=None):
+        self.server_url = server_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.wire_format = wire_format or negotiate_format(server_url, timeout=connect_timeout, session=self.session)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='deepfake')
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'verified': 0, 'errors': 0, 'rejected': 0, 'degraded': 0, 'short_circuited': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _degraded(self, reason):
+        self._count('degraded')
+        logger.warning(f"Deepfake verification degraded: {reason}")
+        return DEGRADED_LABEL, 0.0
+
+    def verify(self, face_crop):
+        """
+        Return the (label, confidence) verdict for one face crop.
+        """
+        try:
+            request_kwargs = encode_request(face_crop, self.wire_format)
+        except (ValueError, cv2.error) as e:
+            self._count('rejected')
+            return self._degraded(f"could not encode face crop: {e}")
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return self._degraded("circuit breaker open")
+        self._count('requests')
+        try:
+            response = self.session.post(self.server_url, timeout=self.timeout, **request_kwargs)
+            if response.status_code >= 500:
+                raise requests.exceptions.HTTPError(f"{response.status_code} from deepfake server", response=response)
+            result = response.json() if response.status_code < 400 else None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._count('errors')
+            self.breaker.record_failure()
+            return self._degraded(f"error in deepfake detection: {e}")
+        # The server answered, so a 4xx is a bad crop rather than an outage
+        self.breaker.record_success()
+        if result is None or 'error' in result:
+            self._count('rejected')
+            reason = response.text[:200] if result is None else result['error']
+            return self._degraded(f"deepfake server rejected the crop ({response.status_code}): {reason}")
+        self._count('verified')
+        return result['label'], result['confidence']
+
+    def verify_many(self, face_crops):
+        """
+        Verify several face crops in parallel, returning verdicts in order.
+        """
+        if len(face_crops) <= 1:
+            return [self.verify(crop) for crop in face_crops]
+        return list(self._executor.map(self.verify, face_crops))
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, breaker_state=self.breaker.state, breaker_trips=self.breaker.trips)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
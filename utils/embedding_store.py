@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = 'vionna-embeddings'
+STORE_FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+
+# Search index over the version's templates, written by encode_faces before
+# the version is published (see utils.ann_index.save_index)
+INDEX_DIR = 'index'
+
+
+def _version_dir(store_dir, version):
+    return os.path.join(store_dir, f"v{version:06d}")
+
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def current_version(store_dir):
+    """
+    Return the active version number, or None if the store has none yet.
+    """
+    try:
+        with open(os.path.join(store_dir, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def list_versions(store_dir):
+    if not os.path.isdir(store_dir):
+        return []
+    versions = []
+    for entry in os.listdir(store_dir):
+        if entry.startswith('v') and entry[1:].isdigit():
+            versions.append(int(entry[1:]))
+    return sorted(versions)
+
+
+class EmbeddingStore:
+    """
+    One version of the on-disk gallery: a float32 (count, dim) matrix in
+    embeddings.npy, memory-mapped read-only, a names.json table mapping row
+    index (the embedding ID) to student name, and a header.json with the
+    format version and model info. Matching uses the search index saved in
+    the version's index/ directory, which is memory-mapped too.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        if self.header.get('format') != STORE_FORMAT or self.header.get('format_version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding store format in {path}: {self.header.get('format')} "
+                             f"v{self.header.get('format_version')}")
+        with open(os.path.join(path, 'names.json')) as f:
+            self.names = json.load(f)
+        self.embeddings = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if self.embeddings.shape[0] != len(self.names):
+            raise ValueError(f"Embedding store {path} has {self.embeddings.shape[0]} rows but {len(self.names)} names")
+
+    @property
+    def version(self):
+        return self.header['version']
+
+    @property
+    def model(self):
+        return self.header.get('model')
+
+    def __len__(self):
+        return len(self.names)
+
+    def file_path(self, name):
+        """
+        Path of a companion file (such as a search index) stored with this version.
+        """
+        return os.path.join(self.path, name)
+
+
+def open_store(store_dir, mmap=True):
+    """
+    Open the active version of the store.
+    """
+    version = current_version(store_dir)
+    if version is None:
+        raise FileNotFoundError(f"No embedding store found at {store_dir}")
+    return EmbeddingStore(_version_dir(store_dir, version), mmap=mmap)
+
+
+def write_store(store_dir, embeddings, names, model, keep_versions=3, before_publish=None):
+    """
+    Write a new version of the store and atomically make it the active one.
+    Readers that already opened an older version keep using it until they
+    reload. before_publish, if given, is called with the new EmbeddingStore
+    before it becomes active so companion files can be added to it. An
+    empty gallery is written as a (0, dim) matrix. Returns the new version
+    number.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if embeddings.ndim == 2:
+        dim = embeddings.shape[1]
+    else:
+        dim = embeddings.size // len(names) if len(names) else 0
+    embeddings = np.ascontiguousarray(embeddings.reshape(len(names), dim))
+    os.makedirs(store_dir, exist_ok=True)
+    version = (list_versions(store_dir) or [0])[-1] + 1
+    path = _version_dir(store_dir, version)
+    # Claim the directory exclusively so two writers never share a version
+    os.makedirs(path, exist_ok=False)
+
+    np.save(os.path.join(path, 'embeddings.npy'), embeddings)
+    _write_json(os.path.join(path, 'names.json'), list(names))
+    _write_json(os.path.join(path, 'header.json'), {
+        'format': STORE_FORMAT,
+        'format_version': STORE_FORMAT_VERSION,
+        'version': version,
+        'model': model,
+        'count': int(embeddings.shape[0]),
+        'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        'dtype': 'float32',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    })
+
+    if before_publish is not None:
+        before_publish(EmbeddingStore(path))
+
+    tmp_current = os.path.join(store_dir, CURRENT_FILE + '.tmp')
+    with open(tmp_current, 'w') as f:
+        f.write(str(version))
+    os.replace(tmp_current, os.path.join(store_dir, CURRENT_FILE))
+
+    # Unlinking is safe on POSIX even while other processes still map old versions
+    for old in list_versions(store_dir)[:-keep_versions]:
+        shutil.rmtree(_version_dir(store_dir, old), ignore_errors=True)
+    return version
+
+
+def migrate_pickle(pickle_path, store_dir, model='buffalo_l'):
+    """
+    One-shot migration of a legacy (known_encodings, known_names) pickle into
+    the store. Only run this on a pickle you produced yourself: unpickling
+    untrusted files can execute arbitrary code.
+    """
+    with open(pickle_path, 'rb') as f:
+        known_encodings, known_names = pickle.load(f)
+    embeddings = np.stack([np.asarray(e, dtype=np.float32).ravel() for e in known_encodings]) if known_encodings else np.zeros((0, 0), dtype=np.float32)
+    version = write_store(store_dir, embeddings, known_names, model)
+    logger.info(f"Migrated {len(known_names)} embeddings from {pickle_path} to {store_dir} (version {version})")
+    return version
+
+
+class StoreWatcher:
+    """
+    Keeps an object built from the active store version (for example a
+    matcher) and swaps in a rebuilt one when a new version is published.
+    The version check runs at most every interval seconds and the rebuild
+    happens on a background thread, so callers never wait for it.
+    """
+
+    def __init__(self, store_dir, build_fn, interval=30.0, clock=time.monotonic):
+        self.store_dir = store_dir
+        self.build_fn = build_fn
+        self.interval = interval
+        self.clock = clock
+        self.store = open_store(store_dir)
+        self.current = build_fn(self.store)
+        self.swaps = 0
+        self._last_check = clock()
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def _reload(self, version):
+        try:
+            store = open_store(self.store_dir)
+            built = self.build_fn(store)
+        except Exception as e:
+            logger.error(f"Failed to load embedding store version {version}: {e}")
+        else:
+            with self._lock:
+                self.store, self.current = store, built
+                self.swaps += 1
+            logger.info(f"Swapped in embedding store version {store.version} ({len(store)} embeddings)")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def get(self):
+        """
+        Return the object built from the newest loaded version.
+        """
+        now = self.clock()
+        reload_version = None
+        with self._lock:
+            # Checked and claimed under the lock so only one caller starts a reload
+            if now - self._last_check >= self.interval and not self._reloading:
+                self._last_check = now
+                version = current_version(self.store_dir)
+                if version is not None and version != self.store.version:
+                    self._reloading = True
+                    reload_version = version
+            current = self.current
+        if reload_version is not None:
+            threading.Thread(target=self._reload, args=(reload_version,), name='store-reload', daemon=True).start()
+        return current
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Migrate a face_encodings.pkl into the embedding store")
+    parser.add_argument('--pickle', default='data/encodings/face_encodings.pkl')
+    parser.add_argument('--store', default='data/encodings/store')
+    parser.add_argument('--model', default='buffalo_l')
+    args = parser.parse_args()
+    migrate_pickle(args.pickle, args.store, args.model)
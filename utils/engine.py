@@ -0,0 +1,524 @@
+import csv
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from utils.deepfake_client import DEGRADED_LABEL
+from utils.instrumentation import RateLimitedLog
+from utils.liveliness import LivelinessEngine
+from utils.motion import AdaptiveSampler, MotionGate
+from utils.pipeline import DropQueue, LatencyStats
+from utils.recognizer import CropRecognizer
+from utils.tracker import IoUTracker
+from utils.yolo_utils import detect_people_batch
+
+logger = logging.getLogger(__name__)
+
+# Stages timed for every processed batch
+STAGES = ('detect', 'recognize', 'match', 'verify', 'liveliness', 'record', 'store_write')
+
+
+def parse_source(source):
+    """
+    Camera device indices are given as digits; anything else (RTSP URL, video
+    file) is passed to OpenCV as is.
+    """
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+class CameraStream:
+    """
+    One camera, RTSP stream or video file read on its own thread into a
+    latest-frame-wins queue.
+    """
+
+    def __init__(self, stream_id, source):
+        self.stream_id = stream_id
+        self.source = parse_source(source)
+        self.frames = DropQueue(1, 'drop_oldest')
+        self.captured = 0
+        self.started = False
+        self.finished = False
+        # Last failure to open the source and when to try again (monotonic)
+        self.error = None
+        self.retry_at = 0.0
+        self._cap = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            raise RuntimeError(f"Could not open video source {self.source!r} for stream {self.stream_id}")
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.stream_id}", daemon=True)
+        self._thread.start()
+        self.started = True
+
+    def _run(self):
+        is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if not ret:
+                if is_file:
+                    # Video files end; live sources may just drop a frame
+                    self.finished = True
+                    return
+                time.sleep(0.01)
+                continue
+            self.captured += 1
+            self.frames.put((time.monotonic(), frame))
+
+    def latest(self):
+        return self.frames.get(timeout=0)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+        if self._cap is not None:
+            self._cap.release()
+
+
+class ClassroomSession:
+    """
+    Per-stream session state: tracker, attendance and the attendance CSV for
+    one classroom, plus the scheduler's bookkeeping for it.
+    """
+
+    def __init__(self, name, stream, class_start, class_end, output_path):
+        self.name = name
+        self.stream = stream
+        self.class_start = class_start
+        self.class_end = class_end
+        self.output_path = output_path
+        self.tracker = IoUTracker()
+        self.gate = MotionGate()
+        self.sampler = AdaptiveSampler()
+        self.recognized = set()
+        self.liveliness = LivelinessEngine()
+        self.attendance = {}
+        self.frames = 0
+        self.latency = LatencyStats()
+        # Deficit round robin state: seconds of inference this stream may spend
+        self.deficit = 0.0
+        self.cost_estimate = 0.0
+        self.ended = False
+        self._file = None
+        self._writer = None
+
+    def active(self, now):
+        return not self.ended and self.class_start <= now < self.class_end
+
+    def open_output(self):
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self._file = open(self.output_path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['Name', 'Entry Time', 'Deepfake Status', 'Liveliness Status'])
+
+    def mark_present(self, name, deepfake_status, liveliness_status):
+        entry_time = datetime.now().strftime("%H:%M:%S")
+        self.attendance[name] = entry_time
+        self._writer.writerow([name, entry_time, deepfake_status, liveliness_status])
+        self._file.flush()
+        logger.info(f"[{self.name}] Marked present: {name} at {entry_time} (Deepfake: {deepfake_status}, Liveliness: {liveliness_status})")
+        return entry_time
+
+    def close(self):
+        self.ended = True
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FairScheduler:
+    """
+    Deficit round robin over streams, measured in inference seconds. Each
+    round every stream with a waiting frame earns quantum seconds of credit
+    and is served while its credit covers its estimated per-frame cost, so a
+    crowded room costing many InsightFace calls per frame cannot starve a
+    quiet one.
+    """
+
+    def __init__(self, quantum=0.05, max_batch=8):
+        self.quantum = quantum
+        self.max_batch = max_batch
+        self._offset = 0
+
+    def select(self, sessions, now):
+        """
+        Return up to max_batch (session, captured_at, frame) items. Frames the
+        session's motion-gated sampler declines are dropped here, before any
+        model runs.
+        """
+        ready = [s for s in sessions if s.active(now)]
+        if not ready:
+            return []
+        batch = []
+        start = self._offset % len(ready)
+        for session in ready[start:] + ready[:start]:
+            if len(batch) >= self.max_batch:
+                break
+            session.deficit = min(session.deficit + self.quantum, 10 * self.quantum + session.cost_estimate)
+            if session.deficit < session.cost_estimate:
+                continue
+            item = session.stream.latest()
+            if item is None or not session.sampler.admit(session.gate, item[1], session.tracker):
+                continue
+            batch.append((session, item[0], item[1]))
+        self._offset += 1
+        return batch
+
+    @staticmethod
+    def charge(session, seconds):
+        session.deficit -= seconds
+        session.cost_estimate = seconds if session.cost_estimate == 0 else 0.8 * session.cost_estimate + 0.2 * seconds
+
+
+class FrameProcessor:
+    """
+    The per-frame attendance steps after person detection: track and embed,
+    match against the gallery, verify deepfakes, check liveliness and
+    record. AttendanceEngine runs them over scheduled batches and main.py
+    runs them in its pipeline stages, so both (and the replay harness) share
+    one implementation.
+
+    Each step takes a ClassroomSession for the per-stream state. Detections
+    are dicts carrying the person box, face crop and track, annotated with
+    name, deepfake_status, confidence and liveliness_status for display.
+    Counters go to instrumentation when given; stage timing is up to the
+    caller.
+    """
+
+    def __init__(self, recognizer, gallery, deepfake_client, fail_open=True, store=None, instrumentation=None,
+                 per_frame_log=None):
+        self.recognizer = recognizer
+        self.gallery = gallery
+        self.deepfake_client = deepfake_client
+        self.fail_open = fail_open
+        self.store = store
+        self.instrumentation = instrumentation
+        self.per_frame_log = per_frame_log or RateLimitedLog(logger)
+
+    def _count(self, metric, amount=1, **labels):
+        if self.instrumentation is not None:
+            getattr(self.instrumentation, metric).inc(amount, **labels)
+
+    def recognize(self, session, frame, boxes):
+        """
+        Track the person boxes and embed faces for tracks without a cached
+        identity. Recognized tracks that have not passed liveliness yet get
+        their face keypoints instead (detector only), stored on the detection
+        as 'landmarks' for check_liveliness(). Returns the frame's detections
+        and a list of (session, track, embedding) for match().
+        """
+        tracker = session.tracker
+        self._count('people', len(boxes))
+        self.per_frame_log.log('yolo', f"YOLO detected {len(boxes)} people")
+        tracks = tracker.update(boxes)
+        detections, needed, unchecked = [], [], []
+        for i, ((x1, y1, x2, y2), track) in enumerate(zip(boxes.tolist(), tracks)):
+            detections.append({'box': (x1, y1, x2, y2), 'face_crop': frame[y1:y2, x1:x2], 'track': track,
+                               'landmarks': None})
+            if tracker.cached_name(track) is None:
+                needed.append(i)
+            elif not tracker.is_live(track):
+                unchecked.append(i)
+            else:
+                # Only a resolved, live track skips every face model call
+                tracker.count('insightface_saved')
+        if unchecked:
+            tracker.count('detector_calls', len(unchecked))
+            for i, points in zip(unchecked, self.recognizer.landmarks(frame, boxes, unchecked)):
+                detections[i]['landmarks'] = points
+        pending = []
+        for i, embedding in zip(needed, self.recognizer.embed(frame, boxes, needed)):
+            tracker.count('insightface_calls')
+            if embedding is not None:
+                self._count('faces', result='found')
+                pending.append((session, tracks[i], embedding))
+            else:
+                self._count('faces', result='no_face')
+                self.per_frame_log.log('no_face', f"No face found for track {tracks[i].track_id} in this frame")
+        return detections, pending
+
+    def match(self, pending):
+        """
+        Match every new face from recognize() (across any number of frames
+        and sessions) in one gallery search and cache the identities found.
+        """
+        matches = self.gallery.get().match([embedding for _, _, embedding in pending])
+        for (session, track, _), (name, similarity) in zip(pending, matches):
+            if self.instrumentation is not None:
+                self.instrumentation.similarity.observe(similarity)
+            if name is None:
+                self._count('matches', result='unknown')
+                self.per_frame_log.log('unknown', f"Similarity score {similarity:.2f} too low. Face not recognized")
+                continue
+            self._count('matches', result='recognized')
+            session.tracker.resolve(track, name)
+            if name not in session.recognized:
+                session.recognized.add(name)
+                session.sampler.record_newcomer()
+                logger.info(f"[{session.name}] Recognized: {name} (track {track.track_id}, similarity {similarity:.2f})")
+
+    def verify(self, items):
+        """
+        Label the detections of (session, detections) items with their
+        identity and deepfake verdict, verifying every uncached face in one
+        parallel call. Returns the number of faces sent to the server.
+
+        May run on another thread than recognize(): each detection keeps the
+        track generation its identity was read at, and results are only
+        cached on the track if it still has that generation.
+        """
+        to_verify = []
+        for session, detections in items:
+            for detection in detections:
+                track = detection['track']
+                detection.update(name="Unknown", deepfake_status="Unknown", confidence=0.0, liveliness_status="Unknown")
+                name, detection['generation'] = session.tracker.identity(track)
+                if name is None:
+                    continue
+                detection['name'] = name
+                cached = session.tracker.cached_deepfake(track)
+                if cached is None:
+                    to_verify.append((session, detection))
+                else:
+                    detection['deepfake_status'], detection['confidence'] = cached
+        if not to_verify:
+            return 0
+        verdicts = self.deepfake_client.verify_many([detection['face_crop'] for _, detection in to_verify])
+        for (session, detection), verdict in zip(to_verify, verdicts):
+            session.tracker.count('deepfake_calls')
+            self._count('verdicts', label=verdict[0])
+            self.per_frame_log.log(('deepfake', detection['name']), f"Deepfake result for {detection['name']}: {verdict[0]}, Confidence: {verdict[1]:.2f}")
+            detection['deepfake_status'], detection['confidence'] = verdict
+            # Degraded verdicts are not cached so the face is re-checked once the server is back
+            if verdict[0] != DEGRADED_LABEL:
+                session.tracker.set_deepfake(detection['track'], detection['generation'], verdict)
+        return len(to_verify)
+
+    def check_liveliness(self, session, detections):
+        """
+        Evaluate liveliness for every recognized, not yet live person in one
+        frame with a single call to the session's own engine, so the same
+        student seen by two cameras is tracked separately. Returns the
+        number of people checked.
+        """
+        unchecked = {}
+        for detection in detections:
+            if detection['name'] == "Unknown":
+                continue
+            if session.tracker.cached_live(detection['track']):
+                detection['liveliness_status'] = "Live"
+            else:
+                unchecked.setdefault(detection['name'], detection)
+        if unchecked:
+            landmarks = np.full((len(unchecked), session.liveliness.n_landmarks, 2), np.nan, dtype=np.float32)
+            for row, detection in enumerate(unchecked.values()):
+                if detection.get('landmarks') is not None:
+                    landmarks[row] = detection['landmarks']
+            results = session.liveliness.update(list(unchecked), [d['box'] for d in unchecked.values()], landmarks)
+            for (name, detection), is_live in zip(unchecked.items(), results.tolist()):
+                session.tracker.count('liveliness_calls')
+                session.tracker.set_live(detection['track'], detection['generation'], is_live)
+                detection['liveliness_status'] = "Live" if is_live else "Static"
+                self._count('liveliness', result=detection['liveliness_status'].lower())
+                self.per_frame_log.log(('liveliness', name), f"Liveliness result for {name}: {detection['liveliness_status']}")
+        for detection in detections:
+            if detection['name'] != "Unknown" and detection['liveliness_status'] == "Unknown":
+                # Another box with the same name was checked in this frame
+                detection['liveliness_status'] = "Static"
+        return len(unchecked)
+
+    def record(self, session, detections):
+        """
+        Mark verified, live students present in the session's CSV and the
+        attendance store (buffered there).
+        """
+        for detection in detections:
+            name = detection['name']
+            if name == "Unknown" or name in session.attendance:
+                continue
+            deepfake_status, liveliness_status = detection['deepfake_status'], detection['liveliness_status']
+            verified = deepfake_status == "Real" or (deepfake_status == DEGRADED_LABEL and self.fail_open)
+            if not (verified and liveliness_status == "Live"):
+                self.per_frame_log.log(('not_marked', name), f"Not marking {name} present yet. Deepfake: {deepfake_status}, Liveliness: {liveliness_status}")
+                continue
+            csv_start = time.perf_counter()
+            entry_time = session.mark_present(name, deepfake_status, liveliness_status)
+            if self.instrumentation is not None:
+                self.instrumentation.observe_stage('csv_io', time.perf_counter() - csv_start)
+                self.instrumentation.marked.inc()
+            if self.store is not None:
+                self.store.mark_present(f"{session.class_start:%Y-%m-%d}", session.name, name, entry_time,
+                                        deepfake_status, liveliness_status)
+
+
+class AttendanceEngine:
+    """
+    Runs several classroom streams in one process against one YOLO model, one
+    FaceAnalysis instance, one gallery and one deepfake client. Frames from
+    different streams are scheduled fairly and detected in one YOLO forward
+    pass, their faces are matched against the gallery in one batched search
+    and verified in one parallel call.
+    gallery is a StoreWatcher whose get() returns a GalleryMatcher, and
+    recognizer (per-crop by default) comes from utils.recognizer, and stage
+    timings also go to instrumentation (utils.instrumentation) when given.
+    Marks are also buffered in store (a utils.attendance_store
+    AttendanceStore) when given and written in batches between frames.
+    A camera that fails to open is retried every camera_retry seconds while
+    its class lasts.
+    """
+
+    def __init__(self, sessions, app, gallery, deepfake_client, scheduler=None, fail_open=True, recognizer=None,
+                 instrumentation=None, store=None, camera_retry=10.0):
+        self.sessions = sessions
+        self.app = app
+        self.gallery = gallery
+        self.deepfake_client = deepfake_client
+        self.scheduler = scheduler or FairScheduler()
+        self.processor = FrameProcessor(recognizer or CropRecognizer(app), gallery, deepfake_client, fail_open=fail_open,
+                                        store=store, instrumentation=instrumentation)
+        self.batch_latency = LatencyStats()
+        self.stage_latency = {stage: LatencyStats() for stage in STAGES}
+        self.instrumentation = instrumentation
+        self.store = store
+        self.camera_retry = camera_retry
+        self.frames = 0
+        self._started_at = None
+        self._cpu_started_at = None
+
+    def _observe(self, stage, seconds):
+        self.stage_latency[stage].record(seconds)
+        if self.instrumentation is not None:
+            self.instrumentation.observe_stage(stage, seconds)
+
+    def process_batch(self, batch):
+        """
+        Detect, recognize, verify and record one scheduled batch of frames.
+        """
+        batch_start = time.perf_counter()
+        items = []
+        pending = []
+        # One YOLO forward pass for the frames of every scheduled stream
+        detect_start = time.perf_counter()
+        all_boxes = detect_people_batch([frame for _, _, frame in batch])
+        detect_seconds = time.perf_counter() - detect_start
+        self._observe('detect', detect_seconds)
+        detect_share = detect_seconds / len(batch)
+        recognize_start = time.perf_counter()
+        for (session, captured_at, frame), boxes in zip(batch, all_boxes):
+            item_start = time.perf_counter() - detect_share
+            detections, found = self.processor.recognize(session, frame, boxes)
+            pending.extend(found)
+            items.append((session, captured_at, detections, time.perf_counter() - item_start))
+        self._observe('recognize', time.perf_counter() - recognize_start)
+
+        # One gallery search for every new face across all streams
+        match_start = time.perf_counter()
+        self.processor.match(pending)
+        self._observe('match', time.perf_counter() - match_start)
+
+        # One parallel verification call for every uncached face across all streams
+        verify_start = time.perf_counter()
+        self.processor.verify([(session, detections) for session, _, detections, _ in items])
+        self._observe('verify', time.perf_counter() - verify_start)
+
+        shared = (time.perf_counter() - batch_start - sum(item[3] for item in items)) / max(len(items), 1)
+        liveliness_seconds = record_seconds = 0.0
+        for session, captured_at, detections, own_seconds in items:
+            stage_start = time.perf_counter()
+            self.processor.check_liveliness(session, detections)
+            liveliness_seconds += time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+            self.processor.record(session, detections)
+            record_seconds += time.perf_counter() - stage_start
+            session.frames += 1
+            session.latency.record(time.monotonic() - captured_at)
+            self.scheduler.charge(session, own_seconds + shared)
+            session.sampler.record_cost(own_seconds + shared)
+        self._observe('liveliness', liveliness_seconds)
+        self._observe('record', record_seconds)
+        self.frames += len(items)
+        if self.instrumentation is not None:
+            self.instrumentation.frames.inc(len(items), outcome='inferred')
+        self.batch_latency.record(time.perf_counter() - batch_start)
+
+    def run(self, on_session_end=None, idle_sleep=0.005):
+        """
+        Process frames until every session has ended. on_session_end is called
+        with each session as soon as its class window closes or its video
+        source runs out; a session whose camera never opened has
+        session.stream.started False and its stream.error set.
+        """
+        self._started_at = time.monotonic()
+        self._cpu_started_at = time.process_time()
+        while not all(s.ended for s in self.sessions):
+            now = datetime.now()
+            for session in self.sessions:
+                stream = session.stream
+                if session.active(now) and not stream.started and time.monotonic() >= stream.retry_at:
+                    # Cameras are only opened once their class starts
+                    try:
+                        stream.start()
+                    except RuntimeError as e:
+                        stream.error = str(e)
+                        stream.retry_at = time.monotonic() + self.camera_retry
+                        logger.error(f"[{session.name}] {e}; retrying in {self.camera_retry:g} s")
+                    else:
+                        session.open_output()
+                        logger.info(f"[{session.name}] Session started on {session.stream.source!r}")
+                if not session.ended and (now >= session.class_end or (session.stream.finished and session.stream.frames.qsize() == 0)):
+                    session.close()
+                    session.stream.stop()
+                    logger.info(f"[{session.name}] Session ended after {session.frames} frames")
+                    if on_session_end is not None:
+                        on_session_end(session)
+            if self.store is not None:
+                flush_start = time.perf_counter()
+                if self.store.flush_due():
+                    self._observe('store_write', time.perf_counter() - flush_start)
+            batch = self.scheduler.select(self.sessions, now)
+            if not batch:
+                time.sleep(idle_sleep)
+                continue
+            self.process_batch(batch)
+
+    def report(self):
+        """
+        Per-stream and aggregate throughput. fps_per_core divides frames by
+        the CPU seconds this process consumed, so it stays comparable across
+        machines with different core counts.
+        """
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        cpu_seconds = time.process_time() - self._cpu_started_at if self._cpu_started_at else 0.0
+        return {
+            'streams': {
+                s.name: {
+                    'frames': s.frames,
+                    'captured': s.stream.captured,
+                    'fps': s.frames / elapsed if elapsed > 0 else 0.0,
+                    'latency': s.latency.summary(),
+                    'present': len(s.attendance),
+                    'cache_hit_rate': s.tracker.hit_rate(),
+                    'sampling': s.sampler.summary(),
+                }
+                for s in self.sessions
+            },
+            'frames': self.frames,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'cpu_seconds': cpu_seconds,
+            'fps_per_core': self.frames / cpu_seconds if cpu_seconds > 0 else 0.0,
+            'cores': os.cpu_count(),
+            'batch_latency': self.batch_latency.summary(),
+            'stages': {stage: stats.summary() for stage, stats in self.stage_latency.items()},
+        }
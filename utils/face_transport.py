@@ -0,0 +1,143 @@
+import base64
+import struct
+
+import cv2
+import numpy as np
+
+# Wire formats for sending face crops to the deepfake server, cheapest CPU first.
+# 'raw' is a pre-resized uint8 BGR tensor, 'jpeg' a raw JPEG body and 'json'
+# the original base64-in-JSON payload kept for older clients.
+FORMAT_RAW = 'raw'
+FORMAT_JPEG = 'jpeg'
+FORMAT_JSON = 'json'
+FORMATS = (FORMAT_RAW, FORMAT_JPEG, FORMAT_JSON)
+
+INPUT_SIZE = (200, 200)
+RAW_SHAPE = (INPUT_SIZE[1], INPUT_SIZE[0], 3)
+RAW_NBYTES = RAW_SHAPE[0] * RAW_SHAPE[1] * RAW_SHAPE[2]
+
+CONTENT_TYPES = {
+    FORMAT_RAW: 'application/x-face-raw',
+    FORMAT_JPEG: 'image/jpeg',
+}
+STREAM_CONTENT_TYPE = 'application/x-face-stream'
+
+# Stream records are a 1-byte format code and a 4-byte big-endian payload length
+RECORD_HEADER = struct.Struct('>BI')
+FORMAT_CODES = {FORMAT_RAW: 0, FORMAT_JPEG: 1}
+CODE_FORMATS = {code: fmt for fmt, code in FORMAT_CODES.items()}
+
+
+def _check_crop(face_crop):
+    if face_crop is None or not np.asarray(face_crop).size:
+        raise ValueError("Empty face crop")
+
+
+def encode_jpeg(face_crop):
+    """
+    JPEG-encode a BGR face crop. Raises ValueError if it cannot be encoded.
+    """
+    _check_crop(face_crop)
+    ok, buffer = cv2.imencode('.jpg', face_crop)
+    if not ok:
+        raise ValueError("Could not JPEG-encode face crop")
+    return buffer
+
+
+def encode_payload(face_crop, fmt):
+    """
+    Encode a BGR face crop as a binary payload in the given format.
+    """
+    if fmt == FORMAT_RAW:
+        _check_crop(face_crop)
+        return np.ascontiguousarray(cv2.resize(face_crop, INPUT_SIZE), dtype=np.uint8).tobytes()
+    if fmt == FORMAT_JPEG:
+        return encode_jpeg(face_crop).tobytes()
+    raise ValueError(f"Format '{fmt}' has no binary payload")
+
+
+def encode_request(face_crop, fmt):
+    """
+    Return the requests.post keyword arguments that send one face crop.
+    """
+    if fmt == FORMAT_JSON:
+        return {'json': {'image': base64.b64encode(encode_jpeg(face_crop)).decode('utf-8')}}
+    return {'data': encode_payload(face_crop, fmt), 'headers': {'Content-Type': CONTENT_TYPES[fmt]}}
+
+
+def encode_batch_request(face_crops, fmt):
+    """
+    Return the requests.post keyword arguments that send several face crops.
+    """
+    if fmt == FORMAT_JSON:
+        images = [base64.b64encode(encode_jpeg(crop)).decode('utf-8') for crop in face_crops]
+        return {'json': {'images': images}}
+    parts = []
+    for crop in face_crops:
+        payload = encode_payload(crop, fmt)
+        parts.append(RECORD_HEADER.pack(FORMAT_CODES[fmt], len(payload)))
+        parts.append(payload)
+    return {'data': b''.join(parts), 'headers': {'Content-Type': STREAM_CONTENT_TYPE}}
+
+
+def decode_payload(buffer, fmt, offset=0, length=None):
+    """
+    Decode a binary payload into a BGR image without copying the body.
+    Raw tensors come back as a read-only view of buffer. Returns None if the
+    payload is malformed.
+    """
+    if length is None:
+        length = len(buffer) - offset
+    if fmt == FORMAT_RAW:
+        if length != RAW_NBYTES:
+            return None
+        return np.frombuffer(buffer, dtype=np.uint8, count=RAW_NBYTES, offset=offset).reshape(RAW_SHAPE)
+    if fmt == FORMAT_JPEG:
+        if length == 0:
+            return None
+        try:
+            return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset), cv2.IMREAD_COLOR)
+        except cv2.error:
+            return None
+    raise ValueError(f"Format '{fmt}' has no binary payload")
+
+
+def decode_stream(buffer):
+    """
+    Decode a length-prefixed stream of face payloads. Returns one image per
+    record, None for records that fail to decode.
+    """
+    images = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(buffer):
+        code, length = RECORD_HEADER.unpack_from(buffer, offset)
+        offset += RECORD_HEADER.size
+        if offset + length > len(buffer):
+            raise ValueError("Truncated face stream")
+        fmt = CODE_FORMATS.get(code)
+        images.append(decode_payload(buffer, fmt, offset, length) if fmt else None)
+        offset += length
+    if offset != len(buffer):
+        raise ValueError("Trailing bytes in face stream")
+    return images
+
+
+def preprocess_face(img):
+    """
+    Resize a BGR face image to the deepfake model input and scale it to
+    [0, 1] RGB float32.
+    """
+    if img.shape != RAW_SHAPE:
+        img = cv2.resize(img, INPUT_SIZE)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img.astype(np.float32) / 255.0
+
+
+def format_for_content_type(content_type):
+    """
+    Map a request mimetype to a binary format, or None for JSON requests.
+    """
+    for fmt, ct in CONTENT_TYPES.items():
+        if content_type == ct:
+            return fmt
+    return None
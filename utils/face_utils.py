@@ -2,49 +2,179 @@
 import insightface
 from insightface.app import FaceAnalysis
 import os
+import hashlib
+import time
 import numpy as np
-import pickle
 import cv2
+from multiprocessing import Pool
+from utils.ann_index import build_index, save_index
+from utils.embedding_store import write_store, INDEX_DIR
+from utils.templates import TemplateStore
 
-def encode_faces(dataset_path='dataset/'):
-    app = FaceAnalysis(name='buffalo_l')
-    app.prepare(ctx_id=-1)  # use -1 for CPU fallback if needed
+MODEL_NAME = 'buffalo_l'
 
-    known_encodings = []
-    known_names = []
+# Per-worker FaceAnalysis instance, created once by the pool initializer
+_worker_app = None
 
-    print("[INFO] Starting face encoding...")
 
-    for person_name in os.listdir(dataset_path):
+def file_hash(path):
+    """
+    SHA-1 of a file's contents, used as the embedding cache key.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, digest[:2], f"{digest}.npy")
+
+
+def _read_cache(cache_dir, digest):
+    """
+    Return (hit, embedding). embedding is None for images cached as having no
+    face or as unreadable.
+    """
+    path = _cache_path(cache_dir, digest)
+    if not os.path.exists(path):
+        return False, None
+    embedding = np.load(path, allow_pickle=False)
+    return True, (embedding if embedding.size else None)
+
+
+def _write_cache(cache_dir, digest, embedding):
+    # Written atomically so a crash never leaves a half-written entry behind
+    path = _cache_path(cache_dir, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, np.zeros(0, dtype=np.float32) if embedding is None else np.asarray(embedding, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def _init_worker(ctx_id):
+    global _worker_app
+    _worker_app = FaceAnalysis(name=MODEL_NAME)
+    _worker_app.prepare(ctx_id=ctx_id)
+
+
+def _embed_image(job):
+    """
+    Embed one image in a pool worker. Returns (digest, img_path, status, embedding),
+    with the error message in place of the embedding when status is 'failed'.
+    """
+    digest, img_path = job
+    img = cv2.imread(img_path)
+    if img is None:
+        return digest, img_path, 'unreadable', None
+    try:
+        faces = _worker_app.get(img)
+    except Exception as e:
+        return digest, img_path, 'failed', repr(e)
+    if not faces:
+        return digest, img_path, 'no_face', None
+    return digest, img_path, 'encoded', faces[0].embedding
+
+
+def list_dataset(dataset_path):
+    """
+    Return (person_name, img_path) pairs for every file under dataset_path.
+    """
+    images = []
+    for person_name in sorted(os.listdir(dataset_path)):
         person_folder = os.path.join(dataset_path, person_name)
         if not os.path.isdir(person_folder):
             continue
+        for img_file in sorted(os.listdir(person_folder)):
+            images.append((person_name, os.path.join(person_folder, img_file)))
+    return images
 
-        print(f"[INFO] Processing: {person_name}")
 
-        for img_file in os.listdir(person_folder):
-            img_path = os.path.join(person_folder, img_file)
-            print(f"  → Reading: {img_path}")
-            img = cv2.imread(img_path)
+def build_store_index(store):
+    """
+    Build the search index over the same templates main.py matches against and
+    save it with the store version, so it never goes stale relative to it.
+    Matching processes memory-map it instead of building templates themselves.
+    """
+    templates = TemplateStore(store.embeddings, store.names)
+    index = build_index(templates.vectors)
+    save_index(index, store.file_path(INDEX_DIR), templates.names, templates.params)
+    print(f"[✅] Built {index.kind} search index at {store.file_path(INDEX_DIR)}.")
 
-            if img is None:
-                print(f"  [WARNING] Could not load image: {img_path}")
-                continue
 
-            faces = app.get(img)
-            if not faces:
-                print(f"  [SKIP] No face found in {img_file}")
-                continue
+def encode_faces(dataset_path='dataset/', workers=None, ctx_id=-1, cache_dir=None, store_dir=None):
+    """
+    Embed every image under dataset_path and publish them as a new version of
+    the embedding store in encodings/store.
+    Embeddings are cached per image content hash, so a rerun only embeds new
+    or modified images and an interrupted run resumes where it stopped.
+    Images are embedded across a process pool with one model per worker.
+    """
+    workers = workers or os.cpu_count() or 1
+    cache_dir = cache_dir or os.path.join("encodings", "cache", MODEL_NAME)
+    store_dir = store_dir or os.path.join("encodings", "store")
 
-            known_encodings.append(faces[0].embedding)
+    print("[INFO] Starting face encoding...")
+    images = list_dataset(dataset_path)
+    digests = {}
+    pending = []
+    for person_name, img_path in images:
+        digest = file_hash(img_path)
+        digests[img_path] = digest
+        if not _read_cache(cache_dir, digest)[0]:
+            pending.append((digest, img_path))
+    # Identical files only need embedding once
+    pending = list({digest: (digest, img_path) for digest, img_path in pending}.values())
+    print(f"[INFO] {len(images)} images, {len(images) - len(pending)} cached, {len(pending)} to embed on {workers} workers")
+
+    if pending:
+        start = time.perf_counter()
+        pool = None
+        if workers > 1 and len(pending) > 1:
+            pool = Pool(min(workers, len(pending)), initializer=_init_worker, initargs=(ctx_id,))
+            results = pool.imap_unordered(_embed_image, pending, chunksize=4)
+        else:
+            _init_worker(ctx_id)
+            results = map(_embed_image, pending)
+        try:
+            for done, (digest, img_path, status, embedding) in enumerate(results, 1):
+                if status == 'unreadable':
+                    print(f"  [WARNING] Could not load image: {img_path}")
+                elif status == 'failed':
+                    # Model errors may be transient (out of memory, a driver
+                    # hiccup), so the image is not cached and is retried next run
+                    print(f"  [WARNING] Could not embed {img_path}, will retry next run: {embedding}")
+                elif status == 'no_face':
+                    print(f"  [SKIP] No face found in {img_path}")
+                if status != 'failed':
+                    # Unreadable and faceless images are cached too (without an
+                    # embedding): unchanged files give the same result every run
+                    _write_cache(cache_dir, digest, embedding if status == 'encoded' else None)
+                if done % 50 == 0 or done == len(pending):
+                    elapsed = time.perf_counter() - start
+                    print(f"[INFO] Embedded {done}/{len(pending)} images ({done / elapsed:.1f} images/s)")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    known_encodings = []
+    known_names = []
+    skipped = []
+    for person_name, img_path in images:
+        hit, embedding = _read_cache(cache_dir, digests[img_path])
+        if hit and embedding is not None:
+            known_encodings.append(embedding)
             known_names.append(person_name)
-            print(f"  [✓] Face encoded for {img_file}")
+        else:
+            skipped.append(img_path)
+    if skipped:
+        print(f"[INFO] Skipped {len(skipped)} images without a usable face or that failed to load or embed, e.g. {skipped[0]}")
 
     if known_encodings:
-        os.makedirs("encodings", exist_ok=True)
-        with open("encodings/face_encodings.pkl", "wb") as f:
-            pickle.dump((known_encodings, known_names), f)
-        print(f"[✅] Encoded {len(known_encodings)} faces.")
+        version = write_store(store_dir, np.stack(known_encodings), known_names, MODEL_NAME, before_publish=build_store_index)
+        print(f"[✅] Encoded {len(known_encodings)} faces into {store_dir} (version {version}).")
     else:
         print("[❌] No faces encoded.")
 
@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as TallyCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class Instrumentation:
+    """
+    Stage timers and counters for the attendance loop, kept in a
+    MetricsRegistry so they can be served as Prometheus text or written as
+    JSON snapshots.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.stage_seconds = self.registry.histogram('attendance_stage_seconds', 'Time spent per stage call')
+        self.frames = self.registry.counter('attendance_frames_total', 'Frames seen, by outcome')
+        self.people = self.registry.counter('attendance_people_detected_total', 'Person boxes detected')
+        self.faces = self.registry.counter('attendance_faces_embedded_total', 'Faces embedded, by result')
+        self.matches = self.registry.counter('attendance_matches_total', 'Gallery lookups, by result')
+        self.verdicts = self.registry.counter('attendance_deepfake_verdicts_total', 'Deepfake verdicts, by label')
+        self.liveliness = self.registry.counter('attendance_liveliness_checks_total', 'Liveliness checks, by result')
+        self.marked = self.registry.counter('attendance_marked_present_total', 'Students marked present')
+        self.similarity = self.registry.histogram('attendance_match_similarity', 'Best gallery similarity per face',
+                                                  buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9))
+
+    @contextmanager
+    def stage(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=name, **labels)
+
+    def observe_stage(self, name, seconds, **labels):
+        self.stage_seconds.observe(seconds, stage=name, **labels)
+
+
+class MetricsServer:
+    """
+    Serves a registry as Prometheus text on GET /metrics (and a JSON
+    snapshot on GET /metrics.json) from a background thread. Binds to
+    localhost unless told otherwise.
+    """
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.render_prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(registry.snapshot()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Serving attendance metrics on http://{self.httpd.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SnapshotWriter:
+    """
+    Writes the registry's JSON snapshot to path every interval seconds (and
+    once more on stop), replacing the file atomically.
+    """
+
+    def __init__(self, registry, path, interval=30.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'written_at': time.time(), 'metrics': self.registry.snapshot()}, f)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Could not write metrics snapshot to {self.path}: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2.0)
+        self.write()
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler: a background thread samples the call
+    stacks of the other threads every interval seconds and tallies them.
+    report() lists the hottest functions; write_collapsed() writes stacks in
+    the folded format flame graph tools read.
+    """
+
+    def __init__(self, interval=0.005, thread_names=None):
+        self.interval = interval
+        self.thread_names = set(thread_names) if thread_names else None
+        self.stacks = TallyCounter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == own or (self.thread_names is not None and name not in self.thread_names):
+                    continue
+                stack = tuple(f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                              for entry in traceback.extract_stack(frame))
+                self.stacks[(name,) + stack] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(2.0)
+
+    def report(self, top=20):
+        """
+        Return [(function, self_samples, total_samples)] for the top functions
+        by self time.
+        """
+        own, total = TallyCounter(), TallyCounter()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for entry in set(frames):
+                total[entry] += count
+        return [(entry, count, total[entry]) for entry, count in own.most_common(top)]
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.items():
+                f.write(';'.join(stack) + f' {count}\n')
+
+
+class RateLimitedLog:
+    """
+    Emits each kind of message at most once per interval seconds and counts
+    what it suppressed, for logging inside the per-frame loop.
+    """
+
+    def __init__(self, logger, interval=5.0, level=logging.DEBUG, clock=time.monotonic):
+        self.logger = logger
+        self.interval = interval
+        self.level = level
+        self.clock = clock
+        self._last = {}
+        self._suppressed = TallyCounter()
+        self._lock = threading.Lock()
+
+    def log(self, key, message, *args):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] += 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message = f"{message} ({suppressed} similar messages suppressed)"
+        self.logger.log(self.level, message, *args)
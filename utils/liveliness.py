@@ -1,77 +1,182 @@
-# import numpy as np
-
-# # Dictionary to store previous positions of faces (key: name, value: center position)
-# previous_positions = {}
-
-# def check_liveliness(name, current_box):
-#     """
-#     Check if a person is live by detecting movement in their bounding box.
-#     Returns True if live, False otherwise.
-#     """
-#     x1, y1, x2, y2 = current_box
-#     current_center = ((x1 + x2) // 2, (y1 + y2) // 2)  # Center of current bounding box
-
-#     if name not in previous_positions:
-#         # First detection of this person, store position and return False (need more frames)
-#         previous_positions[name] = current_center
-#         return False
-
-#     # Calculate movement (Euclidean distance between centers)
-#     prev_center = previous_positions[name]
-#     movement = np.sqrt((current_center[0] - prev_center[0])**2 + (current_center[1] - prev_center[1])**2)
-
-#     # Update previous position
-#     previous_positions[name] = current_center
-
-#     # Threshold for movement (adjust as needed)
-#     MOVEMENT_THRESHOLD = 20  # Pixels
-#     return movement > MOVEMENT_THRESHOLD
-
+import threading
+import time
 
 import numpy as np
-from datetime import datetime, timedelta
 
-# Dictionary to store previous positions and timestamps (key: name, value: (center position, timestamp))
-previous_positions = {}
+from utils.state_store import BoundedStore
 
-def reset_liveliness():
+
+class RingBuffers:
     """
-    Reset the previous positions dictionary at the start of a new session.
+    Fixed-size per-identity sample history stored as one set of arrays:
+    slot i holds the last window samples of one identity, written
+    round-robin at head[i]. Memory is fixed at construction.
     """
-    global previous_positions
-    previous_positions.clear()
-    print("[+] Liveliness tracking reset.")
 
-def check_liveliness(name, current_box):
+    __slots__ = ('capacity', 'window', 'times', 'centers', 'landmarks', 'head', 'count')
+
+    def __init__(self, capacity, window, n_landmarks=5):
+        self.capacity = capacity
+        self.window = window
+        self.times = np.full((capacity, window), -np.inf)
+        self.centers = np.zeros((capacity, window, 2), dtype=np.float32)
+        self.landmarks = np.full((capacity, window, n_landmarks, 2), np.nan, dtype=np.float32)
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+
+    def clear(self, slots):
+        self.times[slots] = -np.inf
+        self.landmarks[slots] = np.nan
+        self.head[slots] = 0
+        self.count[slots] = 0
+
+    def append(self, slots, now, centers, landmarks):
+        """
+        Write one sample for each slot (slots must be unique).
+        """
+        heads = self.head[slots]
+        self.times[slots, heads] = now
+        self.centers[slots, heads] = centers
+        self.landmarks[slots, heads] = landmarks
+        self.head[slots] = (heads + 1) % self.window
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.window)
+
+
+class LivelinessEngine:
     """
-    Check if a person is live by detecting movement in their bounding box.
-    Returns True if live, False otherwise.
+    Liveliness checks for everyone tracked in one session, evaluated for a
+    whole frame in one vectorized step.
+
+    Each identity keeps its last window samples in a ring buffer. A person
+    is live when, within the last max_age seconds and over at least
+    min_samples samples, either their box center moved more than
+    movement_threshold pixels (the original signal) or, when face keypoints
+    are supplied, their landmarks jittered relative to each other by more
+    than jitter_threshold of the inter-ocular distance. A photo moved in
+    front of the camera shifts its landmarks rigidly and shows no jitter.
+
+    The detector itself places landmarks with about landmark_noise pixels
+    of error, which on a small face is several percent of the inter-ocular
+    distance. Jitter only counts when the most displaced landmark also
+    exceeds noise_margin times that noise, over at least jitter_samples
+    frames with keypoints, so a still photo at classroom distances does not
+    pass on detector noise alone.
+
+    Memory is bounded by capacity. Identities not seen for ttl seconds are
+    expired and, when every slot is taken, the least recently seen identity
+    is evicted, so a deployment streaming for days or running back-to-back
+    classes keeps a flat footprint. Safe to call from several threads.
     """
-    x1, y1, x2, y2 = current_box
-    current_center = ((x1 + x2) // 2, (y1 + y2) // 2)  # Center of current bounding box
-    current_time = datetime.now()
-
-    if name not in previous_positions:
-        # First detection of this person, store position and return False (need more frames)
-        previous_positions[name] = (current_center, current_time)
-        return False
-
-    # Get previous position and timestamp
-    prev_center, prev_time = previous_positions[name]
-
-    # Check if the previous position is too old (e.g., > 5 seconds)
-    time_diff = (current_time - prev_time).total_seconds()
-    if time_diff > 5:
-        # Position is too old, treat this as a new detection
-        previous_positions[name] = (current_center, current_time)
-        return False
-
-    # Calculate movement (Euclidean distance between centers)
-    movement = np.sqrt((current_center[0] - prev_center[0])**2 + (current_center[1] - prev_center[1])**2)
-
-    # Update previous position and timestamp
-    previous_positions[name] = (current_center, current_time)
-
-    # Threshold for movement (adjust as needed)
-    MOVEMENT_THRESHOLD = 20  # Pixels
-    return movement > MOVEMENT_THRESHOLD
\ No newline at end of file
+
+    def __init__(self, capacity=256, window=16, max_age=5.0, min_samples=2, movement_threshold=20.0,
+                 jitter_threshold=0.02, landmark_noise=1.0, noise_margin=2.5, jitter_samples=6, n_landmarks=5,
+                 ttl=60.0, clock=time.monotonic):
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.movement_threshold = movement_threshold
+        self.jitter_threshold = jitter_threshold
+        self.landmark_noise = landmark_noise
+        self.noise_margin = noise_margin
+        self.jitter_samples = jitter_samples
+        self.n_landmarks = n_landmarks
+        self.clock = clock
+        self.buffers = RingBuffers(capacity, window, n_landmarks)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._slots = BoundedStore(capacity, ttl=ttl, clock=clock, on_evict=self._release)
+        self._lock = threading.Lock()
+        self.stats = {'checks': 0, 'live': 0}
+
+    def _release(self, key, slot):
+        self._free.append(slot)
+
+    def _slot_for(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            if not self._free:
+                # Frees the least recently seen identity's slot
+                self._slots.expire()
+                self._slots.put(key, -1)
+            slot = self._free.pop()
+            self.buffers.clear(slot)
+            self._slots.put(key, slot)
+        return slot
+
+    def update(self, keys, boxes, landmarks=None):
+        """
+        Add one observation per key (unique within the call) and return a
+        bool array saying who is live. boxes is (n, 4) x1, y1, x2, y2;
+        landmarks, if given, is (n, n_landmarks, 2) with NaN rows for people
+        without keypoints this frame.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if not len(boxes):
+            return np.zeros(0, dtype=bool)
+        if len(boxes) > self.buffers.capacity:
+            raise ValueError(f"{len(boxes)} people in one update exceed liveliness capacity {self.buffers.capacity}")
+        if landmarks is None:
+            landmarks = np.full((len(boxes), self.n_landmarks, 2), np.nan, dtype=np.float32)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+
+        with self._lock:
+            now = self.clock()
+            slots = np.fromiter((self._slot_for(key) for key in keys), dtype=np.int64, count=len(boxes))
+            buffers = self.buffers
+            buffers.append(slots, now, centers, landmarks)
+
+            recent = buffers.times[slots] >= now - self.max_age
+            enough = recent.sum(axis=1) >= self.min_samples
+
+            # Movement: largest displacement of the box center within the window
+            history = buffers.centers[slots]
+            spread = (np.where(recent[:, :, None], history, -np.inf).max(axis=1)
+                      - np.where(recent[:, :, None], history, np.inf).min(axis=1))
+            moved = np.hypot(spread[:, 0], spread[:, 1]) > self.movement_threshold
+
+            live = enough & (moved | self._jitter(buffers.landmarks[slots], recent))
+            self.stats['checks'] += len(boxes)
+            self.stats['live'] += int(live.sum())
+        return live
+
+    def _jitter(self, landmarks, recent):
+        """
+        True where the landmark shape varied within the window by more than
+        both jitter_threshold and the detector noise floor. Landmarks are
+        centered and scaled by inter-ocular distance so head translation and
+        distance from the camera cancel out; the noise floor is scaled the
+        same way, so it is larger for smaller faces.
+        """
+        valid = recent & ~np.isnan(landmarks[:, :, 0, 0])
+        points = np.nan_to_num(landmarks)
+        centered = points - points.mean(axis=2, keepdims=True)
+        scale = np.hypot(*(points[:, :, 0] - points[:, :, 1]).transpose(2, 0, 1))
+        valid &= scale > 0
+        shape = centered / np.where(valid, scale, 1.0)[:, :, None, None]
+        weights = valid[:, :, None, None].astype(np.float32)
+        samples = valid.sum(axis=1)
+        mean = (shape * weights).sum(axis=1, keepdims=True) / np.maximum(samples, 1)[:, None, None, None]
+        variance = (((shape - mean) * weights) ** 2).sum(axis=1) / np.maximum(samples, 1)[:, None, None]
+        # The landmark that moved most against the others: a head turn shifts
+        # the nose alone, which averaging over all landmarks would dilute
+        jitter = np.sqrt(variance).max(axis=(1, 2))
+        mean_scale = (np.where(valid, scale, 0.0).sum(axis=1) / np.maximum(samples, 1))
+        noise_floor = self.noise_margin * self.landmark_noise / np.maximum(mean_scale, 1e-6)
+        enough = samples >= max(self.min_samples, self.jitter_samples)
+        return enough & (jitter > np.maximum(self.jitter_threshold, noise_floor))
+
+    def reset(self):
+        """
+        Forget every identity, for example at the start of a new session.
+        """
+        with self._lock:
+            self._slots.clear()
+            self.buffers.clear(slice(None))
+
+    def summary(self):
+        """
+        Check counts plus the identity store's size and eviction statistics.
+        """
+        with self._lock:
+            return dict(self.stats, identities=self._slots.summary())
+
+    def __len__(self):
+        return len(self._slots)
@@ -0,0 +1,474 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import sqlite3
+import threading
+import time
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from string import Template
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PATH = 'data/outbox.db'
+
+# SMTP settings; point MAIL_SMTP_HOST at a local stand-in (with
+# MAIL_STARTTLS=0) to test without sending real mail
+SMTP_HOST = os.environ.get('MAIL_SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('MAIL_SMTP_PORT', '587'))
+SMTP_STARTTLS = os.environ.get('MAIL_STARTTLS', '1') == '1'
+# Concurrent SMTP connections and the overall send rate in messages per
+# second (0 for no limit)
+POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE', '4'))
+SEND_RATE = float(os.environ.get('MAIL_RATE', '10'))
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    id INTEGER PRIMARY KEY,
+    sender TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attachment_name TEXT,
+    attachment BLOB,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    body_id INTEGER NOT NULL REFERENCES bodies (id),
+    recipient TEXT NOT NULL,
+    params TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt);
+"""
+
+
+class Outbox:
+    """
+    Persistent mail queue in a SQLite database (WAL mode), shared by every
+    process that sends mail. A message body is stored once however many
+    recipients it has; per-recipient template parameters sit with each
+    message. Claims are atomic, so several dispatchers can drain the same
+    outbox, and a claim left behind by a crashed process is retried once
+    its lease runs out.
+    """
+
+    def __init__(self, path=OUTBOX_PATH, busy_timeout=5.0, clock=time.time):
+        self.path = path
+        self.clock = clock
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def _transaction(self, fn, *args):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(*args)
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+        return result
+
+    def enqueue(self, sender, subject, body, recipients, attachment=None):
+        """
+        Queue one message for every recipient. subject and body are
+        string.Template texts; recipients are addresses, or (address, params)
+        pairs whose params fill in per-recipient $placeholders. attachment is
+        an optional (filename, bytes) pair. Returns the number queued.
+        """
+        now = self.clock()
+        rows = []
+        for recipient in recipients:
+            address, params = recipient if isinstance(recipient, tuple) else (recipient, None)
+            rows.append((address, json.dumps(params) if params else None))
+        if not rows:
+            return 0
+        name, content = attachment if attachment else (None, None)
+
+        def insert():
+            body_id = self.conn.execute(
+                'INSERT INTO bodies (sender, subject, body, attachment_name, attachment, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (sender, subject, body, name, content, now)).lastrowid
+            self.conn.executemany(
+                'INSERT INTO messages (body_id, recipient, params, status, next_attempt) VALUES (?, ?, ?, ?, ?)',
+                [(body_id, address, params, PENDING, now) for address, params in rows])
+
+        self._transaction(insert)
+        return len(rows)
+
+    def claim(self, limit, lease=300.0):
+        """
+        Mark up to limit due messages (and any whose claim expired) as being
+        sent. Returns (id, body_id, recipient, params, attempts) rows.
+        """
+        now = self.clock()
+
+        def take():
+            rows = self.conn.execute(
+                'SELECT id, body_id, recipient, params, attempts FROM messages '
+                'WHERE (status = ? AND next_attempt <= ?) OR (status = ? AND claimed_at <= ?) '
+                'ORDER BY next_attempt LIMIT ?',
+                (PENDING, now, SENDING, now - lease, limit)).fetchall()
+            self.conn.executemany('UPDATE messages SET status = ?, claimed_at = ? WHERE id = ?',
+                                  [(SENDING, now, row[0]) for row in rows])
+            return rows
+
+        return self._transaction(take)
+
+    def body(self, body_id):
+        """
+        (sender, subject, body, attachment_name, attachment) of a stored body.
+        """
+        return self.conn.execute('SELECT sender, subject, body, attachment_name, attachment FROM bodies WHERE id = ?',
+                                 (body_id,)).fetchone()
+
+    def record(self, sent=(), retry=(), failed=(), released=()):
+        """
+        Record send outcomes in one transaction: sent ids, (id, error, delay)
+        retries, (id, error) permanent failures and claimed ids released
+        unsent.
+        """
+        now = self.clock()
+
+        def update():
+            self.conn.executemany('UPDATE messages SET status = ?, sent_at = ?, attempts = attempts + 1 WHERE id = ?',
+                                  [(SENT, now, message_id) for message_id in sent])
+            self.conn.executemany(
+                'UPDATE messages SET status = ?, next_attempt = ?, last_error = ?, attempts = attempts + 1 WHERE id = ?',
+                [(PENDING, now + delay, error, message_id) for message_id, error, delay in retry])
+            self.conn.executemany('UPDATE messages SET status = ?, last_error = ?, attempts = attempts + 1 WHERE id = ?',
+                                  [(FAILED, error, message_id) for message_id, error in failed])
+            self.conn.executemany('UPDATE messages SET status = ? WHERE id = ?',
+                                  [(PENDING, message_id) for message_id in released])
+
+        self._transaction(update)
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT status, count(*) FROM messages GROUP BY status').fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the sending threads: rate tokens per second, up
+    to burst at once. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def _attachment_part(name, content):
+    part = MIMEBase('application', 'octet-stream')
+    part.set_payload(content)
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f'attachment; filename={name}')
+    return part
+
+
+def render_message(sender, subject, body, params=None, attachment_part=None):
+    """
+    Render a stored body as message bytes without a To header, which the
+    sender prepends per recipient. Bodies without per-recipient params
+    render to the same bytes for everyone, so they are rendered once.
+    """
+    if params:
+        subject = Template(subject).safe_substitute(params)
+        body = Template(body).safe_substitute(params)
+    if attachment_part is not None:
+        msg = MIMEMultipart()
+        msg.attach(MIMEText(body, 'plain'))
+        msg.attach(attachment_part)
+    else:
+        msg = MIMEText(body, 'plain')
+    msg['From'] = sender
+    msg['Subject'] = subject
+    msg['Date'] = formatdate(localtime=True)
+    return msg.as_bytes()
+
+
+class Mailer:
+    """
+    Background delivery from an Outbox over a pool of persistent SMTP
+    connections.
+
+    A dispatcher thread claims due messages, renders them (shared bodies
+    once, personalised ones per recipient) and hands them to pool_size
+    sender threads, each keeping its own SMTP session open between
+    messages. Sends are spread by a shared rate limit. Transient failures
+    (disconnects, 4xx replies) are retried with exponential backoff up to
+    max_attempts; rejected recipients fail at once. Callers enqueue() and
+    return immediately; stop() waits up to drain_timeout for queued mail
+    and leaves the rest in the outbox for the next dispatcher. summary()
+    after stop() returns the counts taken when it stopped.
+    """
+
+    def __init__(self, sender, password, outbox_path=OUTBOX_PATH, host=SMTP_HOST, port=SMTP_PORT,
+                 starttls=SMTP_STARTTLS, pool_size=POOL_SIZE, rate=SEND_RATE, max_attempts=5, backoff=30.0,
+                 max_backoff=3600.0, poll_interval=5.0, idle_timeout=60.0, smtp_timeout=30.0,
+                 smtp_factory=smtplib.SMTP):
+        self.sender = sender
+        self.password = password
+        self.outbox_path = outbox_path
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.limiter = RateLimiter(rate)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.smtp_timeout = smtp_timeout
+        self.smtp_factory = smtp_factory
+        self._local = threading.local()
+        self._work = queue.Queue()
+        self._results = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._idle_passes = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._final = None
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0, 'connections': 0, 'send_seconds': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _outbox(self):
+        # SQLite connections are per thread
+        outbox = getattr(self._local, 'outbox', None)
+        if outbox is None:
+            outbox = self._local.outbox = Outbox(self.outbox_path)
+        return outbox
+
+    def enqueue(self, subject, body, recipients, attachment=None):
+        """
+        Queue a message (see Outbox.enqueue) and wake the dispatcher.
+        """
+        queued = self._outbox().enqueue(self.sender, subject, body, recipients, attachment)
+        self._wake.set()
+        return queued
+
+    def start(self):
+        self._final = None
+        self._threads = [threading.Thread(target=self._dispatch, name='mail-dispatch', daemon=True)]
+        self._threads += [threading.Thread(target=self._send_loop, name=f'mail-smtp-{i}', daemon=True)
+                          for i in range(self.pool_size)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def drain(self, timeout=None):
+        """
+        Wait until nothing is due or in flight. Messages waiting for a retry
+        later stay queued. Returns False on timeout.
+        """
+        with self._idle:
+            target = self._idle_passes + 1
+            self._wake.set()
+            return self._idle.wait_for(lambda: self._idle_passes > target or self._stop.is_set(), timeout)
+
+    def stop(self, drain_timeout=0.0):
+        if drain_timeout and self._threads:
+            if not self.drain(drain_timeout):
+                logger.warning(f"Mail still queued after {drain_timeout:.0f} s; it stays in {self.outbox_path} for the next run")
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._final = self.summary()
+        outbox = getattr(self._local, 'outbox', None)
+        if outbox is not None:
+            outbox.close()
+            self._local.outbox = None
+
+    def _connect(self):
+        smtp = self.smtp_factory(self.host, self.port, timeout=self.smtp_timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.password:
+                smtp.login(self.sender, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._count('connections')
+        return smtp
+
+    def _send_loop(self):
+        smtp = None
+        while True:
+            try:
+                item = self._work.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Do not hold idle sessions open on the server
+                if smtp is not None:
+                    _quit(smtp)
+                    smtp = None
+                continue
+            if item is None:
+                break
+            message_id, recipient, message, attempts = item
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                if smtp is None:
+                    smtp = self._connect()
+                headers = f"To: {recipient}\r\nMessage-ID: {make_msgid()}\r\n".encode('utf-8')
+                smtp.sendmail(self.sender, [recipient], headers + message)
+            except smtplib.SMTPRecipientsRefused as e:
+                self._results.put((message_id, 'failed', str(e.recipients), attempts))
+            except smtplib.SMTPResponseException as e:
+                permanent = 500 <= e.smtp_code < 600 and not isinstance(e, smtplib.SMTPAuthenticationError)
+                self._results.put((message_id, 'failed' if permanent else 'retry', f"{e.smtp_code} {e.smtp_error!r}", attempts))
+                if e.smtp_code == 421 or isinstance(e, (smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError)):
+                    # The server is closing the session (or never opened one)
+                    smtp = _drop(smtp)
+            except (smtplib.SMTPException, OSError) as e:
+                self._results.put((message_id, 'retry', repr(e), attempts))
+                smtp = _drop(smtp)
+            else:
+                self._results.put((message_id, 'sent', None, attempts))
+            self._count('send_seconds', time.perf_counter() - start)
+        if smtp is not None:
+            _quit(smtp)
+
+    def _collect(self, outbox, inflight, block):
+        sent, retry, failed = [], [], []
+        try:
+            item = self._results.get(timeout=0.05) if block else self._results.get_nowait()
+            while True:
+                message_id, outcome, error, attempts = item
+                inflight.pop(message_id, None)
+                if outcome == 'sent':
+                    sent.append(message_id)
+                elif outcome == 'retry' and attempts + 1 < self.max_attempts:
+                    retry.append((message_id, error, min(self.backoff * 2 ** attempts, self.max_backoff)))
+                    logger.info(f"Mail {message_id} will be retried: {error}")
+                else:
+                    failed.append((message_id, error))
+                    logger.error(f"Mail {message_id} failed after {attempts + 1} attempts: {error}")
+                item = self._results.get_nowait()
+        except queue.Empty:
+            pass
+        if sent or retry or failed:
+            outbox.record(sent, retry, failed)
+            self._count('sent', len(sent))
+            self._count('retried', len(retry))
+            self._count('failed', len(failed))
+
+    def _dispatch(self):
+        outbox = Outbox(self.outbox_path)
+        # Rendered bodies, kept while one of their messages is in flight
+        bodies = {}
+        inflight = {}
+        try:
+            while not self._stop.is_set():
+                self._collect(outbox, inflight, block=False)
+                room = self.pool_size * 4 - len(inflight)
+                claimed = outbox.claim(room) if room > 0 else []
+                for message_id, body_id, recipient, params, attempts in claimed:
+                    if body_id not in bodies:
+                        sender, subject, body, attachment_name, attachment = outbox.body(body_id)
+                        part = _attachment_part(attachment_name, attachment) if attachment_name else None
+                        bodies[body_id] = (sender, subject, body, part, render_message(sender, subject, body, None, part))
+                    sender, subject, body, part, shared = bodies[body_id]
+                    message = render_message(sender, subject, body, json.loads(params), part) if params else shared
+                    inflight[message_id] = body_id
+                    self._work.put((message_id, recipient, message, attempts))
+                for body_id in bodies.keys() - set(inflight.values()):
+                    del bodies[body_id]
+                if claimed or inflight:
+                    self._collect(outbox, inflight, block=True)
+                    continue
+                with self._idle:
+                    self._idle_passes += 1
+                    self._idle.notify_all()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+            # Let the senders finish what they hold, then give back the rest
+            released = []
+            while True:
+                try:
+                    item = self._work.get_nowait()
+                except queue.Empty:
+                    break
+                released.append(item[0])
+                inflight.pop(item[0], None)
+            for _ in range(self.pool_size):
+                self._work.put(None)
+            deadline = time.monotonic() + self.smtp_timeout
+            while inflight and time.monotonic() < deadline:
+                self._collect(outbox, inflight, block=True)
+            outbox.record(released=released)
+        finally:
+            with self._idle:
+                self._idle.notify_all()
+            outbox.close()
+
+    def summary(self):
+        if self._final is not None:
+            return dict(self._final)
+        with self._lock:
+            stats = dict(self.stats)
+        stats['outbox'] = self._outbox().counts()
+        return stats
+
+
+def _quit(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+def _drop(smtp):
+    if smtp is not None:
+        smtp.close()
+    return None
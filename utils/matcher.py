@@ -0,0 +1,108 @@
+import logging
+from collections import Counter
+
+import numpy as np
+
+from utils.ann_index import ExactIndex, build_index, l2_normalize, load_index
+from utils.embedding_store import INDEX_DIR
+from utils.templates import DEFAULT_MAX_EXEMPLARS, DEFAULT_MODE, TemplateStore
+
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity for a face to be accepted as a known student
+SIMILARITY_THRESHOLD = 0.4
+
+
+def stack_embeddings(embeddings):
+    """
+    Stack a list of embeddings into a 2D float32 array.
+    """
+    return np.stack([np.asarray(e, dtype=np.float32).ravel() for e in embeddings])
+
+
+class GalleryMatcher:
+    """
+    Cosine-similarity matcher over the gallery of known face embeddings.
+    The gallery is normalized once at load so every face in a frame is scored
+    in one batched search. Pass a prebuilt index (see utils.ann_index) to use
+    approximate search on large galleries; exact search is the default.
+    A name may appear on several rows (see utils.templates), in which case its
+    score is the best over its rows.
+    """
+
+    def __init__(self, known_encodings, known_names, threshold=SIMILARITY_THRESHOLD, index=None):
+        self.names = list(known_names)
+        self.identities = list(dict.fromkeys(self.names))
+        self.threshold = threshold
+        if index is None:
+            if len(known_encodings) != len(known_names):
+                raise ValueError("known_encodings and known_names must have the same length")
+            index = ExactIndex(stack_embeddings(known_encodings) if self.names else [])
+        elif len(index) != len(self.names):
+            raise ValueError(f"Index has {len(index)} entries but the gallery has {len(self.names)}")
+        self.index = index
+        self._max_rows_per_name = max(Counter(self.names).values(), default=1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _search(self, embeddings, k):
+        if len(embeddings) == 0:
+            return np.zeros((0, k), dtype=np.float32), np.zeros((0, k), dtype=np.int64)
+        return self.index.search(l2_normalize(stack_embeddings(embeddings)), k)
+
+    def top_k(self, embeddings, k=1):
+        """
+        Return, for each face, a list of up to k (name, score) pairs sorted by
+        descending similarity.
+        """
+        # Over-fetch so k distinct names survive when names span several rows
+        scores, ids = self._search(embeddings, k * self._max_rows_per_name)
+        results = []
+        for row_ids, row_scores in zip(ids, scores):
+            best = {}
+            for i, s in zip(row_ids, row_scores):
+                if i >= 0 and self.names[i] not in best:
+                    best[self.names[i]] = float(s)
+            results.append(list(best.items())[:k])
+        return results
+
+    def match(self, embeddings):
+        """
+        Return one (name, score) pair per face. name is None when the best
+        score does not exceed the similarity threshold.
+        """
+        scores, ids = self._search(embeddings, 1)
+        return [
+            (self.names[i] if i >= 0 and s > self.threshold else None, float(s) if i >= 0 else 0.0)
+            for i, s in zip(ids[:, 0], scores[:, 0])
+        ]
+
+
+def build_gallery(store, threshold=SIMILARITY_THRESHOLD):
+    """
+    Build a GalleryMatcher for an EmbeddingStore version from the search
+    index saved with it. The index arrays are memory-mapped read-only and
+    searched in place, so every process matching against the version shares
+    one copy of the templates in the page cache. A version without a usable
+    index (published before indexes were saved, or with other template
+    settings) gets templates and an index built in-process, in private memory.
+    """
+    params = {'mode': DEFAULT_MODE, 'max_exemplars': DEFAULT_MAX_EXEMPLARS}
+    loaded = load_index(store.file_path(INDEX_DIR), params) if len(store) else None
+    if loaded is not None:
+        index, names = loaded
+        source = 'memory-mapped'
+    else:
+        templates = TemplateStore(store.embeddings, store.names, **params)
+        index = build_index(templates.vectors) if len(templates) else ExactIndex([])
+        names = templates.names
+        source = 'built in-process'
+        if len(store):
+            logger.warning(f"No usable search index in {store.file_path(INDEX_DIR)}; building one in private memory")
+    matcher = GalleryMatcher(None, names, threshold=threshold, index=index)
+    identities = max(len(matcher.identities), 1)
+    logger.info(f"Gallery from version {store.version}: {len(matcher)} templates for {len(matcher.identities)} identities "
+                f"({len(matcher) / identities:.1f} per identity), {matcher.index.kind} index {source} "
+                f"({matcher.index.vectors.nbytes / 1024:.1f} KiB of templates)")
+    return matcher
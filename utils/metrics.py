@@ -0,0 +1,157 @@
+import bisect
+import threading
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {_format_labels(key) or 'total': value for key, value in self._values.items()}
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down.
+    """
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style, optionally split by
+    labels.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    out.append((f'{self.name}_bucket', key, cumulative, {'le': le}))
+                out.append((f'{self.name}_sum', key, series['sum']))
+                out.append((f'{self.name}_count', key, series['count']))
+        return out
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                _format_labels(key) or 'total': {
+                    'count': series['count'],
+                    'sum': series['sum'],
+                    'buckets': dict(zip([repr(b) for b in self.buckets] + ['+Inf'], series['counts'])),
+                }
+                for key, series in self._series.items()
+            }
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics that renders as Prometheus text or a JSON-friendly
+    snapshot. const_labels are added to every rendered sample (for example
+    the process that produced them), and header lines are rendered first as
+    comments.
+    """
+
+    def __init__(self, const_labels=None, header=()):
+        self.const_labels = dict(const_labels or {})
+        self.header = tuple(header)
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help_text, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help_text):
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self):
+        lines = [f'# {line}' for line in self.header]
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample in metric.samples():
+                name, key, value = sample[:3]
+                extra = dict(sample[3], **self.const_labels) if len(sample) > 3 else self.const_labels
+                lines.append(f'{name}{_format_labels(key, extra)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
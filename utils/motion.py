@@ -0,0 +1,115 @@
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap scene-change detector run before person detection. Frames are
+    downscaled to a small grayscale thumbnail, blurred and compared with the
+    previous thumbnail; the fraction of pixels that changed by more than
+    pixel_threshold is the motion score.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, area_threshold=0.005):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self._previous = None
+
+    def score(self, frame):
+        """
+        Return the fraction of the thumbnail that changed since the last call.
+        The first frame counts as full motion.
+        """
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self._previous = self._previous, small
+        if previous is None or previous.shape != small.shape:
+            return 1.0
+        return float(np.count_nonzero(cv2.absdiff(small, previous) > self.pixel_threshold)) / small.size
+
+    def moved(self, frame):
+        return self.score(frame) >= self.area_threshold
+
+
+class AdaptiveSampler:
+    """
+    Decides which frames get full YOLO + InsightFace inference.
+
+    Frames are processed at full rate while there is motion (and for hold
+    seconds after it) or while a track has no identity yet, so people
+    entering are picked up quickly. Once the scene is still and everyone in
+    view is resolved, only one frame every idle_interval seconds is processed.
+    idle_interval must stay below the tracker's max_age so tracks, and the
+    identities cached on them, survive between sampled frames.
+
+    Newcomer latency is measured from the first motion after a quiet spell
+    to each new identity being resolved, so it includes any delay the
+    sampler added. Only the last window latencies are kept.
+    """
+
+    def __init__(self, idle_interval=0.5, hold=2.0, give_up=10.0, window=1000, clock=time.monotonic):
+        self.idle_interval = idle_interval
+        self.hold = hold
+        self.give_up = give_up
+        self.clock = clock
+        self._last_processed = None
+        self._last_motion = None
+        self._motion_onset = None
+        self._cost = 0.0
+        self.newcomer_latencies = deque(maxlen=window)
+        self.stats = {'frames': 0, 'processed': 0, 'skipped': 0, 'motion_frames': 0, 'gate_seconds': 0.0, 'newcomers': 0}
+
+    def admit(self, gate, frame, tracker):
+        """
+        Run the motion gate on frame and return True if it should be processed.
+        """
+        start = time.perf_counter()
+        moved = gate.moved(frame)
+        self.stats['gate_seconds'] += time.perf_counter() - start
+        now = self.clock()
+        self.stats['frames'] += 1
+        if moved:
+            self.stats['motion_frames'] += 1
+            if self._last_motion is None or now - self._last_motion > self.hold:
+                self._motion_onset = now
+            self._last_motion = now
+
+        active = (self._last_motion is not None and now - self._last_motion <= self.hold) or tracker.unresolved(self.give_up) > 0
+        due = self._last_processed is None or now - self._last_processed >= self.idle_interval
+        if active or due:
+            self._last_processed = now
+            self.stats['processed'] += 1
+            return True
+        self.stats['skipped'] += 1
+        return False
+
+    def record_cost(self, seconds):
+        """
+        Record the inference time of a processed frame, used to estimate CPU saved.
+        """
+        self._cost = seconds if self._cost == 0 else 0.9 * self._cost + 0.1 * seconds
+
+    def record_newcomer(self):
+        """
+        Call when a new identity is resolved.
+        """
+        self.stats['newcomers'] += 1
+        if self._motion_onset is not None:
+            self.newcomer_latencies.append(self.clock() - self._motion_onset)
+
+    def summary(self):
+        latencies = np.asarray(self.newcomer_latencies) if self.newcomer_latencies else None
+        return dict(
+            self.stats,
+            skip_rate=self.stats['skipped'] / self.stats['frames'] if self.stats['frames'] else 0.0,
+            est_seconds_saved=max(self.stats['skipped'] * self._cost - self.stats['gate_seconds'], 0.0),
+            newcomer_p50_s=float(np.percentile(latencies, 50)) if latencies is not None else 0.0,
+            newcomer_max_s=float(latencies.max()) if latencies is not None else 0.0,
+        )
@@ -0,0 +1,216 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class DropQueue:
+    """
+    Bounded queue that applies a drop policy when full: 'drop_oldest' makes the
+    newest item win (what a live camera wants), 'drop_newest' discards the
+    incoming item and 'block' waits for room.
+    """
+
+    def __init__(self, maxsize=1, policy='drop_oldest'):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{policy}'. Expected one of {DROP_POLICIES}")
+        self.policy = policy
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def put(self, item, stop_event=None):
+        """
+        Enqueue item according to the drop policy. Returns False if an item
+        was dropped to make room or item itself was discarded.
+        """
+        if self.policy == 'block':
+            while stop_event is None or not stop_event.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        with self._lock:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                if self.policy == 'drop_newest':
+                    return False
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(item)
+            return False
+
+    def get(self, timeout=None):
+        """
+        Dequeue an item, or return None if nothing arrived within timeout.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class LatencyStats:
+    """
+    Rolling window of latency samples in seconds.
+    """
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = np.array(self.samples)
+            count = self.count
+        if not len(samples):
+            return {'count': count, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': count,
+            'mean_ms': float(samples.mean() * 1000),
+            'p50_ms': float(np.percentile(samples, 50) * 1000),
+            'p95_ms': float(np.percentile(samples, 95) * 1000),
+            'max_ms': float(samples.max() * 1000),
+        }
+
+
+class FramePacket:
+    """
+    A captured frame and everything the stages attach to it on its way through
+    the pipeline.
+    """
+
+    __slots__ = ('frame_id', 'captured_at', 'frame', 'detections')
+
+    def __init__(self, frame_id, frame):
+        self.frame_id = frame_id
+        self.captured_at = time.monotonic()
+        self.frame = frame
+        self.detections = []
+
+
+class Pipeline:
+    """
+    Staged frame pipeline: a capture thread feeds a chain of worker stages,
+    each on its own thread and connected by DropQueues. The last queue is
+    drained by the caller (typically the main thread, which owns the GUI).
+
+    stages is a list of (name, fn) where fn takes and returns a FramePacket
+    (returning None drops the frame). queues maps 'capture' and each stage
+    name to a (depth, drop_policy) tuple for the queue that stage writes to.
+    """
+
+    def __init__(self, read_frame, stages, queues=None):
+        queues = queues or {}
+        self.read_frame = read_frame
+        self.stage_names = ['capture'] + [name for name, _ in stages]
+        self.queues = {name: DropQueue(*queues.get(name, (1, 'drop_oldest'))) for name in self.stage_names}
+        self.stats = {name: LatencyStats() for name in self.stage_names}
+        self.end_to_end = LatencyStats()
+        self._stages = stages
+        self._stop = threading.Event()
+        self._threads = []
+        self._frame_ids = itertools.count()
+        self.frames_out = 0
+        self.started_at = None
+
+    def record(self, name, seconds):
+        """
+        Record a latency sample for a stage run outside the pipeline threads.
+        """
+        self.stats.setdefault(name, LatencyStats()).record(seconds)
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            ret, frame = self.read_frame()
+            if not ret:
+                logger.warning("Failed to capture frame")
+                time.sleep(0.01)
+                continue
+            self.stats['capture'].record(time.monotonic() - start)
+            self.queues['capture'].put(FramePacket(next(self._frame_ids), frame), self._stop)
+
+    def _stage_loop(self, name, fn, inbox, outbox):
+        while not self._stop.is_set():
+            packet = inbox.get(timeout=0.1)
+            if packet is None:
+                continue
+            start = time.monotonic()
+            try:
+                packet = fn(packet)
+            except Exception as e:
+                logger.error(f"Pipeline stage '{name}' failed: {e}")
+                continue
+            self.stats[name].record(time.monotonic() - start)
+            if packet is not None:
+                outbox.put(packet, self._stop)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._threads.append(threading.Thread(target=self._capture_loop, name='capture', daemon=True))
+        previous = 'capture'
+        for name, fn in self._stages:
+            thread = threading.Thread(
+                target=self._stage_loop,
+                args=(name, fn, self.queues[previous], self.queues[name]),
+                name=name,
+                daemon=True,
+            )
+            self._threads.append(thread)
+            previous = name
+        for thread in self._threads:
+            thread.start()
+
+    def get(self, timeout=0.1):
+        """
+        Return the next fully processed FramePacket, or None on timeout.
+        """
+        packet = self.queues[self.stage_names[-1]].get(timeout=timeout)
+        if packet is not None:
+            self.frames_out += 1
+            self.end_to_end.record(time.monotonic() - packet.captured_at)
+        return packet
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def report(self):
+        """
+        Per-stage latency, dropped frames per queue and end-to-end throughput.
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            'stages': {name: stats.summary() for name, stats in self.stats.items()},
+            'dropped': {name: q.dropped for name, q in self.queues.items()},
+            'end_to_end': self.end_to_end.summary(),
+            'frames_out': self.frames_out,
+            'fps': self.frames_out / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,210 @@
+import numpy as np
+
+# Per-person-box embedding extractors. Both take a frame, its (n, 4) person
+# boxes and the indices of the boxes that need an identity, and return one
+# embedding (or None when no face was found) per requested index. Their
+# landmarks() method returns the five face keypoints per requested index
+# instead, in frame coordinates with NaN rows where no face was found, for
+# the liveliness check's landmark jitter signal; it only runs the detector.
+MODE_CROP = 'crop'
+MODE_FULL_FRAME = 'full_frame'
+
+
+class CropRecognizer:
+    """
+    Runs the full InsightFace pipeline on each person crop: one detector and
+    one recognizer pass per person.
+    """
+
+    mode = MODE_CROP
+
+    def __init__(self, app):
+        self.app = app
+
+    def embed(self, frame, boxes, indices):
+        embeddings = []
+        for i in indices:
+            x1, y1, x2, y2 = (int(v) for v in boxes[i])
+            faces = self.app.get(frame[y1:y2, x1:x2])
+            embeddings.append(faces[0].embedding if faces else None)
+        return embeddings
+
+    def landmarks(self, frame, boxes, indices):
+        points = np.full((len(indices), 5, 2), np.nan, dtype=np.float32)
+        for row, i in enumerate(indices):
+            x1, y1, x2, y2 = (int(v) for v in boxes[i])
+            crop = frame[y1:y2, x1:x2]
+            if not crop.size:
+                continue
+            _, kps = self.app.det_model.detect(crop, max_num=1)
+            if kps is not None and len(kps):
+                points[row] = kps[0] + np.array([x1, y1], dtype=np.float32)
+        return points
+
+
+def nms(boxes, scores, iou_threshold=0.4):
+    """
+    Indices of the boxes kept by greedy non-maximum suppression.
+    """
+    order = np.argsort(-scores)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def tile_windows(height, width, tiles, overlap):
+    """
+    (x1, y1, x2, y2) windows splitting a frame into a rows x cols grid, each
+    tile grown by overlap of its size so faces on a seam appear whole in one.
+    """
+    rows, cols = tiles
+    tile_h, tile_w = height / rows, width / cols
+    pad_h, pad_w = tile_h * overlap, tile_w * overlap
+    windows = []
+    for r in range(rows):
+        for c in range(cols):
+            windows.append((
+                int(max(c * tile_w - pad_w, 0)), int(max(r * tile_h - pad_h, 0)),
+                int(min((c + 1) * tile_w + pad_w, width)), int(min((r + 1) * tile_h + pad_h, height)),
+            ))
+    return windows
+
+
+def assign_faces(face_boxes, person_boxes, min_containment=0.7):
+    """
+    Assign each person box at most one face. A face qualifies for a person
+    when at least min_containment of its area lies inside the box and its
+    center is in the upper half of it; among qualifying pairs, the face
+    closest to the top center of the person box wins. Returns an int array
+    with one face index (or -1) per person box.
+    """
+    faces = np.asarray(face_boxes, dtype=np.float32).reshape(-1, 4)
+    people = np.asarray(person_boxes, dtype=np.float32).reshape(-1, 4)
+    assignment = np.full(len(people), -1, dtype=np.int64)
+    if not len(faces) or not len(people):
+        return assignment
+
+    ix1 = np.maximum(faces[:, None, 0], people[None, :, 0])
+    iy1 = np.maximum(faces[:, None, 1], people[None, :, 1])
+    ix2 = np.minimum(faces[:, None, 2], people[None, :, 2])
+    iy2 = np.minimum(faces[:, None, 3], people[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    face_area = np.maximum((faces[:, 2] - faces[:, 0]) * (faces[:, 3] - faces[:, 1]), 1e-6)
+    containment = inter / face_area[:, None]
+
+    face_cx = (faces[:, 0] + faces[:, 2]) / 2
+    face_cy = (faces[:, 1] + faces[:, 3]) / 2
+    person_cx = (people[:, 0] + people[:, 2]) / 2
+    person_h = np.maximum(people[:, 3] - people[:, 1], 1.0)
+    upper = face_cy[:, None] <= (people[None, :, 1] + person_h[None, :] / 2)
+    # Distance from the person's head position, relative to box height
+    distance = np.hypot(face_cx[:, None] - person_cx[None, :], face_cy[:, None] - people[None, :, 1]) / person_h[None, :]
+
+    valid = (containment >= min_containment) & upper
+    cost = np.where(valid, distance, np.inf)
+    used_faces = set()
+    for f, p in zip(*np.unravel_index(np.argsort(cost, axis=None), cost.shape)):
+        if not np.isfinite(cost[f, p]):
+            break
+        if assignment[p] != -1 or f in used_faces:
+            continue
+        assignment[p] = f
+        used_faces.add(f)
+    return assignment
+
+
+class FullFrameRecognizer:
+    """
+    Runs InsightFace's face detector once per frame (optionally over a grid
+    of overlapping tiles for high-resolution cameras), assigns faces to
+    person boxes geometrically and embeds every needed face with a single
+    batched ArcFace call. Unlike app.get() it skips the landmark and
+    gender/age models, which attendance does not use.
+    """
+
+    mode = MODE_FULL_FRAME
+
+    def __init__(self, app, tiles=(1, 1), overlap=0.1, nms_threshold=0.4):
+        from insightface.utils import face_align
+
+        self.app = app
+        self.detector = app.det_model
+        self.recognizer = app.models['recognition']
+        self.tiles = tuple(tiles)
+        self.overlap = overlap
+        self.nms_threshold = nms_threshold
+        self._norm_crop = face_align.norm_crop
+        self._last = (None, None)
+
+    def detect(self, frame):
+        """
+        Return (n, 5) face boxes with scores and (n, 5, 2) landmarks in frame
+        coordinates. The result for the most recent frame is kept, so
+        embed() and landmarks() on the same frame detect once.
+        """
+        if self._last[0] is frame:
+            return self._last[1]
+        result = self._detect(frame)
+        self._last = (frame, result)
+        return result
+
+    def _detect(self, frame):
+        if self.tiles == (1, 1):
+            return self.detector.detect(frame, max_num=0)
+        all_boxes, all_kps = [], []
+        for x1, y1, x2, y2 in tile_windows(frame.shape[0], frame.shape[1], self.tiles, self.overlap):
+            boxes, kps = self.detector.detect(frame[y1:y2, x1:x2], max_num=0)
+            if len(boxes):
+                all_boxes.append(boxes + np.array([x1, y1, x1, y1, 0], dtype=boxes.dtype))
+                all_kps.append(kps + np.array([x1, y1], dtype=kps.dtype))
+        if not all_boxes:
+            return np.zeros((0, 5), dtype=np.float32), np.zeros((0, 5, 2), dtype=np.float32)
+        boxes, kps = np.concatenate(all_boxes), np.concatenate(all_kps)
+        keep = nms(boxes[:, :4], boxes[:, 4], self.nms_threshold)
+        return boxes[keep], kps[keep]
+
+    def embed(self, frame, boxes, indices):
+        if not len(indices):
+            return []
+        face_boxes, kps = self.detect(frame)
+        if kps is None or not len(face_boxes):
+            return [None] * len(indices)
+        assignment = assign_faces(face_boxes[:, :4], np.asarray(boxes).reshape(-1, 4)[list(indices)])
+        wanted = [f for f in assignment if f >= 0]
+        if not wanted:
+            return [None] * len(indices)
+        size = self.recognizer.input_size[0]
+        aligned = [self._norm_crop(frame, landmark=kps[f], image_size=size) for f in wanted]
+        features = iter(self.recognizer.get_feat(aligned))
+        return [next(features) if f >= 0 else None for f in assignment]
+
+    def landmarks(self, frame, boxes, indices):
+        points = np.full((len(indices), 5, 2), np.nan, dtype=np.float32)
+        if not len(indices):
+            return points
+        face_boxes, kps = self.detect(frame)
+        if kps is None or not len(face_boxes):
+            return points
+        assignment = assign_faces(face_boxes[:, :4], np.asarray(boxes).reshape(-1, 4)[list(indices)])
+        found = assignment >= 0
+        points[found] = kps[assignment[found]]
+        return points
+
+
+def make_recognizer(app, mode=MODE_CROP, tiles=(1, 1)):
+    if mode == MODE_CROP:
+        return CropRecognizer(app)
+    if mode == MODE_FULL_FRAME:
+        return FullFrameRecognizer(app, tiles=tiles)
+    raise ValueError(f"Unknown recognition mode '{mode}'")
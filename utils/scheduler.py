@@ -0,0 +1,262 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = 'data/scheduler.db'
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))}
+DAY_NAMES = {name: i for i, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+# Give up looking for a next run this far ahead (a spec like Feb 30 never matches)
+SEARCH_YEARS = 5
+
+
+def _parse_field(field, low, high, names=None):
+    values = set()
+    for part in field.lower().split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in '{field}'")
+        if part == '*':
+            start, end = low, high
+        else:
+            first, _, last = part.partition('-')
+            start = names[first] if names and first in names else int(first)
+            end = (names[last] if names and last in names else int(last)) if last else (high if step > 1 else start)
+        if not low <= start <= end <= high:
+            raise ValueError(f"'{field}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSpec:
+    """
+    Cron-style schedule: 'minute hour day-of-month month day-of-week', or
+    with a leading seconds field when six fields are given. Fields take *,
+    lists, ranges, steps and month/day names; Sunday is 0 (or 7). As in
+    cron, when both day fields are restricted either one matching is
+    enough. Times are naive local datetimes, like the rest of the system.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        fields = ALIASES.get(self.spec.lower(), self.spec).split()
+        if len(fields) == 5:
+            fields = ['0'] + fields
+        if len(fields) != 6:
+            raise ValueError(f"Schedule '{spec}' needs 5 or 6 fields")
+        self.seconds = _parse_field(fields[0], 0, 59)
+        self.minutes = _parse_field(fields[1], 0, 59)
+        self.hours = _parse_field(fields[2], 0, 23)
+        self.days = _parse_field(fields[3], 1, 31)
+        self.months = _parse_field(fields[4], 1, 12, MONTH_NAMES)
+        weekdays = _parse_field(fields[5], 0, 7, DAY_NAMES)
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day = fields[3] == '*'
+        self._any_weekday = fields[5] == '*'
+
+    @classmethod
+    def daily_at(cls, time_of_day):
+        """
+        Every day at an 'HH:MM' or 'HH:MM:SS' time.
+        """
+        parts = [int(p) for p in time_of_day.strip().split(':')]
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid time '{time_of_day}', expected HH:MM:SS")
+        hour, minute, second = (parts + [0])[:3]
+        return cls(f"{second} {minute} {hour} * * *")
+
+    def _day_matches(self, dt):
+        # datetime.weekday() is Monday=0; cron counts from Sunday
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def matches(self, dt):
+        return (dt.month in self.months and self._day_matches(dt) and dt.hour in self.hours
+                and dt.minute in self.minutes and dt.second in self.seconds)
+
+    def next_at_or_after(self, dt):
+        """
+        The first matching whole second at or after dt.
+        """
+        if dt.microsecond:
+            dt = dt.replace(microsecond=0) + timedelta(seconds=1)
+        limit = dt + timedelta(days=366 * SEARCH_YEARS)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0, second=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0, second=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt = dt.replace(second=0) + timedelta(minutes=1)
+            elif dt.second not in self.seconds:
+                later = [s for s in self.seconds if s > dt.second]
+                dt = dt.replace(second=later[0]) if later else dt.replace(second=0) + timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Schedule '{self.spec}' has no run in the next {SEARCH_YEARS} years")
+
+    def __repr__(self):
+        return f"CronSpec({self.spec!r})"
+
+
+def class_schedule(class_timing, schedule=None):
+    """
+    Schedule of a class from teachers.csv: its cron 'Schedule' column when
+    set, otherwise every day at its 'Class Timing'.
+    """
+    return CronSpec(schedule) if schedule and schedule.strip() else CronSpec.daily_at(class_timing)
+
+
+class Job:
+    def __init__(self, name, spec, fn=None, grace=timedelta(0)):
+        self.name = name
+        self.spec = spec if isinstance(spec, CronSpec) else CronSpec(spec)
+        self.fn = fn
+        self.grace = grace
+
+
+class Scheduler:
+    """
+    Runs jobs at the times given by their CronSpec, sleeping until the next
+    one is due rather than polling.
+
+    Every run is recorded by (job, due time) in a small SQLite database, so
+    runs are idempotent across restarts and processes: a due time that was
+    claimed is never run again, and after downtime a missed run is made up
+    once if it is less than the job's grace period late. Failed runs are
+    recorded, not retried.
+    """
+
+    def __init__(self, state_path=STATE_PATH, clock=datetime.now, max_sleep=3600.0):
+        self.state_path = state_path
+        self.clock = clock
+        # Sleeps are capped so wall-clock changes are noticed
+        self.max_sleep = max_sleep
+        self.jobs = {}
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(state_path, timeout=5.0, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                job TEXT NOT NULL,
+                due TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                error TEXT,
+                PRIMARY KEY (job, due)
+            )
+        """)
+
+    def add(self, name, spec, fn=None, grace=timedelta(0)):
+        """
+        Register a job. Jobs without fn are only tracked: callers wait for
+        next_due() and claim() and finish() runs themselves.
+        """
+        job = self.jobs[name] = Job(name, spec, fn, grace)
+        return job
+
+    def last_due(self, name):
+        row = self.conn.execute('SELECT max(due) FROM runs WHERE job = ?', (name,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row[0] else None
+
+    def next_due(self, name, now=None):
+        """
+        The next due time of a job that has not been run, which may be up to
+        its grace period in the past.
+        """
+        job = self.jobs[name]
+        start = (now or self.clock()) - job.grace
+        last = self.last_due(name)
+        if last is not None and last + timedelta(seconds=1) > start:
+            start = last + timedelta(seconds=1)
+        return job.spec.next_at_or_after(start)
+
+    def claim(self, name, due):
+        """
+        Record that the run due at due is starting. Returns False if it was
+        already claimed, here or by another process.
+        """
+        cursor = self.conn.execute('INSERT OR IGNORE INTO runs (job, due, status, started_at) VALUES (?, ?, ?, ?)',
+                                   (name, due.isoformat(), 'running', self.clock().isoformat(timespec='seconds')))
+        return cursor.rowcount == 1
+
+    def finish(self, name, due, status='done', error=None):
+        self.conn.execute(
+            'INSERT INTO runs (job, due, status, finished_at, error) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (job, due) DO UPDATE SET status = excluded.status, finished_at = excluded.finished_at, error = excluded.error',
+            (name, due.isoformat(), status, self.clock().isoformat(timespec='seconds'), error))
+
+    def wait_until(self, when):
+        """
+        Sleep until when (a local datetime). Returns False if stop() was
+        called first.
+        """
+        while not self._stop.is_set():
+            remaining = (when - self.clock()).total_seconds()
+            if remaining <= 0:
+                return True
+            self._stop.wait(min(remaining, self.max_sleep))
+        return False
+
+    def run_job(self, name, due):
+        job = self.jobs[name]
+        if not self.claim(name, due):
+            logger.info(f"Skipping {name} due {due}: already run")
+            return
+        logger.info(f"Running {name} (due {due})")
+        try:
+            job.fn()
+        except Exception as e:
+            logger.exception(f"{name} due {due} failed")
+            self.finish(name, due, 'failed', repr(e))
+        else:
+            self.finish(name, due)
+
+    def run_forever(self):
+        """
+        Run jobs with a function until stop() is called.
+        """
+        while not self._stop.is_set():
+            pending = [(self.next_due(name), name) for name, job in self.jobs.items() if job.fn is not None]
+            if not pending:
+                return
+            due, name = min(pending)
+            logger.info(f"Next run: {name} at {due}")
+            # Capped sleeps return early; recompute the next run afterwards
+            remaining = (due - self.clock()).total_seconds()
+            if remaining > self.max_sleep:
+                self._stop.wait(self.max_sleep)
+                continue
+            if self.wait_until(due):
+                self.run_job(name, due)
+
+    def stop(self):
+        self._stop.set()
+
+    def history(self, name, limit=10):
+        return self.conn.execute('SELECT due, status, started_at, finished_at, error FROM runs WHERE job = ? '
+                                 'ORDER BY due DESC LIMIT ?', (name, limit)).fetchall()
+
+    def close(self):
+        self.conn.close()
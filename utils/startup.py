@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FACE_MODEL = 'buffalo_l'
+# Dummy inferences per model before the first real frame. The first call
+# builds the graph and allocates buffers; the second is already at steady state.
+WARMUP_RUNS = int(os.environ.get('WARMUP_RUNS', '2'))
+WARMUP_FRAME_SHAPE = (480, 640, 3)
+PHASES = ('import', 'load', 'warmup')
+
+# ArcFace's five reference landmarks in a 112 x 112 crop
+ARCFACE_LANDMARKS = np.array([[38.2946, 51.6963], [73.5318, 51.5014], [56.0252, 71.7366],
+                              [41.5493, 92.3655], [70.7299, 92.2041]], dtype=np.float32)
+
+
+def warm_up_yolo(batch_sizes=(1,), frame_shape=WARMUP_FRAME_SHAPE, runs=WARMUP_RUNS):
+    from utils.yolo_utils import detect_people_batch
+
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    for _ in range(runs):
+        for batch_size in batch_sizes:
+            detect_people_batch([frame] * batch_size)
+
+
+def warm_up_face_analysis(app, frame_shape=WARMUP_FRAME_SHAPE, runs=WARMUP_RUNS):
+    """
+    Run every model of a prepared FaceAnalysis on a blank frame. A blank
+    frame has no faces, so the models after the detector get a synthetic
+    face in the middle of it.
+    """
+    from insightface.app.common import Face
+
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    height, width = frame_shape[:2]
+    size = min(height, width) // 2
+    x1, y1 = (width - size) // 2, (height - size) // 2
+    bbox = np.array([x1, y1, x1 + size, y1 + size], dtype=np.float32)
+    kps = ARCFACE_LANDMARKS * (size / 112.0) + np.array([x1, y1], dtype=np.float32)
+    for _ in range(runs):
+        app.det_model.detect(frame, max_num=0, metric='default')
+        face = Face(bbox=bbox, kps=kps, det_score=1.0)
+        for taskname, model in app.models.items():
+            if taskname != 'detection':
+                model.get(frame, face)
+
+
+def _import_face_analysis():
+    from insightface.app import FaceAnalysis
+
+    return FaceAnalysis
+
+
+class ModelLoader:
+    """
+    Imports, loads and warms up YOLO and InsightFace on two background
+    threads, so a script can validate its configuration (and sleep until
+    class) while the models get ready instead of before. ultralytics and
+    insightface are only imported here, on those threads.
+
+    Threads are daemons: a script that exits on a configuration error does
+    not wait for the models.
+    """
+
+    def __init__(self, ctx_id=0, face_model=FACE_MODEL, yolo_batch_sizes=(1,), frame_shape=WARMUP_FRAME_SHAPE,
+                 warmup_runs=WARMUP_RUNS):
+        self.ctx_id = ctx_id
+        self.face_model = face_model
+        self.yolo_batch_sizes = yolo_batch_sizes
+        self.frame_shape = frame_shape
+        self.warmup_runs = warmup_runs
+        self.timings = {'yolo': {}, 'face': {}}
+        self.app = None
+        self._errors = {}
+        self._threads = []
+        self._started = None
+        self._finished = {}
+        self._waited = 0.0
+
+    def _timed(self, model, phase, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.timings[model][phase] = time.perf_counter() - start
+        return result
+
+    def _load_yolo(self):
+        from utils import yolo_utils
+
+        self._timed('yolo', 'import', yolo_utils.import_yolo)
+        self._timed('yolo', 'load', yolo_utils.get_model)
+        self._timed('yolo', 'warmup', lambda: warm_up_yolo(self.yolo_batch_sizes, self.frame_shape, self.warmup_runs))
+
+    def _load_face(self):
+        def load():
+            app = face_analysis(name=self.face_model)
+            app.prepare(ctx_id=self.ctx_id)
+            return app
+
+        face_analysis = self._timed('face', 'import', _import_face_analysis)
+        app = self._timed('face', 'load', load)
+        self._timed('face', 'warmup', lambda: warm_up_face_analysis(app, self.frame_shape, self.warmup_runs))
+        self.app = app
+
+    def _run(self, name, fn):
+        try:
+            fn()
+        except BaseException as e:
+            self._errors[name] = e
+        self._finished[name] = time.perf_counter()
+
+    def start(self):
+        self._started = time.perf_counter()
+        for name, fn in (('yolo', self._load_yolo), ('face', self._load_face)):
+            thread = threading.Thread(target=self._run, args=(name, fn), name=f"load-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wait(self):
+        """
+        Block until both models are loaded and warmed up, then return the
+        FaceAnalysis app. Re-raises the first loading error.
+        """
+        start = time.perf_counter()
+        for thread in self._threads:
+            thread.join()
+        self._waited = time.perf_counter() - start
+        for name in ('yolo', 'face'):
+            if name in self._errors:
+                raise RuntimeError(f"Loading the {name} model failed: {self._errors[name]!r}") from self._errors[name]
+        return self.app
+
+    def report(self):
+        """
+        Seconds per model and phase, plus when both were ready after start()
+        and how long wait() actually blocked the caller.
+        """
+        return {'models': {model: {phase: phases.get(phase, 0.0) for phase in PHASES} for model, phases in self.timings.items()},
+                'ready_seconds': max(self._finished.values()) - self._started if self._finished else 0.0,
+                'blocked_seconds': self._waited}
+
+    def log_report(self):
+        report = self.report()
+        for model, phases in report['models'].items():
+            logger.info(f"Startup {model}: import {phases['import']:.2f} s, load {phases['load']:.2f} s, "
+                        f"warm-up {phases['warmup']:.2f} s")
+        logger.info(f"Models ready {report['ready_seconds']:.2f} s after start, "
+                    f"startup blocked for {report['blocked_seconds']:.2f} s")
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+
+
+class BoundedStore:
+    """
+    Per-identity state with a size cap and expiry, for deployments that run
+    for days. Entries expire ttl seconds after they were last touched and,
+    when the store is full, the least recently used entry is evicted.
+    Times come from a monotonic clock so wall-clock changes cannot expire
+    or resurrect entries. on_evict(key, value) is called for every entry
+    that leaves the store other than through pop().
+
+    Not thread-safe on its own; owners that share it across threads hold
+    their own lock.
+    """
+
+    def __init__(self, capacity=1024, ttl=None, clock=time.monotonic, on_evict=None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = on_evict
+        # key -> (value, last_touched), least recently touched first
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'inserts': 0, 'expired': 0, 'evicted': 0, 'peak_size': 0}
+
+    def _drop(self, key, reason):
+        value, _ = self._entries.pop(key)
+        self.stats[reason] += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def expire(self, now=None):
+        """
+        Drop every entry not touched for ttl seconds. Returns how many expired.
+        """
+        if self.ttl is None:
+            return 0
+        now = self.clock() if now is None else now
+        expired = 0
+        while self._entries:
+            key, (_, touched) = next(iter(self._entries.items()))
+            if now - touched <= self.ttl:
+                break
+            self._drop(key, 'expired')
+            expired += 1
+        return expired
+
+    def get(self, key, default=None):
+        """
+        Return the value for key and mark it as recently used.
+        """
+        now = self.clock()
+        self.expire(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        self._entries[key] = (entry[0], now)
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        now = self.clock()
+        self.expire(now)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            while len(self._entries) >= self.capacity:
+                self._drop(next(iter(self._entries)), 'evicted')
+            self.stats['inserts'] += 1
+        self._entries[key] = (value, now)
+        self.stats['peak_size'] = max(self.stats['peak_size'], len(self._entries))
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        for key in list(self._entries):
+            self._drop(key, 'evicted')
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def summary(self):
+        return dict(self.stats, size=len(self._entries), capacity=self.capacity, ttl=self.ttl)
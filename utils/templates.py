@@ -0,0 +1,84 @@
+import numpy as np
+
+from utils.ann_index import l2_normalize
+
+TEMPLATE_MODES = ('centroid', 'max')
+# Templates matched in production; saved search indexes record these
+DEFAULT_MODE = 'centroid'
+DEFAULT_MAX_EXEMPLARS = 4
+
+
+def select_exemplars(vectors, count):
+    """
+    Pick up to count diverse rows from normalized vectors by farthest-point
+    sampling, starting from the row closest to the mean.
+    """
+    if count is None or len(vectors) <= count:
+        return np.arange(len(vectors))
+    centroid = l2_normalize(vectors.mean(axis=0))[0]
+    selected = [int(np.argmax(vectors @ centroid))]
+    closest = vectors @ vectors[selected[0]]
+    while len(selected) < count:
+        candidate = int(np.argmin(closest))
+        selected.append(candidate)
+        closest = np.maximum(closest, vectors @ vectors[candidate])
+    return np.array(selected)
+
+
+class TemplateStore:
+    """
+    Compact per-identity face templates built from every enrollment image.
+
+    mode='centroid' keeps the normalized mean embedding plus up to
+    max_exemplars diverse exemplars; mode='max' keeps up to max_exemplars
+    exemplars only. Either way the templates are flattened into one matrix, so
+    the best score per identity is the max over its templates and a frame is
+    still scored with a single matrix multiply.
+    """
+
+    def __init__(self, known_encodings, known_names, mode=DEFAULT_MODE, max_exemplars=DEFAULT_MAX_EXEMPLARS):
+        if mode not in TEMPLATE_MODES:
+            raise ValueError(f"Unknown template mode '{mode}'. Expected one of {TEMPLATE_MODES}")
+        self.mode = mode
+        self.max_exemplars = max_exemplars
+
+        groups = {}
+        for name, encoding in zip(known_names, known_encodings):
+            groups.setdefault(name, []).append(np.asarray(encoding, dtype=np.float32).ravel())
+
+        self.identities = list(groups)
+        rows = []
+        self.names = []
+        for name, encodings in groups.items():
+            vectors = l2_normalize(np.stack(encodings))
+            templates = vectors[select_exemplars(vectors, max_exemplars)]
+            if mode == 'centroid':
+                templates = np.concatenate([l2_normalize(vectors.mean(axis=0)), templates])
+            rows.append(templates)
+            self.names.extend([name] * len(templates))
+
+        if rows:
+            self.vectors = np.ascontiguousarray(np.concatenate(rows), dtype=np.float32)
+        else:
+            self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def params(self):
+        return {'mode': self.mode, 'max_exemplars': self.max_exemplars}
+
+    def memory_report(self):
+        """
+        Summarize template count and memory use per identity.
+        """
+        identities = max(len(self.identities), 1)
+        return {
+            'mode': self.mode,
+            'identities': len(self.identities),
+            'templates': len(self.vectors),
+            'templates_per_identity': len(self.vectors) / identities,
+            'bytes_per_identity': self.vectors.nbytes / identities,
+            'total_bytes': self.vectors.nbytes,
+        }
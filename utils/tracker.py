@@ -0,0 +1,244 @@
+import itertools
+import threading
+import time
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    Pairwise IoU between two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """
+    Pairwise distance between box centers, relative to the diagonal of the
+    boxes in boxes_a.
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    centers_a = (a[:, :2] + a[:, 2:]) / 2
+    centers_b = (b[:, :2] + b[:, 2:]) / 2
+    diagonal = np.maximum(np.hypot(a[:, 2] - a[:, 0], a[:, 3] - a[:, 1]), 1.0)
+    return np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2) / diagonal[:, None]
+
+
+class Track:
+    """
+    A person followed across frames, with the cached results of the expensive
+    recognition models. generation changes whenever the cache is cleared, so
+    a result computed for an earlier identity can be told apart.
+    """
+
+    __slots__ = ('track_id', 'box', 'first_seen', 'last_seen', 'name', 'deepfake', 'live', 'resolved_at', 'generation')
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        """
+        Forget cached identity, deepfake verdict and liveliness result.
+        """
+        self.generation += 1
+        self.name = None
+        self.deepfake = None
+        self.live = False
+        self.resolved_at = None
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker with a centroid-distance fallback. Each person box gets
+    a stable track ID, and recognition results cached on the track stay valid
+    for ttl seconds after the identity was resolved.
+
+    Safe to share between pipeline stages: update() and resolve() run on the
+    inference thread while verification caches verdicts from another, so
+    every read and write of track state holds one lock. Verdicts are
+    cached with the generation the verifier saw and dropped if the track
+    was cleared in the meantime.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_age=1.0, ttl=30.0, clock=time.monotonic):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_age = max_age
+        self.ttl = ttl
+        self.clock = clock
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            'insightface_calls': 0,
+            'insightface_saved': 0,
+            'detector_calls': 0,
+            'deepfake_calls': 0,
+            'deepfake_saved': 0,
+            'liveliness_calls': 0,
+            'liveliness_saved': 0,
+        }
+
+    def _assign(self, cost_ok, score, matched_tracks, matched_boxes, pairs):
+        """
+        Greedily pair tracks and boxes by descending score among allowed pairs.
+        """
+        for t, b in zip(*np.unravel_index(np.argsort(-score, axis=None), score.shape)):
+            if not cost_ok[t, b] or t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            pairs.append((t, b))
+
+    def update(self, boxes):
+        """
+        Associate this frame's boxes with existing tracks, creating new tracks
+        as needed. Returns one Track per box, in the same order.
+        """
+        with self._lock:
+            return self._update(boxes)
+
+    def _update(self, boxes):
+        now = self.clock()
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+        for track in self.tracks:
+            if track.resolved_at is not None and now - track.resolved_at > self.ttl:
+                track.clear()
+
+        pairs = []
+        matched_tracks, matched_boxes = set(), set()
+        if self.tracks and len(boxes):
+            previous = [t.box for t in self.tracks]
+            ious = iou_matrix(previous, boxes)
+            self._assign(ious >= self.iou_threshold, ious, matched_tracks, matched_boxes, pairs)
+            distances = centroid_distance_matrix(previous, boxes)
+            self._assign(distances <= self.max_centroid_distance, -distances, matched_tracks, matched_boxes, pairs)
+
+        result = [None] * len(boxes)
+        for t, b in pairs:
+            track = self.tracks[t]
+            track.box = tuple(boxes[b])
+            track.last_seen = now
+            result[b] = track
+        for b, box in enumerate(boxes):
+            if result[b] is None:
+                track = Track(next(self._ids), tuple(box), now)
+                self.tracks.append(track)
+                result[b] = track
+        return result
+
+    def resolve(self, track, name):
+        """
+        Cache the recognized identity on a track and start its TTL.
+        """
+        with self._lock:
+            track.name = name
+            track.resolved_at = self.clock()
+
+    def identity(self, track):
+        """
+        Return the track's (name, generation), read together.
+        """
+        with self._lock:
+            return track.name, track.generation
+
+    def cached_name(self, track):
+        """
+        Return the track's cached identity, counting the lookup as a hit or miss.
+        Whether the face models were saved is up to the caller: a resolved
+        track may still need the detector for liveliness keypoints.
+        """
+        with self._lock:
+            self.stats['lookups'] += 1
+            if track.name is not None:
+                self.stats['hits'] += 1
+            return track.name
+
+    def cached_deepfake(self, track):
+        """
+        Return the track's cached (label, confidence) deepfake verdict, or None.
+        """
+        with self._lock:
+            if track.deepfake is not None:
+                self.stats['deepfake_saved'] += 1
+            return track.deepfake
+
+    def cached_live(self, track):
+        """
+        Return True if the track has already passed the liveliness check.
+        """
+        with self._lock:
+            if track.live:
+                self.stats['liveliness_saved'] += 1
+            return track.live
+
+    def is_live(self, track):
+        """
+        Like cached_live() without counting it as a saved check.
+        """
+        with self._lock:
+            return track.live
+
+    def set_deepfake(self, track, generation, verdict):
+        """
+        Cache a deepfake verdict computed for the given generation of the
+        track. Returns False (and caches nothing) if the track was cleared since.
+        """
+        with self._lock:
+            if track.generation != generation:
+                return False
+            track.deepfake = verdict
+            return True
+
+    def set_live(self, track, generation, is_live):
+        """
+        Cache a liveliness result, like set_deepfake().
+        """
+        with self._lock:
+            if track.generation != generation:
+                return False
+            track.live = is_live
+            return True
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def unresolved(self, give_up=None):
+        """
+        Number of live tracks without an identity. Tracks older than give_up
+        seconds (someone whose face never shows) are not counted.
+        """
+        now = self.clock()
+        with self._lock:
+            return sum(1 for t in self.tracks
+                       if t.name is None and now - t.last_seen <= self.max_age
+                       and (give_up is None or now - t.first_seen <= give_up))
+
+    def hit_rate(self):
+        return self.stats['hits'] / self.stats['lookups'] if self.stats['lookups'] else 0.0
+
+    def summary(self):
+        """
+        Return a copy of the counters plus the identity cache hit rate.
+        """
+        with self._lock:
+            return dict(self.stats, hit_rate=self.hit_rate(), active_tracks=len(self.tracks))
@@ -1,12 +1,61 @@
-from ultralytics import YOLO
-
-model = YOLO("models/yolov8n.pt")
-
-def detect_people(frame):
-    results = model(frame)[0]
-    boxes = []
-    for r in results.boxes.data.tolist():
-        x1, y1, x2, y2, conf, cls = r
-        if int(cls) == 0:
-            boxes.append((int(x1), int(y1), int(x2), int(y2)))
-    return boxes
+import os
+import threading
+
+import numpy as np
+
+PERSON_CLASS = 0
+
+# Inference resolution and confidence threshold. CPU-only deployments can
+# lower YOLO_IMGSZ (for example to 320) to trade accuracy for frames per second.
+MODEL_PATH = os.environ.get('YOLO_MODEL_PATH', 'models/yolov8n.pt')
+IMGSZ = int(os.environ.get('YOLO_IMGSZ', '640'))
+CONF_THRESHOLD = float(os.environ.get('YOLO_CONF', '0.25'))
+
+# Importing ultralytics (and torch) and reading the weights take seconds, so
+# both wait for the first detection or for utils.startup to load them early
+_model = None
+_model_lock = threading.Lock()
+
+
+def import_yolo():
+    from ultralytics import YOLO
+
+    return YOLO
+
+
+def get_model():
+    """
+    The YOLO model, loaded on first use.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = import_yolo()(MODEL_PATH)
+    return _model
+
+
+def person_boxes(data, conf=CONF_THRESHOLD):
+    """
+    Filter an (n, 6) array of x1, y1, x2, y2, confidence, class rows down to
+    people and return their boxes as an (m, 4) int32 array.
+    """
+    data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+    keep = (data[:, 5] == PERSON_CLASS) & (data[:, 4] >= conf)
+    return data[keep, :4].astype(np.int32)
+
+
+def detect_people_batch(frames, imgsz=IMGSZ, conf=CONF_THRESHOLD):
+    """
+    Detect people in several frames (from different cameras or a short window
+    of one) with a single forward pass. Returns one (n, 4) int32 array of
+    x1, y1, x2, y2 boxes per frame, in order.
+    """
+    if not len(frames):
+        return []
+    results = get_model()(list(frames), imgsz=imgsz, conf=conf, classes=[PERSON_CLASS], verbose=False)
+    return [person_boxes(r.boxes.data.cpu().numpy(), conf) for r in results]
+
+
+def detect_people(frame, imgsz=IMGSZ, conf=CONF_THRESHOLD):
+    return detect_people_batch([frame], imgsz=imgsz, conf=conf)[0]
@@ -1,10 +1,12 @@
 import csv
-import time
-from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import os
+from datetime import datetime, timedelta
 import logging
+import sqlite3
+from utils.attendance_log import report_window
+from utils.attendance_store import DB_PATH as ATTENDANCE_DB, open_attendance_store
+from utils.mailer import Mailer
+from utils.scheduler import Scheduler
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -89,105 +91,86 @@ except KeyError as e:
     logger.error(f"Missing column {e} in data/teachers.csv")
     exit(1)
 
-weekly_attendance_file = 'data/weekly_attendance.csv'
+# Attendance is read from the SQLite store main.py writes to (a legacy
+# weekly_attendance.csv is imported into it on first use). Each report is
+# an indexed query over a date window; history is kept in full.
+# REPORT_PERIOD is weekly, monthly or term (term reports need TERM_START).
+REPORT_PERIOD = os.environ.get('REPORT_PERIOD', 'weekly')
+TERM_START = os.environ.get('TERM_START')
 
-def send_weekly_attendance_report(students_emails, max_classes):
-    known_names = set()
+def send_weekly_attendance_report(students_emails, max_classes, period=REPORT_PERIOD):
+    window_start, window_end = report_window(period, term_start=TERM_START)
     try:
-        with open(weekly_attendance_file, 'r') as f:
-            csv_reader = csv.DictReader(f)
-            for row in csv_reader:
-                known_names.add(row['Name'])
-    except FileNotFoundError:
-        logger.error("weekly_attendance.csv not found. No weekly report generated")
+        # A short-lived connection reads a consistent snapshot while the
+        # attendance loop keeps writing
+        store = open_attendance_store(ATTENDANCE_DB)
+        try:
+            attendance_records = store.totals(window_start, window_end)
+        finally:
+            store.close()
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logger.error(f"Could not read the attendance store at {ATTENDANCE_DB}: {e}")
         return
+    logger.info(f"Aggregated attendance for {len(attendance_records)} students from {window_start} to {window_end}")
 
-    attendance_records = {}
-    for student in known_names:
-        attendance_records[student] = {'present': 0, 'total_sessions': 0}
+    # The body is shared; only the per-student figures are filled in per message
+    subject = f"{period.title()} Attendance Report - AutoAttendanceYOLO"
+    body = f"""
+            Dear $student,
 
-    try:
-        with open(weekly_attendance_file, 'r') as f:
-            csv_reader = csv.DictReader(f)
-            for row in csv_reader:
-                name = row['Name']
-                status = row['Status']
-                if name in attendance_records:
-                    attendance_records[name]['total_sessions'] += 1
-                    if status == 'Present':
-                        attendance_records[name]['present'] += 1
-    except FileNotFoundError:
-        logger.error("weekly_attendance.csv not found. No weekly report generated")
-        return
-
-    try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
-
-        for student, email in students_emails.items():
-            if student not in attendance_records:
-                continue
-            present_count = attendance_records[student]['present']
-            total_sessions = max_classes
-            attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
-
-            if attendance_percentage < 50:
-                message = "Your attendance is quite low. Please try to attend more classes to improve your participation."
-            elif attendance_percentage < 80:
-                message = "You're attending some classes, but there's room for improvement. Aim to attend more sessions."
-            else:
-                message = "Great job! You're attending most classes. Keep up the good work!"
+            Here is your {period} attendance report for {window_start} to {window_end}, as of {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} IST:
 
-            subject = "Weekly Attendance Report - AutoAttendanceYOLO"
-            body = f"""
-            Dear {student},
+            - Classes Attended: $present_count out of $total_sessions
+            - Attendance Percentage: $attendance_percentage%
 
-            Here is your weekly attendance report as of {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} IST:
-
-            - Classes Attended: {present_count} out of {total_sessions}
-            - Attendance Percentage: {attendance_percentage:.2f}%
-
-            {message}
+            $message
 
             Regards,
             AutoAttendance System
             """
+    recipients = []
+    for student, email in students_emails.items():
+        if student not in attendance_records:
+            continue
+        present_count = attendance_records[student]['present']
+        # Max Classes is a weekly figure; longer windows count logged sessions
+        total_sessions = max_classes if period == 'weekly' else attendance_records[student]['total_sessions']
+        attendance_percentage = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+
+        if attendance_percentage < 50:
+            message = "Your attendance is quite low. Please try to attend more classes to improve your participation."
+        elif attendance_percentage < 80:
+            message = "You're attending some classes, but there's room for improvement. Aim to attend more sessions."
+        else:
+            message = "Great job! You're attending most classes. Keep up the good work!"
+        recipients.append((email, {
+            'student': student,
+            'present_count': present_count,
+            'total_sessions': total_sessions,
+            'attendance_percentage': f"{attendance_percentage:.2f}",
+            'message': message,
+        }))
 
-            msg = MIMEMultipart()
-            msg['From'] = SENDER_EMAIL
-            msg['To'] = email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-            server.sendmail(SENDER_EMAIL, email, msg.as_string())
-            logger.info(f"Sent weekly attendance report to {student} at {email}")
-
-        server.quit()
-    except Exception as e:
-        logger.error(f"Error sending weekly attendance reports: {e}")
+    try:
+        queued = mailer.enqueue(subject, body, recipients)
+    except sqlite3.Error as e:
+        logger.error(f"Error queueing weekly attendance reports: {e}")
         return
-
-    with open(weekly_attendance_file, 'w', newline='') as f:
-        csv_writer = csv.writer(f)
-        csv_writer.writerow(['Date', 'Name', 'Status'])
-    logger.info("Reset weekly_attendance.csv for the next week")
-
-# Main loop with improved timing logic
-last_report_time = None
-while True:
-    current_time = datetime.now()
-    current_day = current_time.strftime('%A')
-    current_hour = current_time.hour
-    current_minute = current_time.minute
-
-    # Check if it's Sunday between 22:40 and 22:41
-    if (current_day == 'Sunday' and current_hour == 22 and 40 <= current_minute <= 41):
-        # Ensure the report is sent only once per week
-        if last_report_time is None or (current_time - last_report_time).days >= 7:
-            logger.info(f"[{current_time.strftime('%Y-%m-%d %H:%M:%S')}] Sending weekly attendance report")
-            send_weekly_attendance_report(STUDENT_EMAILS, TEACHER_DETAILS['max_classes'])
-            last_report_time = current_time
-    else:
-        logger.debug(f"[{current_time.strftime('%Y-%m-%d %H:%M:%S')}] Waiting for Sunday 10:40 PM to send weekly report")
-
-    time.sleep(30)  # Check every 30 seconds
\ No newline at end of file
+    logger.info(f"Queued {queued} {period} attendance reports")
+
+# Delivers the reports below plus anything main.py left in the outbox
+mailer = Mailer(SENDER_EMAIL, SENDER_APP_PASSWORD).start()
+
+# Sleep until the next scheduled report instead of polling. Sent reports
+# are recorded in data/scheduler.db, so a restart neither repeats nor
+# skips one; a report missed by less than REPORT_GRACE_HOURS is sent late.
+REPORT_SCHEDULE = os.environ.get('REPORT_SCHEDULE', '40 22 * * sun')
+REPORT_GRACE = timedelta(hours=float(os.environ.get('REPORT_GRACE_HOURS', '12')))
+scheduler = Scheduler()
+scheduler.add(f"{REPORT_PERIOD}_report", REPORT_SCHEDULE,
+              lambda: send_weekly_attendance_report(STUDENT_EMAILS, TEACHER_DETAILS['max_classes']), grace=REPORT_GRACE)
+try:
+    scheduler.run_forever()
+finally:
+    scheduler.close()
+    mailer.stop()